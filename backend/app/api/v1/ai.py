@@ -1,10 +1,46 @@
-from app.models.ai_results import AiAnalysisResult
-from app.services.ai_service import process_image_with_ai
-from fastapi import APIRouter, HTTPException, Path
+from app.models.ai_results import AiAnalysisResult, AiBatchRequest
+from app.services.ai_batch import stream_batch_analysis
+from app.services.ai_service import available_model_types, process_image_with_ai
+from app.services.worker_pool import WorkerPoolBusyError
+from fastapi import APIRouter, Body, HTTPException, Path
+from fastapi.responses import StreamingResponse
 
 router = APIRouter()
 
-VALID_MODEL_TYPES = ["detection"]
+
+def _check_model_type(model_type: str) -> None:
+    """400 unless a detector is registered for model_type (see ai_service.load_detectors)."""
+    try:
+        valid_model_types = available_model_types()
+    except (FileNotFoundError, ImportError) as e:
+        print(f"--- API ERROR: AI models could not be loaded, {e}")
+        raise HTTPException(status_code=500, detail=f"AI Model/file error: {e}") from e
+    if model_type not in valid_model_types:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid model_type. Valid types are: {', '.join(valid_model_types)}",
+        )
+
+
+@router.post("/dicom/ai/{model_type}/batch", response_class=StreamingResponse)
+async def analyze_dicom_images_batch(
+    model_type: str = Path(
+        ...,
+        description="Type of AI model to run (e.g., 'detection')",
+    ),
+    payload: AiBatchRequest = Body(...),
+):
+    """
+    Runs the model on many images in one request. Responds with NDJSON, one
+    line per image as soon as its result is ready (see
+    ai_batch.stream_batch_analysis), in completion order.
+    """
+    _check_model_type(model_type)
+    print(f"--- API AI BATCH: {len(payload.dicom_ids)} image(s) for '{model_type}'.")
+    return StreamingResponse(
+        stream_batch_analysis(payload.dicom_ids, model_type),
+        media_type="application/x-ndjson",
+    )
 
 
 @router.post("/dicom/{dicom_id}/ai/{model_type}", response_model=AiAnalysisResult)
@@ -15,14 +51,12 @@ async def analyze_dicom_image(
         description="Type of AI model to run (e.g., 'detection')",
     ),
 ):
-    if model_type not in VALID_MODEL_TYPES:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Invalid model_type. Valid type is: {VALID_MODEL_TYPES[0]}",
-        )
+    _check_model_type(model_type)
     try:
         ai_result = await process_image_with_ai(dicom_id, model_type)
         return ai_result
+    except WorkerPoolBusyError:
+        raise  # 503 with Retry-After, from the handler in main.py
     except FileNotFoundError as e:
         print(f"--- API ERROR: File/Model error in ai.py (Roboflow path), {e}")
         raise HTTPException(status_code=500, detail=f"AI Model/file error: {e}") from e
@@ -1,35 +1,335 @@
-from app.models.dicom_updates import DicomMetadataUpdatePayload
+from typing import Literal, Optional
+
+from app.core.config import settings
+from app.models.dicom_updates import BulkExportRequest, DicomMetadataUpdatePayload
 from app.models.image_payload import ImagePayload
+from app.models.pyramid import PyramidInfo
+from app.services.bulk_export import stream_bulk_export
 from app.services.dicom_service import (
-    create_modified_dicom_with_meta,
+    DicomParsingError,
+    export_modified_dicom,
+    get_image_meta,
     get_image_payload,
-    get_raw_dicom_bytes,
+    get_frame_png,
+    get_original_export,
+    get_image_bytes,
+    get_preview_jpeg,
+    get_pyramid_info,
+    get_tile_png,
+    render_windowed_image,
+)
+from app.util.http_range import (
+    FileRangeResponse,
+    RangeNotSatisfiableError,
+    if_range_matches,
+    parse_range,
 )
-from fastapi import APIRouter, Body, HTTPException
-from fastapi.responses import Response
+from app.util.image_utils import IMAGE_MEDIA_TYPES
+from fastapi import APIRouter, Body, Header, HTTPException, Path, Query
+from fastapi.responses import Response, StreamingResponse
 
 router = APIRouter()
 
+ImageFormat = Literal["png", "webp", "jpeg"]
+_FORMATS_BY_MEDIA_TYPE = {media_type: fmt for fmt, media_type in IMAGE_MEDIA_TYPES.items()}
+_FORMAT_QUERY = Query(
+    None, description="Output format; overrides the Accept header (default: negotiated)"
+)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+def _accept_q(accept: str) -> dict[str, float]:
+    """q value per media range of an Accept header (lowercased; later duplicates ignored)."""
+    qualities: dict[str, float] = {}
+    for media_range in accept.split(","):
+        media_type, *params = media_range.split(";")
+        media_type = media_type.strip().lower()
+        if not media_type:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities.setdefault(media_type, q)
+    return qualities
+
+
+def _negotiate_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """
+    Output format for a rendered image: the format query parameter if given,
+    else negotiated from the Accept header. settings.IMAGE_DEFAULT_FORMAT wins
+    whenever the client accepts it as much as anything else (also through
+    image/* or */*, as browsers send), so the deployment's CPU/bytes choice
+    holds; another format is only used when the client ranks it higher.
+    """
+    if requested:
+        return requested
+    qualities = _accept_q(accept or "")
+
+    def q(image_format: str) -> float:
+        media_type = IMAGE_MEDIA_TYPES[image_format]
+        for media_range in (media_type, f"{media_type.split('/')[0]}/*", "*/*"):
+            if media_range in qualities:
+                return qualities[media_range]
+        return 0.0
+
+    best_q = max(q(image_format) for image_format in IMAGE_MEDIA_TYPES)
+    default = settings.IMAGE_DEFAULT_FORMAT
+    if best_q <= 0 or q(default) == best_q:
+        return default
+    # Among the formats ranked highest, the one the client listed first.
+    for media_type in qualities:
+        image_format = _FORMATS_BY_MEDIA_TYPE.get(media_type)
+        if image_format is not None and q(image_format) == best_q:
+            return image_format
+    return default
+
+
+def _image_headers(etag: str, negotiated: bool) -> dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": settings.IMAGE_CACHE_CONTROL}
+    if negotiated:
+        headers["Vary"] = "Accept"
+    return headers
+
 
 @router.get("/dicom/{dicom_id}", response_model=ImagePayload)
-async def fetch_dicom(dicom_id: str):
-    payload = await get_image_payload(dicom_id)
+async def fetch_dicom(
+    dicom_id: str,
+    include_pixels: bool = Query(
+        True,
+        description="Set to false to get metadata only and fetch the PNG from /dicom/{dicom_id}/image",
+    ),
+):
+    try:
+        payload = await get_image_payload(dicom_id, include_pixels=include_pixels)
+    except DicomParsingError as e:
+        # Only possible with LAZY_RENDER, where the pixels are decoded on first fetch.
+        raise HTTPException(422, f"Failed to render DICOM image: {e}") from e
     if not payload:
         raise HTTPException(404, "DICOM not found")
     return payload
 
 
+@router.get("/dicom/{dicom_id}/image", response_class=Response)
+async def fetch_dicom_image(
+    dicom_id: str,
+    format: Optional[ImageFormat] = _FORMAT_QUERY,
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    if await get_image_meta(dicom_id) is None:
+        raise HTTPException(404, "DICOM not found")
+
+    # dicom_id is a content hash, so the rendered bytes for it never change.
+    image_format = _negotiate_format(format, accept)
+    etag = f'"{dicom_id}.{image_format}"'
+    headers = _image_headers(etag, negotiated=format is None)
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        image_bytes = await get_image_bytes(dicom_id, image_format)
+    except DicomParsingError as e:
+        raise HTTPException(422, f"Failed to render DICOM image: {e}") from e
+    if image_bytes is None:
+        raise HTTPException(404, "DICOM not found")
+    return Response(
+        content=image_bytes, media_type=IMAGE_MEDIA_TYPES[image_format], headers=headers
+    )
+
+
+@router.get("/dicom/{dicom_id}/preview", response_class=Response)
+async def fetch_dicom_preview(
+    dicom_id: str, if_none_match: Optional[str] = Header(None)
+):
+    if await get_image_meta(dicom_id) is None:
+        raise HTTPException(404, "DICOM not found")
+
+    etag = f'"{dicom_id}.preview"'
+    headers = {"ETag": etag, "Cache-Control": settings.IMAGE_CACHE_CONTROL}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        preview = await get_preview_jpeg(dicom_id)
+    except DicomParsingError as e:
+        raise HTTPException(422, f"Failed to render DICOM preview: {e}") from e
+    if preview is None:
+        raise HTTPException(404, "DICOM not found")
+    return Response(content=preview, media_type="image/jpeg", headers=headers)
+
+
+@router.get("/dicom/{dicom_id}/render", response_class=Response)
+async def render_dicom_image(
+    dicom_id: str,
+    wc: Optional[float] = Query(None, description="Window center (defaults to the DICOM's)"),
+    ww: Optional[float] = Query(None, gt=0, description="Window width (defaults to the DICOM's)"),
+    invert: bool = Query(False, description="Invert the grayscale output"),
+    scale: float = Query(1.0, gt=0, le=1, description="Output size relative to the full image"),
+    format: Optional[ImageFormat] = _FORMAT_QUERY,
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    if await get_image_meta(dicom_id) is None:
+        raise HTTPException(404, "DICOM not found")
+
+    image_format = _negotiate_format(format, accept)
+    etag = f'"{dicom_id}.render.{wc}.{ww}.{int(invert)}.{scale}.{image_format}"'
+    headers = _image_headers(etag, negotiated=format is None)
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        image_bytes = await render_windowed_image(
+            dicom_id, wc, ww, invert, scale, image_format
+        )
+    except DicomParsingError as e:
+        raise HTTPException(422, f"Failed to render DICOM image: {e}") from e
+    if image_bytes is None:
+        raise HTTPException(404, "DICOM not found")
+    return Response(
+        content=image_bytes, media_type=IMAGE_MEDIA_TYPES[image_format], headers=headers
+    )
+
+
+@router.get("/dicom/{dicom_id}/tiles", response_model=PyramidInfo)
+async def fetch_dicom_pyramid(dicom_id: str):
+    info = await get_pyramid_info(dicom_id)
+    if info is None:
+        raise HTTPException(404, "DICOM not found")
+    return info
+
+
+@router.get("/dicom/{dicom_id}/tiles/{level}/{x}/{y}", response_class=Response)
+async def fetch_dicom_tile(
+    dicom_id: str,
+    level: int = Path(..., ge=0, description="Pyramid level, 0 = full resolution"),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    if_none_match: Optional[str] = Header(None),
+):
+    etag = f'"{dicom_id}.tile.{level}.{x}.{y}"'
+    headers = {"ETag": etag, "Cache-Control": settings.IMAGE_CACHE_CONTROL}
+    if _etag_matches(if_none_match, etag) and await get_image_meta(dicom_id):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        tile_png = await get_tile_png(dicom_id, level, x, y)
+    except DicomParsingError as e:
+        raise HTTPException(422, f"Failed to render DICOM tile: {e}") from e
+    if tile_png is None:
+        raise HTTPException(404, "Tile not found")
+    return Response(content=tile_png, media_type="image/png", headers=headers)
+
+
+@router.get("/dicom/{dicom_id}/frames/{frame}", response_class=Response)
+async def fetch_dicom_frame(
+    dicom_id: str,
+    frame: int = Path(..., ge=0, description="Zero-based frame index"),
+    if_none_match: Optional[str] = Header(None),
+):
+    etag = f'"{dicom_id}.frame.{frame}"'
+    headers = {"ETag": etag, "Cache-Control": settings.IMAGE_CACHE_CONTROL}
+    if _etag_matches(if_none_match, etag) and await get_image_meta(dicom_id):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        frame_png = await get_frame_png(dicom_id, frame)
+    except DicomParsingError as e:
+        raise HTTPException(422, f"Failed to render DICOM frame: {e}") from e
+    if frame_png is None:
+        raise HTTPException(404, "Frame not found")
+    return Response(content=frame_png, media_type="image/png", headers=headers)
+
+
 @router.get("/dicom/{dicom_id}/download_original", response_class=Response)
-async def download_original_dicom_file(dicom_id: str):
-    dicom_bytes = await get_raw_dicom_bytes(dicom_id)
-    if not dicom_bytes:
+async def download_original_dicom_file(
+    dicom_id: str,
+    range_header: Optional[str] = Header(None, alias="range"),
+    if_range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    The uploaded DICOM file, unchanged. Supports Range / If-Range (one byte
+    range, answered with 206) so interrupted downloads can resume; files in
+    the disk store are sent straight from disk.
+    """
+    original = await get_original_export(dicom_id)
+    if original is None:
         raise HTTPException(status_code=404, detail="Original DICOM file not found")
 
+    # dicom_id is derived from the file's content, so the ID is a strong validator.
+    etag = f'"{dicom_id}.dcm"'
     filename = f"{dicom_id}_original.dcm"
-    return Response(
-        content=dicom_bytes,
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+    }
+    if _etag_matches(if_none_match, etag):
+        original.close()
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if if_range_matches(if_range, etag):
+        try:
+            byte_range = parse_range(range_header, original.size)
+        except RangeNotSatisfiableError as e_range:
+            original.close()
+            raise HTTPException(
+                status_code=416,
+                detail=f"Requested range not satisfiable: {e_range}",
+                headers={"Content-Range": f"bytes */{original.size}"},
+            ) from e_range
+
+    status_code, offset, count = 200, 0, original.size
+    if byte_range is not None:
+        status_code, offset, count = 206, byte_range.start, byte_range.length
+        headers["Content-Range"] = (
+            f"bytes {byte_range.start}-{byte_range.end}/{original.size}"
+        )
+    if isinstance(original.source, bytes):
+        return Response(
+            content=original.source[offset : offset + count],
+            status_code=status_code,
+            media_type="application/dicom",
+            headers=headers,
+        )
+    headers["Content-Length"] = str(count)
+    return FileRangeResponse(
+        original.source,
+        offset,
+        count,
+        status_code=status_code,
+        headers=headers,
         media_type="application/dicom",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        chunk_size=settings.DOWNLOAD_CHUNK_SIZE,
+    )
+
+
+@router.post("/dicom/export_bulk", response_class=StreamingResponse)
+async def export_bulk_dicom_files(payload: BulkExportRequest = Body(...)):
+    """
+    ZIP of many DICOMs, each original or with metadata updates applied,
+    streamed while it is built. manifest.json in the archive lists the file
+    for every requested ID, or why it is missing.
+    """
+    return StreamingResponse(
+        stream_bulk_export(payload.items),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="dicom_export.zip"'},
     )
 
 
@@ -37,19 +337,24 @@ async def download_original_dicom_file(dicom_id: str):
 async def export_modified_dicom_file(
     dicom_id: str, payload: DicomMetadataUpdatePayload = Body(...)
 ):
-    modified_dicom_bytes = await create_modified_dicom_with_meta(
+    export = await export_modified_dicom(
         original_dicom_id=dicom_id, metadata_updates=payload.updates
     )
 
-    if not modified_dicom_bytes:
+    if not export:
         raise HTTPException(
             status_code=404,
             detail="Could not generate modified DICOM. Original might be missing or an error occurred.",
         )
 
+    # Only the header was rewritten; the pixel data is streamed from the
+    # stored original as it is sent.
     filename = f"{dicom_id}_modified.dcm"
-    return Response(
-        content=modified_dicom_bytes,
+    return StreamingResponse(
+        export.iter_bytes(settings.DOWNLOAD_CHUNK_SIZE),
         media_type="application/dicom",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Content-Length": str(export.size),
+        },
     )
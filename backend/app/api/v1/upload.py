@@ -1,8 +1,15 @@
 import traceback
 
 # Import DicomParsingError from the service
-from app.services.dicom_service import DicomParsingError, save_and_parse
-from fastapi import APIRouter, HTTPException, UploadFile
+from app.services.dicom_service import (
+    DicomParsingError,
+    DicomUploadTooLargeError,
+    save_and_parse,
+)
+from app.services.bulk_upload import stream_bulk_ingest
+from app.services.worker_pool import WorkerPoolBusyError
+from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
 
 router = APIRouter()
 
@@ -29,6 +36,13 @@ async def upload_dicom(file: UploadFile):
             f"--- API UPLOAD: Successfully processed file '{file.filename}', DICOM ID: {dicom_id}"
         )
         return dicom_id
+    except DicomUploadTooLargeError as e_too_large:
+        print(
+            f"--- API UPLOAD REJECTED: File '{file.filename}' is too large: {e_too_large}"
+        )
+        raise HTTPException(status_code=413, detail=str(e_too_large))
+    except WorkerPoolBusyError:
+        raise  # 503 with Retry-After, from the handler in main.py
     except DicomParsingError as e_parse:
         # This error comes from our service layer, means something went wrong during parsing/processing
         print(
@@ -52,3 +66,18 @@ async def upload_dicom(file: UploadFile):
             status_code=500,
             detail=f"An unexpected server error occurred during file upload. Please try again or contact support if the issue persists.",
         )
+
+
+@router.post("/upload/bulk", response_class=StreamingResponse)
+async def upload_dicom_bulk(files: list[UploadFile] = File(...)):
+    """
+    Ingests many DICOM files and/or ZIP archives of DICOMs in one request.
+
+    Responds with NDJSON, one line per file as soon as it is ingested (see
+    bulk_upload.stream_bulk_ingest), so clients can show progress and retry
+    just the failures.
+    """
+    print(f"--- API BULK UPLOAD: Received {len(files)} file(s).")
+    return StreamingResponse(
+        stream_bulk_ingest(files), media_type="application/x-ndjson"
+    )
@@ -1,7 +1,8 @@
 # backend/app/core/config.py
 import os  # Import os module
+import tempfile
 from pathlib import Path  # Import Path
-from typing import List, Union
+from typing import List, Literal, Union
 
 from pydantic.networks import AnyHttpUrl, HttpUrl
 from pydantic_settings import (  # Import SettingsConfigDict for newer Pydantic
@@ -23,6 +24,22 @@ class Settings(BaseSettings):
     API_VERSION: str = "0.1.0"
     API_STR: str = "/api/v1"
     ROBOFLOW_API_KEY: Union[str, None] = None
+    # Roboflow hosted inference: one pooled keep-alive client shared by all requests
+    ROBOFLOW_API_URL: str = "https://detect.roboflow.com"
+    ROBOFLOW_CONNECT_TIMEOUT: float = 5.0  # seconds
+    ROBOFLOW_READ_TIMEOUT: float = 30.0  # seconds, per remote inference
+    ROBOFLOW_MAX_CONNECTIONS: int = 16
+    ROBOFLOW_MAX_CONCURRENCY: int = 8  # inferences in flight; the rest wait
+    # Client-side pacing (token bucket; None = unlimited) and retries on 429,
+    # after Retry-After or an exponential backoff from ROBOFLOW_BACKOFF_SECONDS
+    ROBOFLOW_REQUESTS_PER_SECOND: Union[float, None] = 10.0
+    ROBOFLOW_BURST: int = 10
+    ROBOFLOW_MAX_RETRIES: int = 3
+    ROBOFLOW_BACKOFF_SECONDS: float = 1.0
+    # Batch analysis (/dicom/ai/{model_type}/batch): images per request, and
+    # how many are analyzed at once
+    AI_BATCH_MAX_ITEMS: int = 100
+    AI_BATCH_CONCURRENCY: int = 4
     # OPENAI_API_KEY: Union[str, None] = None
 
     CORS_ORIGINS: List[Union[AnyHttpUrl, str]] = [
@@ -36,6 +53,88 @@ class Settings(BaseSettings):
     UVICORN_PORT: int = 8000
     UVICORN_RELOAD: bool = True
 
+    # Upload ingest: request bodies are streamed to a spool file in chunks
+    # instead of being read into memory in one piece.
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 1 MiB per read
+    UPLOAD_MAX_BYTES: int = 2 * 1024 * 1024 * 1024  # 2 GiB hard limit per file
+    UPLOAD_SPOOL_DIR: Path = Path(tempfile.gettempdir()) / "daant" / "spool"
+    # Bulk upload (/upload/bulk): files or ZIP members ingested in parallel,
+    # and the most accepted per request
+    BULK_UPLOAD_CONCURRENCY: int = 4
+    BULK_UPLOAD_MAX_FILES: int = 10000
+    # Chunk size for streamed DICOM downloads (originals and exports)
+    DOWNLOAD_CHUNK_SIZE: int = 1024 * 1024
+    # Bulk ZIP export: studies per request, and how many entries are prepared
+    # ahead of the one being streamed
+    BULK_EXPORT_MAX_ITEMS: int = 1000
+    BULK_EXPORT_CONCURRENCY: int = 4
+    # Only parse the header at upload time; the PNG is rendered on first fetch.
+    LAZY_RENDER: bool = False
+
+    # Worker pool for the CPU-bound decode/render stage ("thread" or "process")
+    WORKER_POOL_KIND: str = "thread"
+    WORKER_POOL_MAX_WORKERS: Union[int, None] = None  # None -> os.cpu_count()
+    WORKER_POOL_MAX_QUEUE: int = 16  # jobs allowed to wait for a free worker
+    WORKER_POOL_QUEUE_TIMEOUT: float = 30.0  # seconds to wait for a slot before 503
+
+    # Tiered image store: hot in-memory LRU, overflow spilled to disk and mmapped back
+    IMAGE_STORE_MEMORY_BUDGET_BYTES: int = 256 * 1024 * 1024  # rendered images + meta
+    RAW_STORE_MEMORY_BUDGET_BYTES: int = 64 * 1024 * 1024  # original DICOM files
+    IMAGE_STORE_DIR: Path = Path(tempfile.gettempdir()) / "daant" / "store"
+    # Disk tier budgets; the least recently used spill files go first (None = unbounded).
+    # Spill dirs of dead workers ("<store>-<pid>") are removed at startup.
+    IMAGE_STORE_DISK_BUDGET_BYTES: Union[int, None] = 4 * 1024 * 1024 * 1024
+    RAW_STORE_DISK_BUDGET_BYTES: Union[int, None] = 16 * 1024 * 1024 * 1024
+    IMAGE_STORE_TTL_SECONDS: Union[float, None] = 24 * 60 * 60  # None = keep forever
+
+    # Decoded full-depth pixel arrays kept for re-windowing, and the renders made from them
+    PIXEL_CACHE_BUDGET_BYTES: int = 256 * 1024 * 1024
+    WINDOW_RENDER_CACHE_BUDGET_BYTES: int = 64 * 1024 * 1024
+
+    # Parsed header-only Datasets from ingest, reused by export and tag lookups.
+    # Entries are sized by measuring their elements (dicom_service._dataset_nbytes),
+    # which leaves out some interpreter overhead: treat the budget as approximate.
+    HEADER_CACHE_BUDGET_BYTES: int = 32 * 1024 * 1024
+
+    # Tiled image pyramid: tile edge length, and the budget for the downsampled
+    # level images tiles are cut from (the tiles themselves live in the image store)
+    TILE_SIZE: int = 256
+    TILE_LEVEL_CACHE_BUDGET_BYTES: int = 128 * 1024 * 1024
+
+    # Low-resolution JPEG preview made at ingest for an instant first paint
+    PREVIEW_MAX_EDGE: int = 512
+    PREVIEW_JPEG_QUALITY: int = 80
+
+    # Model-ready AI input (full-resolution base64 JPEG of the default-windowed
+    # image) made at ingest, so detection requests don't re-encode anything
+    AI_INPUT_JPEG_QUALITY: int = 90
+    # AI results per (model input hash, model id/version, thresholds). Set the
+    # directory to keep results across restarts (in its ai-results/ subdirectory,
+    # the only part the cache touches); None keeps them in memory only.
+    AI_RESULT_CACHE_BUDGET_BYTES: int = 16 * 1024 * 1024
+    AI_RESULT_CACHE_DIR: Union[Path, None] = None
+    # Detection backend: Roboflow's hosted API, or a YOLOv8-style ONNX model run
+    # in-process on the CPU with ONNX Runtime (loaded once at startup)
+    AI_DETECTION_BACKEND: Literal["roboflow", "onnx"] = "roboflow"
+    ONNX_DETECTION_MODEL_PATH: Path = BACKEND_DIR / "models" / "detection.onnx"
+    ONNX_CONFIDENCE_THRESHOLD: float = 0.30
+    ONNX_IOU_THRESHOLD: float = 0.45  # NMS overlap above which the weaker box is dropped
+    ONNX_MAX_CONCURRENT_RUNS: int = 1  # each run already uses all intra-op threads
+    ONNX_INTRA_OP_THREADS: Union[int, None] = None  # None -> ONNX Runtime default
+
+    # Encoders for rendered images. The format is picked per request: the format
+    # query parameter, else IMAGE_DEFAULT_FORMAT unless the Accept header ranks
+    # another supported format strictly higher.
+    # Lower PNG levels / WebP methods trade bytes on the wire for CPU time.
+    IMAGE_DEFAULT_FORMAT: Literal["png", "webp", "jpeg"] = "png"
+    PNG_COMPRESS_LEVEL: int = 6
+    WEBP_METHOD: int = 1
+    JPEG_QUALITY: int = 90
+
+    # Cache-Control for binary image responses. IDs are content hashes, so the
+    # bytes behind a URL never change and can be cached as immutable.
+    IMAGE_CACHE_CONTROL: str = "public, max-age=31536000, immutable"
+
     # For Pydantic V2 (pydantic-settings)
     model_config = SettingsConfigDict(
         env_file=BACKEND_DIR
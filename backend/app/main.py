@@ -1,11 +1,21 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from app.api.v1.ai import router as ai_router  # ADDED
 from app.api.v1.dicom import router as dicom_router
 from app.api.v1.report import router as report_router
 from app.api.v1.upload import router as upload_router
 from app.core.config import settings
+from app.services.ai_service import ai_stats, load_detectors, start_ai_result_cache
+from app.services.dicom_service import close_stores, store_stats
+from app.services.roboflow_client import close_roboflow_client, start_roboflow_client
+from app.services.worker_pool import (
+    BUSY_RETRY_AFTER_SECONDS,
+    WorkerPoolBusyError,
+    shutdown_worker_pool,
+    start_worker_pool,
+)
 
 
 def create_app() -> FastAPI:
@@ -24,10 +34,24 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    @app.exception_handler(WorkerPoolBusyError)
+    async def worker_pool_busy(request: Request, exc: WorkerPoolBusyError):
+        # Any route whose CPU-bound work couldn't get a worker slot in time.
+        print(f"--- API BUSY: {request.method} {request.url.path}: {exc}")
+        return JSONResponse(
+            status_code=503,
+            content={"detail": str(exc)},
+            headers={"Retry-After": str(BUSY_RETRY_AFTER_SECONDS)},
+        )
+
     @app.get(f"{settings.API_STR}/healthz", tags=["Health"])
     async def health_check():
         return {"status": "ok"}
 
+    @app.get(f"{settings.API_STR}/metrics", tags=["Health"])
+    async def metrics():
+        return {**store_stats(), **ai_stats()}
+
     app.include_router(upload_router, prefix=settings.API_STR, tags=["Upload"])
     app.include_router(dicom_router, prefix=settings.API_STR, tags=["DICOM"])
     app.include_router(ai_router, prefix=settings.API_STR, tags=["AI Analysis"])
@@ -37,21 +61,24 @@ def create_app() -> FastAPI:
 
     @app.on_event("startup")
     async def on_startup():
+        start_worker_pool()
+        start_roboflow_client()
+        # Pre-load AI models here to avoid delay on first request
+        try:
+            print("Pre-loading AI models...")
+            load_detectors()
+            print("AI models pre-loaded.")
+        except Exception as e:
+            print(f"Error pre-loading AI models: {e}")
+        start_ai_result_cache()
         print("Application startup complete.")
         print(f"Allowing CORS from: {settings.CORS_ORIGINS}")
-        # Optionally pre-load AI models here to avoid delay on first request
-        # from app.services.ai_service import get_model
-        # try:
-        #     print("Pre-loading AI models...")
-        #     get_model("detection")
-        #     get_model("segmentation")
-        #     get_model("classification")
-        #     print("AI models pre-loaded.")
-        # except Exception as e:
-        #     print(f"Error pre-loading AI models: {e}")
 
     @app.on_event("shutdown")
     async def on_shutdown():
+        shutdown_worker_pool()
+        await close_roboflow_client()
+        close_stores()
         print("Application shutdown complete.")
 
     return app
@@ -2,6 +2,8 @@ from typing import List, Optional, Tuple
 
 from pydantic import BaseModel, Field
 
+from app.core.config import settings
+
 
 class BoundingBox(BaseModel):
     x1: float
@@ -40,3 +42,9 @@ class AiAnalysisResult(BaseModel):
     segmentation: Optional[SegmentationResult] = None
     classification: Optional[ClassificationResult] = None
     model_type: str  # e.g., "detection", "segmentation", "classification"
+
+
+class AiBatchRequest(BaseModel):
+    dicom_ids: List[str] = Field(
+        ..., min_length=1, max_length=settings.AI_BATCH_MAX_ITEMS
+    )
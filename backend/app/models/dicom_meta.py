@@ -10,3 +10,6 @@ class DicomMeta(BaseModel):
     window_width: float | None
     rows: int
     columns: int
+    number_of_frames: int = 1
+    slice_thickness: float | None = None
+    spacing_between_slices: float | None = None
@@ -1,7 +1,21 @@
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
 
 
 class DicomMetadataUpdatePayload(BaseModel):
     updates: Dict[str, Any]
+
+
+class BulkExportItem(DicomMetadataUpdatePayload):
+    dicom_id: str
+    # Without updates the original file is exported unchanged.
+    updates: Optional[Dict[str, Any]] = None
+
+
+class BulkExportRequest(BaseModel):
+    items: List[BulkExportItem] = Field(
+        ..., min_length=1, max_length=settings.BULK_EXPORT_MAX_ITEMS
+    )
@@ -1,8 +1,12 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 from app.models.dicom_meta import DicomMeta
 
 
 class ImagePayload(BaseModel):
-    png_data: str
+    # Base64 PNG. None when the client asked for metadata only; the binary
+    # image is available from GET /dicom/{id}/image.
+    png_data: Optional[str] = None
     meta: DicomMeta
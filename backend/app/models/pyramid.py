@@ -0,0 +1,18 @@
+from typing import List
+
+from pydantic import BaseModel
+
+
+class PyramidLevel(BaseModel):
+    level: int  # 0 = full resolution, each further level halves width and height
+    width: int
+    height: int
+    columns: int  # number of tiles across
+    rows: int  # number of tiles down
+
+
+class PyramidInfo(BaseModel):
+    width: int
+    height: int
+    tile_size: int
+    levels: List[PyramidLevel]
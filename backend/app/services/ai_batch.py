@@ -0,0 +1,54 @@
+from contextlib import aclosing
+from typing import AsyncIterator
+
+from app.core.config import settings
+from app.services.ai_service import process_image_with_ai
+from app.services.worker_pool import WorkerPoolBusyError
+from app.util.streaming import bounded_as_completed, ndjson_line
+
+
+async def _analyze_one(dicom_id: str, model_type: str) -> dict:
+    # Statuses match what the single-image endpoint (api/v1/ai.py) answers.
+    try:
+        result = await process_image_with_ai(dicom_id, model_type)
+    except WorkerPoolBusyError as e_busy:
+        return {"dicom_id": dicom_id, "status": 503, "error": str(e_busy)}
+    except ValueError as e_value:
+        return {"dicom_id": dicom_id, "status": 400, "error": str(e_value)}
+    except (FileNotFoundError, RuntimeError, ImportError) as e_ai:
+        return {"dicom_id": dicom_id, "status": 500, "error": str(e_ai)}
+    except Exception as e:
+        print(f"--- AI BATCH: Unexpected error for {dicom_id}: {e}")
+        return {
+            "dicom_id": dicom_id,
+            "status": 500,
+            "error": f"An unexpected error occurred during AI processing: {type(e).__name__}",
+        }
+    return {"dicom_id": dicom_id, "status": 200, "result": result.model_dump()}
+
+
+async def stream_batch_analysis(
+    dicom_ids: list[str], model_type: str
+) -> AsyncIterator[bytes]:
+    """
+    Analyzes many images with up to AI_BATCH_CONCURRENCY in flight and streams
+    one NDJSON line per image as soon as it is done: {"dicom_id", "status",
+    "result"} (an AiAnalysisResult) on success, {"dicom_id", "status",
+    "error"} on failure. A final {"done": true, ...} line has the totals.
+
+    Remote calls are paced by the Roboflow client's token bucket and back off
+    together on 429s; cached results and repeated IDs cost no remote call.
+    """
+    counts = {"succeeded": 0, "failed": 0}
+    jobs = (_analyze_one(dicom_id, model_type) for dicom_id in dicom_ids)
+    async with aclosing(
+        bounded_as_completed(jobs, settings.AI_BATCH_CONCURRENCY)
+    ) as records:
+        async for record in records:
+            counts["succeeded" if "result" in record else "failed"] += 1
+            yield ndjson_line(record)
+
+    print(
+        f"--- AI BATCH: {counts['succeeded']} analyzed, {counts['failed']} failed ({model_type})."
+    )
+    yield ndjson_line({"done": True, **counts})
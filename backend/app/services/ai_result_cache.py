@@ -0,0 +1,140 @@
+# backend/app/services/ai_result_cache.py
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, NamedTuple, Optional
+
+from app.models.ai_results import AiAnalysisResult
+from app.util.cache import LRUCache
+
+
+# The disk tier only ever touches this subdirectory of the configured directory,
+# so pointing AI_RESULT_CACHE_DIR at a shared directory can't delete other data.
+_DISK_SUBDIR = "ai-results"
+_ENTRY_NAME = re.compile(r"^[0-9a-f]{64}\.json$")
+
+
+class ResultKey(NamedTuple):
+    namespace: str  # model type + model id/version, e.g. "detection-adr-6"
+    digest: str  # SHA-256 over the input hash and the model parameters
+
+
+def model_namespace(model_type: str, model_id: str) -> str:
+    """Directory-safe name for a model type and id (including its version)."""
+    return re.sub(r"[^A-Za-z0-9_.]+", "-", f"{model_type}-{model_id}").strip("-")
+
+
+def result_key(
+    input_sha256: str, model_type: str, model_id: str, params: Dict[str, Any]
+) -> ResultKey:
+    """
+    Cache key for one model run: what the model saw (the hash of its input),
+    which model (id including version) and the thresholds applied to its output.
+    """
+    fingerprint = json.dumps([input_sha256, model_id, params], sort_keys=True)
+    return ResultKey(
+        model_namespace(model_type, model_id),
+        hashlib.sha256(fingerprint.encode()).hexdigest(),
+    )
+
+
+class AiResultCache:
+    """
+    AiAnalysisResult cache with an in-memory LRU tier and an optional disk tier.
+
+    Results are kept as JSON, so every get returns a fresh object. Disk entries
+    are files under <disk_dir>/ai-results/<namespace>/<digest>.json and survive
+    restarts; results of a model version that is no longer used are removed by
+    retain_namespaces (see ai_service.start_ai_result_cache). Nothing else in
+    <disk_dir> is ever read or deleted.
+
+    Args:
+        memory_budget_bytes (int): Byte budget of the memory tier.
+        disk_dir (Path | None): Directory of the disk tier; None = memory only.
+    """
+
+    def __init__(self, memory_budget_bytes: int, disk_dir: Optional[Path] = None):
+        self.disk_dir = Path(disk_dir) / _DISK_SUBDIR if disk_dir is not None else None
+        self._memory: LRUCache[ResultKey, bytes] = LRUCache(memory_budget_bytes)
+        self._lock = threading.Lock()
+        self.disk_hits = 0
+        self.disk_writes = 0
+        self.invalidations = 0
+
+    def get(self, key: ResultKey) -> Optional[AiAnalysisResult]:
+        data = self._memory.get(key)
+        if data is None and self.disk_dir is not None:
+            try:
+                data = self._path_for(key).read_bytes()
+            except OSError:
+                return None
+            self._memory.put(key, data)
+            with self._lock:
+                self.disk_hits += 1
+        if data is None:
+            return None
+        return AiAnalysisResult.model_validate_json(data)
+
+    def put(self, key: ResultKey, result: AiAnalysisResult) -> None:
+        data = result.model_dump_json().encode("utf-8")
+        self._memory.put(key, data)
+        if self.disk_dir is None:
+            return
+        target = self._path_for(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, target)  # atomic, so readers never see half a file
+        with self._lock:
+            self.disk_writes += 1
+
+    def retain_namespaces(self, namespaces: Iterable[str]) -> int:
+        """
+        Drops every result outside `namespaces` (e.g. those of an older model
+        version) from both tiers. Returns the number of disk entries removed.
+        Only result files are deleted; a namespace directory is removed once
+        they are gone, unless something else was put there.
+        """
+        keep = set(namespaces)
+        for key, _ in self._memory.items():
+            if key.namespace not in keep:
+                self._memory.pop(key)
+        removed = 0
+        if self.disk_dir is not None and self.disk_dir.is_dir():
+            for directory in self.disk_dir.iterdir():
+                if not directory.is_dir() or directory.name in keep:
+                    continue
+                for entry in directory.iterdir():
+                    if _ENTRY_NAME.match(entry.name) and entry.is_file():
+                        entry.unlink(missing_ok=True)
+                        removed += 1
+                try:
+                    directory.rmdir()
+                except OSError:
+                    pass  # not empty: leave what isn't ours
+        with self._lock:
+            self.invalidations += removed
+        return removed
+
+    def clear(self) -> None:
+        """Drops every result, on disk too."""
+        self.retain_namespaces(())
+
+    def stats(self) -> Dict[str, int]:
+        memory = self._memory.stats()
+        return {
+            "memory_entries": memory["entries"],
+            "memory_bytes": memory["bytes"],
+            "memory_hits": memory["hits"],
+            "disk_hits": self.disk_hits,
+            # A memory miss that the disk tier answered is a disk hit, not a miss.
+            "misses": memory["misses"] - self.disk_hits,
+            "disk_writes": self.disk_writes,
+            "invalidations": self.invalidations,
+        }
+
+    def _path_for(self, key: ResultKey) -> Path:
+        return self.disk_dir / key.namespace / f"{key.digest}.json"
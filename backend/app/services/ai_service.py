@@ -1,16 +1,26 @@
 # backend/app/services/ai_service.py
-import base64
-import io
+import hashlib
 import os
 import traceback
+from typing import Any, Dict, List, Optional
 
-import numpy as np  # Not strictly needed for base64 method but often useful with images
 from app.core.config import settings
 from app.models.ai_results import AiAnalysisResult, BoundingBox, DetectionResult
-from app.services.dicom_service import get_image_payload
-from inference_sdk import InferenceHTTPClient
-from inference_sdk.http.errors import InvalidInputFormatError
-from PIL import Image
+from app.services.ai_result_cache import (
+    AiResultCache,
+    ResultKey,
+    model_namespace,
+    result_key,
+)
+from app.services.detectors import (
+    Detector,
+    get_detector,
+    register_detector,
+    registered_detectors,
+)
+from app.services.dicom_service import ModelInput, get_model_input
+from app.services.roboflow_client import get_roboflow_client, roboflow_stats
+from app.util.cache import SingleFlight
 
 # --- Configuration ---
 ROBOFLOW_API_KEY = settings.ROBOFLOW_API_KEY
@@ -27,38 +37,72 @@ else:
         f"--- ai_service.py: ROBOFLOW_API_KEY found: {ROBOFLOW_API_KEY[:5]}... (masked for security)"
     )
 
+_result_cache: Optional[AiResultCache] = None
+# Concurrent analyses of the same image with the same model share one run,
+# keyed by (dicom_id, model_type).
+_analysis_flights: SingleFlight[tuple[str, str], AiAnalysisResult] = SingleFlight()
 
-# --- Image Conversion Utilities ---
-def _convert_to_pil_image(png_base64_data: str) -> Image.Image:
-    image_bytes = base64.b64decode(png_base64_data)
-    image_file = io.BytesIO(image_bytes)
-    pil_image = Image.open(image_file).convert("RGB")  # Ensure RGB
-    return pil_image
+
+def start_ai_result_cache() -> AiResultCache:
+    """
+    Creates the AI result cache. Called from main.create_app on startup, and
+    lazily on first use otherwise. Results of models other than the loaded
+    detectors, left in the disk tier by earlier runs, are deleted here.
+    """
+    global _result_cache
+    if _result_cache is not None:
+        return _result_cache
+    _result_cache = AiResultCache(
+        settings.AI_RESULT_CACHE_BUDGET_BYTES, settings.AI_RESULT_CACHE_DIR
+    )
+    detectors = registered_detectors()
+    if not detectors:
+        return _result_cache  # nothing loaded yet to tell current from stale
+    removed = _result_cache.retain_namespaces(
+        {model_namespace(d.model_type, d.model_id) for d in detectors}
+    )
+    if removed:
+        model_ids = ", ".join(d.model_id for d in detectors)
+        print(
+            f"--- AI RESULT CACHE: Dropped {removed} results of models other than {model_ids}."
+        )
+    return _result_cache
+
+
+def invalidate_ai_results() -> None:
+    """Forgets every cached AI result, e.g. after a model was retrained in place."""
+    start_ai_result_cache().clear()
+
+
+def ai_stats() -> Dict[str, Dict[str, int]]:
+    return {
+        "ai_result_cache": start_ai_result_cache().stats(),
+        "ai_requests": _analysis_flights.stats(),
+        "roboflow": roboflow_stats(),
+    }
 
 
-async def run_roboflow_object_detection(pil_image: Image.Image) -> DetectionResult:
+def _detection_result_key(model_input: ModelInput, detector: Detector) -> ResultKey:
+    input_sha256 = hashlib.sha256(model_input.image_base64.encode("ascii")).hexdigest()
+    return result_key(
+        input_sha256, detector.model_type, detector.model_id, detector.params()
+    )
+
+
+async def run_roboflow_object_detection(model_input: ModelInput) -> DetectionResult:
     if not ROBOFLOW_API_KEY:
         raise ValueError("Roboflow API key not configured on the server.")
 
-    client = InferenceHTTPClient(
-        api_url="https://detect.roboflow.com", api_key=ROBOFLOW_API_KEY
-    )
+    client = get_roboflow_client()
 
     try:
         print(
             f"--- AI SERVICE: Calling Roboflow model {ROBOFLOW_MODEL_ID} with Base64 encoded JPEG image ---"
         )
 
-        # Convert PIL image to JPEG bytes, then to base64 string
-        buffer = io.BytesIO()
-        pil_image.save(
-            buffer, format="JPEG", quality=90
-        )  # Save as JPEG to buffer, adjust quality if needed
-        image_bytes = buffer.getvalue()
-        base64_image_string = base64.b64encode(image_bytes).decode("utf-8")
-
-        roboflow_result = client.infer(
-            base64_image_string,  # Pass the base64 string
+        # The base64 JPEG was encoded once at ingest (dicom_service.get_model_input).
+        roboflow_result = await client.infer(
+            model_input.image_base64,
             model_id=ROBOFLOW_MODEL_ID,
             # Confidence and overlap are typically set on the Roboflow platform for the deployed model.
             # Passing them here might not have an effect or might not be supported by the SDK for hosted API.
@@ -144,11 +188,11 @@ async def run_roboflow_object_detection(pil_image: Image.Image) -> DetectionResu
             x2 = float(x_center) + float(width) / 2
             y2 = float(y_center) + float(height) / 2
 
-            img_width_pil, img_height_pil = pil_image.size
-            x1 = max(0.0, min(x1, float(img_width_pil)))
-            y1 = max(0.0, min(y1, float(img_height_pil)))
-            x2 = max(0.0, min(x2, float(img_width_pil)))
-            y2 = max(0.0, min(y2, float(img_height_pil)))
+            img_width, img_height = model_input.width, model_input.height
+            x1 = max(0.0, min(x1, float(img_width)))
+            y1 = max(0.0, min(y1, float(img_height)))
+            x2 = max(0.0, min(x2, float(img_width)))
+            y2 = max(0.0, min(y2, float(img_height)))
 
             # Ensure width and height of box are positive after clamping
             if x2 <= x1 or y2 <= y1:
@@ -170,15 +214,6 @@ async def run_roboflow_object_detection(pil_image: Image.Image) -> DetectionResu
         print(f"--- AI SERVICE: Parsed Bounding Boxes count: {len(boxes)} ---")
         return DetectionResult(boxes=boxes)
 
-    except InvalidInputFormatError as iife:
-        print(
-            f"--- ERROR in run_roboflow_object_detection (InvalidInputFormatError): {iife}"
-        )
-        traceback.print_exc()
-        # This error typically means the SDK couldn't process the input type (e.g. string, path, PIL, numpy)
-        raise RuntimeError(
-            f"Roboflow SDK rejected input image format: {iife}"
-        ) from iife
     except Exception as e:
         # This catches other errors, like network issues, API key problems, server errors from Roboflow etc.
         print(f"--- ERROR in run_roboflow_object_detection: {e}")
@@ -202,27 +237,91 @@ async def run_roboflow_object_detection(pil_image: Image.Image) -> DetectionResu
         raise RuntimeError(error_message) from e
 
 
+class RoboflowDetector(Detector):
+    """Roboflow's hosted model (ROBOFLOW_MODEL_ID), through the pooled client."""
+
+    @property
+    def model_id(self) -> str:
+        return ROBOFLOW_MODEL_ID
+
+    def params(self) -> Dict[str, Any]:
+        return {"confidence": ROBOFLOW_CONFIDENCE_THRESHOLD}
+
+    async def detect(self, dicom_id: str, model_input: ModelInput) -> DetectionResult:
+        return await run_roboflow_object_detection(model_input)
+
+
+def load_detectors() -> None:
+    """
+    Loads and registers the detector for settings.AI_DETECTION_BACKEND. Called
+    from main.create_app on startup, so model weights are read before the
+    first request, and lazily by _get_detector otherwise.
+    """
+    if settings.AI_DETECTION_BACKEND == "onnx":
+        from app.services.onnx_detector import OnnxDetector
+
+        detector: Detector = OnnxDetector(
+            settings.ONNX_DETECTION_MODEL_PATH,
+            confidence_threshold=settings.ONNX_CONFIDENCE_THRESHOLD,
+            iou_threshold=settings.ONNX_IOU_THRESHOLD,
+            max_concurrent_runs=settings.ONNX_MAX_CONCURRENT_RUNS,
+            intra_op_threads=settings.ONNX_INTRA_OP_THREADS,
+        )
+    else:
+        detector = RoboflowDetector()
+    detector.load()
+    register_detector(detector)
+
+
+def available_model_types() -> List[str]:
+    """Model types with a registered detector, loading the detectors if needed."""
+    if not registered_detectors():
+        load_detectors()
+    return sorted(detector.model_type for detector in registered_detectors())
+
+
+def _get_detector(model_type: str) -> Optional[Detector]:
+    if not registered_detectors():
+        load_detectors()
+    return get_detector(model_type)
+
+
 async def process_image_with_ai(dicom_id: str, model_type: str) -> AiAnalysisResult:
-    if model_type != "detection":
+    if _get_detector(model_type) is None:
         print(
-            f"--- AI SERVICE: Model type '{model_type}' not supported with current Roboflow setup. Only 'detection' is. Skipping. ---"
+            f"--- AI SERVICE: No detector registered for model type '{model_type}'. Skipping. ---"
         )
         return AiAnalysisResult(
             model_type=model_type
         )  # Return empty result for other types
 
+    # Waiters get the shared run's result or exception; one that disconnects
+    # only cancels the run if nobody else is waiting for it.
+    return await _analysis_flights.do(
+        (dicom_id, model_type), lambda: _analyze_image(dicom_id, model_type)
+    )
+
+
+async def _analyze_image(dicom_id: str, model_type: str) -> AiAnalysisResult:
     try:
-        image_payload = await get_image_payload(dicom_id)
-        if not image_payload:
+        model_input = await get_model_input(dicom_id)
+        if not model_input:
             raise ValueError(
                 "Original DICOM image payload not found for AI processing."
             )
 
-        pil_img = _convert_to_pil_image(image_payload.png_data)
-
-        if model_type == "detection":
-            detection_results = await run_roboflow_object_detection(pil_img)
-            return AiAnalysisResult(detection=detection_results, model_type=model_type)
+        detector = _get_detector(model_type)
+        if detector is not None:
+            result_cache = start_ai_result_cache()
+            cache_key = _detection_result_key(model_input, detector)
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                print(f"--- AI SERVICE: Cached detection result for {dicom_id}. ---")
+                return cached
+            detection_results = await detector.detect(dicom_id, model_input)
+            result = AiAnalysisResult(detection=detection_results, model_type=model_type)
+            result_cache.put(cache_key, result)
+            return result
         else:
             # This case should ideally not be reached due to the check above
             raise ValueError(
@@ -231,13 +330,13 @@ async def process_image_with_ai(dicom_id: str, model_type: str) -> AiAnalysisRes
 
     except (FileNotFoundError, ValueError, RuntimeError, ImportError) as e:
         print(
-            f"--- ERROR in process_image_with_ai for {model_type} (Roboflow): {e} ---"
+            f"--- ERROR in process_image_with_ai for {model_type}: {e} ---"
         )
         traceback.print_exc()  # Log details
         raise  # Re-raise to be caught by the API route handler
     except Exception as e:
         print(
-            f"--- UNEXPECTED ERROR in process_image_with_ai for {model_type} (Roboflow): {e} ---"
+            f"--- UNEXPECTED ERROR in process_image_with_ai for {model_type}: {e} ---"
         )
         traceback.print_exc()  # Log details
         raise  # Re-raise
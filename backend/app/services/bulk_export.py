@@ -0,0 +1,123 @@
+import asyncio
+import json
+import zipfile
+from collections import deque
+from typing import AsyncIterator, Optional
+
+from app.core.config import settings
+from app.models.dicom_updates import BulkExportItem
+from app.services.dicom_service import (
+    DicomExport,
+    export_modified_dicom,
+    get_original_export,
+)
+
+MANIFEST_NAME = "manifest.json"
+
+
+class _ZipSink:
+    """Write-only file object for zipfile; what it collects is drained after every write."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def _prepare_entry(item: BulkExportItem) -> tuple[Optional[DicomExport], Optional[str]]:
+    try:
+        if item.updates:
+            export = await export_modified_dicom(item.dicom_id, item.updates)
+        else:
+            export = await get_original_export(item.dicom_id)
+    except Exception as e:
+        print(f"--- BULK EXPORT ERROR (ID: {item.dicom_id}): {e}")
+        return None, str(e)
+    if export is None:
+        return None, "DICOM not found or could not be exported"
+    return export, None
+
+
+def _entry_name(item: BulkExportItem, used: set[str]) -> str:
+    suffix = "modified" if item.updates else "original"
+    name = f"{item.dicom_id}_{suffix}.dcm"
+    counter = 1
+    while name in used:  # the same study requested more than once
+        counter += 1
+        name = f"{item.dicom_id}_{suffix}_{counter}.dcm"
+    used.add(name)
+    return name
+
+
+async def stream_bulk_export(items: list[BulkExportItem]) -> AsyncIterator[bytes]:
+    """
+    Streams a ZIP with one DICOM per item, in request order, plus a manifest.json
+    listing each item's file name or error.
+
+    Up to BULK_EXPORT_CONCURRENCY entries are prepared (exports built in the
+    worker pool) ahead of the one being written. Preparing an entry opens its
+    stored file, so a file evicted or expired later is still written whole,
+    and one already gone is an error in the manifest, not a broken archive.
+    Entries are stored uncompressed and written chunk by chunk, so memory use
+    is bounded by the chunk size, not by the archive or file sizes.
+    """
+    sink = _ZipSink()
+    zip_file = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED)
+    remaining = iter(items)
+    pending: deque[tuple[BulkExportItem, asyncio.Future]] = deque()
+    manifest: list[dict[str, Optional[str]]] = []
+    used_names: set[str] = set()
+
+    def schedule() -> None:
+        while len(pending) < settings.BULK_EXPORT_CONCURRENCY:
+            item = next(remaining, None)
+            if item is None:
+                return
+            pending.append((item, asyncio.ensure_future(_prepare_entry(item))))
+
+    try:
+        schedule()
+        while pending:
+            item, prepared = pending.popleft()
+            export, error = await prepared
+            schedule()
+            if export is None:
+                manifest.append({"dicom_id": item.dicom_id, "file": None, "error": error})
+                continue
+
+            name = _entry_name(item, used_names)
+            chunks = export.iter_bytes(settings.DOWNLOAD_CHUNK_SIZE)
+            with zip_file.open(name, "w", force_zip64=True) as entry:
+                # File reads go to a thread so a slow disk doesn't stall the loop.
+                while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+                    entry.write(chunk)
+                    yield sink.drain()
+            manifest.append({"dicom_id": item.dicom_id, "file": name, "error": None})
+            yield sink.drain()
+
+        zip_file.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+        zip_file.close()
+        yield sink.drain()
+        print(
+            f"--- BULK EXPORT: Streamed {sum(1 for m in manifest if m['file'])} of {len(items)} DICOMs."
+        )
+    finally:
+        # Client gone or an error mid-stream: don't leave exports running, and
+        # close the files of those already prepared.
+        for _, prepared in pending:
+            if not prepared.done():
+                prepared.cancel()
+            elif not prepared.cancelled() and prepared.exception() is None:
+                export, _ = prepared.result()
+                if export is not None:
+                    export.close()
@@ -0,0 +1,130 @@
+import asyncio
+import zipfile
+from contextlib import aclosing
+from typing import IO, AsyncIterator, Awaitable, Iterator, Optional
+
+from app.core.config import settings
+from app.services.dicom_service import (
+    DicomParsingError,
+    DicomUploadTooLargeError,
+    save_and_parse,
+)
+from app.services.worker_pool import WorkerPoolBusyError
+from app.util.streaming import bounded_as_completed, ndjson_line
+from fastapi import UploadFile
+
+_ZIP_MAGIC = b"PK\x03\x04"
+_ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed"}
+
+
+class _ZipMemberUpload:
+    """
+    One ZIP member, with the part of the UploadFile interface save_and_parse
+    uses (filename and an async read). Reads run in a thread; ZipFile
+    serializes access to the shared archive file itself.
+    """
+
+    def __init__(self, archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+        self.filename = info.filename
+        self._archive = archive
+        self._info = info
+        self._member: Optional[IO[bytes]] = None
+
+    async def read(self, size: int = -1) -> bytes:
+        if self._member is None:
+            self._member = await asyncio.to_thread(self._archive.open, self._info)
+        chunk = await asyncio.to_thread(self._member.read, size)
+        if not chunk:
+            self._member.close()
+        return chunk
+
+
+def _is_zip(file: UploadFile) -> bool:
+    if (file.content_type or "").lower() in _ZIP_CONTENT_TYPES:
+        return True
+    head = file.file.read(len(_ZIP_MAGIC))
+    file.file.seek(0)
+    return head == _ZIP_MAGIC
+
+
+def _zip_members(archive: zipfile.ZipFile) -> Iterator[zipfile.ZipInfo]:
+    for info in archive.infolist():
+        name = info.filename.rsplit("/", 1)[-1]
+        if info.is_dir() or info.filename.startswith("__MACOSX/") or name.startswith("."):
+            continue
+        if name.upper() == "DICOMDIR":  # index file, carries no image
+            continue
+        yield info
+
+
+def _iter_uploads(files: list[UploadFile]) -> Iterator[tuple[str, object, Optional[str]]]:
+    """(name, upload, error) for every DICOM in the request, with ZIPs expanded."""
+    for file in files:
+        if _is_zip(file):
+            try:
+                archive = zipfile.ZipFile(file.file)
+            except zipfile.BadZipFile as e:
+                yield file.filename or "upload.zip", None, f"Not a valid ZIP archive: {e}"
+                continue
+            for info in _zip_members(archive):
+                yield f"{file.filename}/{info.filename}", _ZipMemberUpload(archive, info), None
+        elif (file.content_type or "").lower() == "application/dicom":
+            yield file.filename or "upload.dcm", file, None
+        else:
+            yield file.filename or "upload", None, (
+                f"Invalid file type '{file.content_type}'. Only DICOM files (application/dicom) or ZIP archives are allowed."
+            )
+
+
+async def _ingest_one(name: str, upload) -> dict:
+    try:
+        dicom_id = await save_and_parse(upload)
+    except DicomUploadTooLargeError as e_too_large:
+        return {"file": name, "status": 413, "error": str(e_too_large)}
+    except WorkerPoolBusyError as e_busy:
+        return {"file": name, "status": 503, "error": str(e_busy)}
+    except DicomParsingError as e_parse:
+        return {"file": name, "status": 422, "error": f"Failed to process DICOM file: {e_parse}"}
+    return {"file": name, "status": 200, "dicom_id": dicom_id}
+
+
+async def _rejected(record: dict) -> dict:
+    return record
+
+
+def _ingest_jobs(files: list[UploadFile]) -> Iterator[Awaitable[dict]]:
+    """One job per file of the request; rejected files just report their error."""
+    for count, (name, upload, error) in enumerate(_iter_uploads(files)):
+        if count >= settings.BULK_UPLOAD_MAX_FILES:
+            yield _rejected(
+                {
+                    "file": name,
+                    "status": 413,
+                    "error": f"Only the first {settings.BULK_UPLOAD_MAX_FILES} files of a bulk upload are ingested.",
+                }
+            )
+            return
+        if error is not None:
+            yield _rejected({"file": name, "status": 400, "error": error})
+        else:
+            yield _ingest_one(name, upload)
+
+
+async def stream_bulk_ingest(files: list[UploadFile]) -> AsyncIterator[bytes]:
+    """
+    Ingests many DICOMs (plain files or the members of ZIP archives) with up
+    to BULK_UPLOAD_CONCURRENCY in flight, and streams one NDJSON line per
+    file as soon as it is done: {"file", "status", "dicom_id"} on success,
+    {"file", "status", "error"} on failure (status as the single /upload
+    endpoint would answer). A final {"done": true, ...} line has the totals.
+    """
+    counts = {"ingested": 0, "failed": 0}
+    async with aclosing(
+        bounded_as_completed(_ingest_jobs(files), settings.BULK_UPLOAD_CONCURRENCY)
+    ) as records:
+        async for record in records:
+            counts["ingested" if "dicom_id" in record else "failed"] += 1
+            yield ndjson_line(record)
+
+    print(f"--- BULK UPLOAD: {counts['ingested']} ingested, {counts['failed']} failed.")
+    yield ndjson_line({"done": True, **counts})
@@ -0,0 +1,50 @@
+# backend/app/services/detectors.py
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from app.models.ai_results import DetectionResult
+from app.services.dicom_service import ModelInput
+
+# Loaded detectors by model_type (the {model_type} of api/v1/ai.py). Filled by
+# ai_service.load_detectors at startup.
+_registry: Dict[str, "Detector"] = {}
+
+
+class Detector(ABC):
+    """
+    One detection backend, e.g. the hosted Roboflow model or a local ONNX model.
+
+    model_id (including a version) and params() go into AI result cache keys,
+    so a different model or threshold never reuses an old result.
+    """
+
+    model_type: str = "detection"
+
+    @property
+    @abstractmethod
+    def model_id(self) -> str: ...
+
+    def params(self) -> Dict[str, Any]:
+        """Settings that change the output, such as thresholds."""
+        return {}
+
+    def load(self) -> None:
+        """Heavy one-time setup (loading weights); called before registering."""
+
+    @abstractmethod
+    async def detect(self, dicom_id: str, model_input: ModelInput) -> DetectionResult: ...
+
+
+def register_detector(detector: Detector) -> None:
+    _registry[detector.model_type] = detector
+    print(
+        f"--- DETECTORS: '{detector.model_type}' -> {type(detector).__name__} ({detector.model_id})."
+    )
+
+
+def get_detector(model_type: str) -> Optional[Detector]:
+    return _registry.get(model_type)
+
+
+def registered_detectors() -> List[Detector]:
+    return list(_registry.values())
@@ -1,20 +1,144 @@
 import base64
+import copy
+import hashlib
 import io
+import os
+import sys
+import tempfile
 import traceback
 import uuid
-from typing import Any, Dict, Optional
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, NamedTuple, Optional, Union
 
+import numpy as np
 import pydicom
 import pydicom.valuerep  # Ensure this is imported for DSfloat, IS, etc.
+from app.core.config import settings
 from app.models.dicom_meta import DicomMeta
 from app.models.image_payload import ImagePayload
-from app.util.image_utils import _to_png
+from app.models.pyramid import PyramidInfo, PyramidLevel
+from app.services.image_store import TieredImageStore
+from app.services.worker_pool import WorkerPoolBusyError, run_in_worker
+from app.util.cache import LRUCache, SingleFlight
+from app.util import pyramid
+from app.util.image_utils import _encode_image, _encode_preview, _to_uint8
+from app.util.pixel_decode import (
+    DicomSource,
+    decoder_stats,
+    frame_count,
+    open_source,
+    read_frame,
+)
 from fastapi import UploadFile
 from pydicom import dcmread
 from pydicom.errors import InvalidDicomError
+from pydicom.multival import MultiValue
+from pydicom.sequence import Sequence
 
-_memory_store: dict[str, ImagePayload] = {}
-_raw_dicom_store: dict[str, bytes] = {}
+# Rendered PNGs ("<id>:png") and DicomMeta JSON ("<id>:meta") for each upload.
+_image_store = TieredImageStore(
+    "images",
+    settings.IMAGE_STORE_MEMORY_BUDGET_BYTES,
+    settings.IMAGE_STORE_DIR,
+    ttl_seconds=settings.IMAGE_STORE_TTL_SECONDS,
+    disk_budget_bytes=settings.IMAGE_STORE_DISK_BUDGET_BYTES,
+)
+# Original DICOM files, keyed by dicom_id. Spool files are moved straight into
+# the disk tier; small ones get promoted to memory when they are read.
+_raw_dicom_store = TieredImageStore(
+    "raw",
+    settings.RAW_STORE_MEMORY_BUDGET_BYTES,
+    settings.IMAGE_STORE_DIR,
+    ttl_seconds=settings.IMAGE_STORE_TTL_SECONDS,
+    disk_budget_bytes=settings.RAW_STORE_DISK_BUDGET_BYTES,
+)
+# Identical uploads arriving at the same time share one parse, and concurrent
+# first fetches of a lazily ingested image share one render.
+_ingest_flights: SingleFlight[str, None] = SingleFlight()
+_render_flights: SingleFlight[str, None] = SingleFlight()
+
+# Decoded full-depth pixel arrays with a header-only Dataset, for re-rendering
+# with other window settings without decoding the DICOM again.
+_DecodedPixels = tuple[np.ndarray, pydicom.Dataset]
+_pixel_cache: LRUCache[str, _DecodedPixels] = LRUCache(
+    settings.PIXEL_CACHE_BUDGET_BYTES, sizeof=lambda pixels: pixels[0].nbytes
+)
+_decode_flights: SingleFlight[str, _DecodedPixels] = SingleFlight()
+# Header-only Datasets parsed at ingest, with the offset of the Pixel Data
+# element in the stored file. Entries are shared: callers get them through
+# _get_header, which hands out a deep copy. They hold no reference to the file
+# they were read from (see _dcmread), so their size is that of their elements
+# and spill files don't stay mapped while their headers are cached.
+class _DicomHeader(NamedTuple):
+    dataset: pydicom.Dataset
+    pixel_offset: int
+
+
+def _dataset_nbytes(ds: pydicom.Dataset) -> int:
+    """
+    Measured size of a Dataset's element objects and their values, sequence
+    items included (sys.getsizeof). Interpreter overhead such as the element
+    dict itself isn't counted, so the real footprint is somewhat larger.
+    """
+    total = sys.getsizeof(ds)
+    for elem in ds.values():
+        total += sys.getsizeof(elem)
+        value = elem.value
+        if isinstance(value, Sequence):
+            total += sum(_dataset_nbytes(item) for item in value)
+        elif isinstance(value, (MultiValue, list, tuple)):
+            total += sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value)
+        else:
+            total += sys.getsizeof(value)
+    return total
+
+
+def _header_size(header: _DicomHeader) -> int:
+    file_meta = getattr(header.dataset, "file_meta", None)
+    meta_size = _dataset_nbytes(file_meta) if file_meta is not None else 0
+    return _dataset_nbytes(header.dataset) + meta_size
+
+
+_header_cache: LRUCache[str, _DicomHeader] = LRUCache(
+    settings.HEADER_CACHE_BUDGET_BYTES, sizeof=_header_size
+)
+_header_flights: SingleFlight[str, Optional[_DicomHeader]] = SingleFlight()
+# PNGs rendered by render_windowed_png, keyed by (dicom_id, wc, ww, invert, scale).
+_window_render_cache: LRUCache[tuple, bytes] = LRUCache(
+    settings.WINDOW_RENDER_CACHE_BUDGET_BYTES
+)
+_window_render_flights: SingleFlight[tuple, Optional[bytes]] = SingleFlight()
+# Default-windowed uint8 images per pyramid level, keyed by (dicom_id, level).
+# Tiles are cut from these and kept in _image_store as "<id>:tile:<level>:<x>:<y>".
+_level_cache: LRUCache[tuple[str, int], np.ndarray] = LRUCache(
+    settings.TILE_LEVEL_CACHE_BUDGET_BYTES, sizeof=lambda image: image.nbytes
+)
+_level_flights: SingleFlight[tuple[str, int], Optional[np.ndarray]] = SingleFlight()
+# Coalesces on-demand renders of derived images (tiles, previews), keyed by store key.
+_derived_image_flights: SingleFlight[str, Optional[bytes]] = SingleFlight()
+
+
+class _ParsedUpload(NamedTuple):
+    png: bytes
+    preview: bytes
+    model_input: bytes
+    meta: DicomMeta
+    pixels: _DecodedPixels
+    display: np.ndarray  # default-windowed uint8 image (pyramid level 0)
+    header: _DicomHeader
+
+
+class _ParsedHeader(NamedTuple):
+    meta: DicomMeta
+    header: _DicomHeader
+
+
+class ModelInput(NamedTuple):
+    """Image as sent to the AI models: a base64 JPEG plus its size in pixels."""
+
+    image_base64: str
+    width: int
+    height: int
 
 
 class DicomParsingError(ValueError):
@@ -23,174 +147,478 @@ class DicomParsingError(ValueError):
     pass
 
 
-async def save_and_parse(file: UploadFile) -> str:
-    dicom_id = str(uuid.uuid4())
-    print(f"--- UPLOAD START (ID: {dicom_id}): Processing file '{file.filename}'")
+class DicomUploadTooLargeError(DicomParsingError):
+    """Raised when an upload exceeds settings.UPLOAD_MAX_BYTES."""
+
+    pass
+
+
+async def _spool_upload(file: UploadFile) -> tuple[Path, str]:
+    """
+    Streams the upload body into a file in settings.UPLOAD_SPOOL_DIR.
+
+    The body is copied in UPLOAD_CHUNK_SIZE pieces, so at most one chunk of the
+    upload is held in memory at a time. The spool file is removed again if the
+    copy fails or the upload is larger than UPLOAD_MAX_BYTES.
 
+    Returns the spool path and the SHA-256 hex digest of the content.
+    """
+    spool_dir = Path(settings.UPLOAD_SPOOL_DIR)
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    fd, spool_name = tempfile.mkstemp(suffix=".dcm", dir=spool_dir)
+    spool_path = Path(spool_name)
+
+    written = 0
+    digest = hashlib.sha256()
     try:
-        data = await file.read()
-        _raw_dicom_store[dicom_id] = data
+        with os.fdopen(fd, "wb") as spool:
+            while True:
+                chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > settings.UPLOAD_MAX_BYTES:
+                    raise DicomUploadTooLargeError(
+                        f"Upload exceeds the maximum allowed size of {settings.UPLOAD_MAX_BYTES} bytes."
+                    )
+                digest.update(chunk)
+                spool.write(chunk)
+    except BaseException:
+        spool_path.unlink(missing_ok=True)
+        raise
+
+    return spool_path, digest.hexdigest()
+
+
+def _content_id(sha256_hex: str) -> str:
+    """
+    dicom_id for a file with the given SHA-256 digest.
+
+    IDs are content-addressed so a re-upload of the same file maps to the entry
+    that is already stored. The first 128 bits are formatted as a UUID to keep
+    the ID shape the frontend already knows.
+    """
+    return str(uuid.UUID(hex=sha256_hex[:32]))
+
+
+def _discard_spool(spool_path: Optional[Path]) -> None:
+    if spool_path is not None:
+        spool_path.unlink(missing_ok=True)
+
+
+def _png_key(dicom_id: str) -> str:
+    return f"{dicom_id}:png"
+
+
+def _meta_key(dicom_id: str) -> str:
+    return f"{dicom_id}:meta"
+
+
+def _preview_key(dicom_id: str) -> str:
+    return f"{dicom_id}:preview"
+
+
+def _model_input_key(dicom_id: str) -> str:
+    return f"{dicom_id}:model_input"
+
+
+def _image_key(dicom_id: str, image_format: str) -> str:
+    return f"{dicom_id}:image.{image_format}"
+
 
+def _frame_key(dicom_id: str, index: int) -> str:
+    return f"{dicom_id}:frame:{index}"
+
+
+def _tile_key(dicom_id: str, level: int, x: int, y: int) -> str:
+    return f"{dicom_id}:tile:{level}:{x}:{y}"
+
+
+def _is_stored(dicom_id: str) -> bool:
+    # Also gates the in-memory caches derived from a stored image (pixels,
+    # headers, pyramid levels, windowed renders), which aren't tied to the
+    # store's TTL: once the store entries are gone, so is the image.
+    # The PNG is not required: it may not be rendered yet (LAZY_RENDER) or may
+    # have been dropped, and is re-rendered from the raw file on demand.
+    return dicom_id in _raw_dicom_store and _meta_key(dicom_id) in _image_store
+
+
+def _raw_source(dicom_id: str) -> Optional[DicomSource]:
+    raw_path = _raw_dicom_store.path(dicom_id)
+    if raw_path is not None:
+        return raw_path
+    raw_view = _raw_dicom_store.get(dicom_id)
+    return bytes(raw_view) if raw_view is not None else None
+
+
+def _open_source(source: DicomSource) -> Optional[Union[bytes, BinaryIO]]:
+    """
+    `source` with a disk-store path opened for reading, or None if the file
+    is already gone. The open file stays readable if the store unlinks it.
+    """
+    if isinstance(source, bytes):
+        return source
+    try:
+        return open(source, "rb")
+    except FileNotFoundError:
+        return None
+
+
+def _dcmread(src, dicom_id: str, stop_before_pixels: bool) -> pydicom.Dataset:
+    try:
+        ds = pydicom.dcmread(src, force=True, stop_before_pixels=stop_before_pixels)
+    except InvalidDicomError as e_dicom_invalid:
+        print(
+            f"--- UPLOAD ERROR (ID: {dicom_id}): pydicom.dcmread failed - Invalid DICOM file: {e_dicom_invalid}"
+        )
+        traceback.print_exc()
+        raise DicomParsingError(
+            f"The uploaded file is not a valid DICOM file or is corrupted: {e_dicom_invalid}"
+        ) from e_dicom_invalid
+    except Exception as e_dcmread_generic:
+        print(
+            f"--- UPLOAD ERROR (ID: {dicom_id}): pydicom.dcmread failed with generic error: {e_dcmread_generic}"
+        )
+        traceback.print_exc()
+        raise DicomParsingError(
+            f"Could not read DICOM file: {e_dcmread_generic}"
+        ) from e_dcmread_generic
+    # Drop the reference to the source, which is usually a memory map: the
+    # Dataset is pickled back from process-pool workers, and kept in caches
+    # long after the file it came from may have been unlinked.
+    ds.buffer = None
+    return ds
+
+
+def _read_dataset(
+    source: DicomSource, dicom_id: str, stop_before_pixels: bool = False
+) -> pydicom.Dataset:
+    # Raw files are passed to workers as a path when they live on disk and as
+    # bytes when they are held in memory (both are picklable for process pools).
+    try:
+        with open_source(source) as src:
+            return _dcmread(src, dicom_id, stop_before_pixels)
+    except OSError as e_open:
+        raise DicomParsingError(f"Could not read DICOM file: {e_open}") from e_open
+
+
+def _read_header(source: DicomSource, dicom_id: str) -> _DicomHeader:
+    """Header-only Dataset plus the offset its Pixel Data element starts at."""
+    try:
+        with open_source(source) as src:
+            ds = _dcmread(src, dicom_id, stop_before_pixels=True)
+            return _DicomHeader(ds, src.tell())
+    except OSError as e_open:
+        raise DicomParsingError(f"Could not read DICOM file: {e_open}") from e_open
+
+
+def _decode_pixels(
+    source: DicomSource, dicom_id: str, index: Optional[int] = None
+) -> np.ndarray:
+    """Decodes frame `index` of a stored DICOM (all frames if None)."""
+    try:
+        decoded = read_frame(source, index)
+        print(
+            f"--- DECODE (ID: {dicom_id}): {decoded.decoder} decoder, {decoded.seconds * 1000:.1f} ms."
+        )
+        return decoded.pixels
+    except Exception as e_pixel_array:
+        print(
+            f"--- UPLOAD ERROR (ID: {dicom_id}): Error accessing ds.pixel_array: {e_pixel_array}"
+        )
+        if (
+            "decompress_image" in str(e_pixel_array).lower()
+            or "gdcm" in str(e_pixel_array).lower()
+            or "pylibjpeg" in str(e_pixel_array).lower()
+        ):
+            error_detail = "Missing dependency or unsupported compression for pixel data. Ensure GDCM or pylibjpeg-libjpeg is installed if needed."
+            print(f"--- UPLOAD ERROR DETAIL (ID: {dicom_id}): {error_detail}")
+            raise DicomParsingError(error_detail) from e_pixel_array
+        traceback.print_exc()
+        raise DicomParsingError(
+            f"Failed to access pixel data from DICOM: {e_pixel_array}"
+        ) from e_pixel_array
+
+
+def _render_pixels(
+    arr: np.ndarray,
+    ds: pydicom.Dataset,
+    dicom_id: str,
+    window_center: Optional[float] = None,
+    window_width: Optional[float] = None,
+    invert: bool = False,
+    scale: float = 1.0,
+    image_format: str = "png",
+) -> bytes:
+    try:
+        display = _to_uint8(arr, ds, window_center, window_width, invert)
+        image_bytes = _encode_display(display, image_format, scale)
+    except Exception as e_render:
+        print(
+            f"--- RENDER ERROR (ID: {dicom_id}): Error converting DICOM to {image_format}: {e_render}"
+        )
+        traceback.print_exc()
+        raise DicomParsingError(
+            f"Failed to convert DICOM to {image_format} image: {e_render}"
+        ) from e_render
+    return image_bytes
+
+
+def _encode_display(
+    img: np.ndarray, image_format: str = "png", scale: float = 1.0
+) -> bytes:
+    """Encodes a uint8 display image with the configured encoder settings."""
+    return _encode_image(
+        img,
+        image_format,
+        scale,
+        png_compress_level=settings.PNG_COMPRESS_LEVEL,
+        webp_method=settings.WEBP_METHOD,
+        jpeg_quality=settings.JPEG_QUALITY,
+    )
+
+
+def _encode_model_input(img: np.ndarray) -> bytes:
+    """Base64 JPEG of a uint8 display image, ready to be posted to a detection model."""
+    jpeg = _encode_image(img, "jpeg", jpeg_quality=settings.AI_INPUT_JPEG_QUALITY)
+    return base64.b64encode(jpeg)
+
+
+def _display_image(arr: np.ndarray, ds: pydicom.Dataset, dicom_id: str) -> np.ndarray:
+    """Default-windowed uint8 image, the base level of the tile pyramid."""
+    try:
+        return _to_uint8(arr, ds)
+    except Exception as e_display:
+        print(
+            f"--- RENDER ERROR (ID: {dicom_id}): Could not window pixel data: {e_display}"
+        )
+        traceback.print_exc()
+        raise DicomParsingError(
+            f"Failed to convert DICOM pixel data for display: {e_display}"
+        ) from e_display
+
+
+def _optional_float(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _extract_meta(ds: pydicom.Dataset, dicom_id: str) -> DicomMeta:
+    wc_parsed = None
+    ww_parsed = None
+    raw_wc = ds.get("WindowCenter", None)
+    raw_ww = ds.get("WindowWidth", None)
+
+    if raw_wc is not None:
         try:
-            ds = pydicom.dcmread(io.BytesIO(data), force=True)
-        except InvalidDicomError as e_dicom_invalid:
-            print(
-                f"--- UPLOAD ERROR (ID: {dicom_id}): pydicom.dcmread failed - Invalid DICOM file: {e_dicom_invalid}"
+            wc_val = (
+                raw_wc[0]
+                if isinstance(raw_wc, pydicom.multival.MultiValue)
+                and len(raw_wc) > 0
+                else raw_wc
             )
-            traceback.print_exc()
-            raise DicomParsingError(
-                f"The uploaded file is not a valid DICOM file or is corrupted: {e_dicom_invalid}"
-            ) from e_dicom_invalid
-        except Exception as e_dcmread_generic:
+            wc_parsed = float(wc_val)
+        except (ValueError, TypeError, IndexError) as e_wc:
             print(
-                f"--- UPLOAD ERROR (ID: {dicom_id}): pydicom.dcmread failed with generic error: {e_dcmread_generic}"
+                f"--- UPLOAD WARNING (ID: {dicom_id}): Could not parse WindowCenter '{raw_wc}': {e_wc}. Setting to None."
             )
-            traceback.print_exc()
-            raise DicomParsingError(
-                f"Could not read DICOM file: {e_dcmread_generic}"
-            ) from e_dcmread_generic
 
+    if raw_ww is not None:
         try:
-            arr = ds.pixel_array
-        except Exception as e_pixel_array:
+            ww_val = (
+                raw_ww[0]
+                if isinstance(raw_ww, pydicom.multival.MultiValue)
+                and len(raw_ww) > 0
+                else raw_ww
+            )
+            ww_parsed = float(ww_val)
+        except (ValueError, TypeError, IndexError) as e_ww:
             print(
-                f"--- UPLOAD ERROR (ID: {dicom_id}): Error accessing ds.pixel_array: {e_pixel_array}"
+                f"--- UPLOAD WARNING (ID: {dicom_id}): Could not parse WindowWidth '{raw_ww}': {e_ww}. Setting to None."
             )
-            if (
-                "decompress_image" in str(e_pixel_array).lower()
-                or "gdcm" in str(e_pixel_array).lower()
-                or "pylibjpeg" in str(e_pixel_array).lower()
-            ):
-                error_detail = "Missing dependency or unsupported compression for pixel data. Ensure GDCM or pylibjpeg-libjpeg is installed if needed."
-                print(f"--- UPLOAD ERROR DETAIL (ID: {dicom_id}): {error_detail}")
-                raise DicomParsingError(error_detail) from e_pixel_array
-            traceback.print_exc()
-            raise DicomParsingError(
-                f"Failed to access pixel data from DICOM: {e_pixel_array}"
-            ) from e_pixel_array
 
-        try:
-            png_bytes = _to_png(arr, ds)
-        except Exception as e_to_png:
+    pixel_spacing_val = ds.get("PixelSpacing", [1.0, 1.0])
+    processed_pixel_spacing: list[float] = []
+    try:
+        if isinstance(pixel_spacing_val, pydicom.multival.MultiValue):
+            processed_pixel_spacing = [float(v) for v in pixel_spacing_val[:2]]
+        elif isinstance(pixel_spacing_val, list) and all(
+            isinstance(
+                v, (int, float, str, pydicom.valuerep.DSfloat, pydicom.valuerep.IS)
+            )
+            for v in pixel_spacing_val
+        ):
+            processed_pixel_spacing = [float(str(v)) for v in pixel_spacing_val[:2]]
+        elif isinstance(
+            pixel_spacing_val,
+            (pydicom.valuerep.DSfloat, pydicom.valuerep.DSdecimal),
+        ):
+            processed_pixel_spacing = [
+                float(pixel_spacing_val),
+                float(pixel_spacing_val),
+            ]  # <<<< THIS WAS THE FIX
+        elif isinstance(pixel_spacing_val, (int, float)):
+            processed_pixel_spacing = [
+                float(pixel_spacing_val),
+                float(pixel_spacing_val),
+            ]
+        else:
             print(
-                f"--- UPLOAD ERROR (ID: {dicom_id}): Error converting DICOM to PNG (_to_png failed): {e_to_png}"
+                f"--- UPLOAD WARNING (ID: {dicom_id}): Unexpected PixelSpacing format '{pixel_spacing_val}' (type: {type(pixel_spacing_val)}). Defaulting."
             )
-            traceback.print_exc()
-            raise DicomParsingError(
-                f"Failed to convert DICOM to PNG image: {e_to_png}"
-            ) from e_to_png
-
-        png_b64 = base64.b64encode(png_bytes).decode("ascii")
-
-        wc_parsed = None
-        ww_parsed = None
-        raw_wc = ds.get("WindowCenter", None)
-        raw_ww = ds.get("WindowWidth", None)
-
-        if raw_wc is not None:
-            try:
-                wc_val = (
-                    raw_wc[0]
-                    if isinstance(raw_wc, pydicom.multival.MultiValue)
-                    and len(raw_wc) > 0
-                    else raw_wc
-                )
-                wc_parsed = float(wc_val)
-            except (ValueError, TypeError, IndexError) as e_wc:
-                print(
-                    f"--- UPLOAD WARNING (ID: {dicom_id}): Could not parse WindowCenter '{raw_wc}': {e_wc}. Setting to None."
-                )
+            processed_pixel_spacing = [1.0, 1.0]
+    except (ValueError, TypeError) as e_ps:
+        print(
+            f"--- UPLOAD WARNING (ID: {dicom_id}): Error parsing PixelSpacing '{pixel_spacing_val}': {e_ps}. Defaulting."
+        )
+        processed_pixel_spacing = [1.0, 1.0]
 
-        if raw_ww is not None:
-            try:
-                ww_val = (
-                    raw_ww[0]
-                    if isinstance(raw_ww, pydicom.multival.MultiValue)
-                    and len(raw_ww) > 0
-                    else raw_ww
-                )
-                ww_parsed = float(ww_val)
-            except (ValueError, TypeError, IndexError) as e_ww:
-                print(
-                    f"--- UPLOAD WARNING (ID: {dicom_id}): Could not parse WindowWidth '{raw_ww}': {e_ww}. Setting to None."
-                )
+    if not processed_pixel_spacing or len(processed_pixel_spacing) == 0:
+        processed_pixel_spacing = [1.0, 1.0]
+    elif len(processed_pixel_spacing) == 1:
+        processed_pixel_spacing.append(processed_pixel_spacing[0])
+    processed_pixel_spacing = processed_pixel_spacing[:2]
 
-        pixel_spacing_val = ds.get("PixelSpacing", [1.0, 1.0])
-        processed_pixel_spacing: list[float] = []
-        try:
-            if isinstance(pixel_spacing_val, pydicom.multival.MultiValue):
-                processed_pixel_spacing = [float(v) for v in pixel_spacing_val[:2]]
-            elif isinstance(pixel_spacing_val, list) and all(
-                isinstance(
-                    v, (int, float, str, pydicom.valuerep.DSfloat, pydicom.valuerep.IS)
-                )
-                for v in pixel_spacing_val
-            ):
-                processed_pixel_spacing = [float(str(v)) for v in pixel_spacing_val[:2]]
-            elif isinstance(
-                pixel_spacing_val,
-                (pydicom.valuerep.DSfloat, pydicom.valuerep.DSdecimal),
-            ):
-                processed_pixel_spacing = [
-                    float(pixel_spacing_val),
-                    float(pixel_spacing_val),
-                ]  # <<<< THIS WAS THE FIX
-            elif isinstance(pixel_spacing_val, (int, float)):
-                processed_pixel_spacing = [
-                    float(pixel_spacing_val),
-                    float(pixel_spacing_val),
-                ]
-            else:
-                print(
-                    f"--- UPLOAD WARNING (ID: {dicom_id}): Unexpected PixelSpacing format '{pixel_spacing_val}' (type: {type(pixel_spacing_val)}). Defaulting."
-                )
-                processed_pixel_spacing = [1.0, 1.0]
-        except (ValueError, TypeError) as e_ps:
-            print(
-                f"--- UPLOAD WARNING (ID: {dicom_id}): Error parsing PixelSpacing '{pixel_spacing_val}': {e_ps}. Defaulting."
+    rows_val = ds.get("Rows", 0)
+    cols_val = ds.get("Columns", 0)
+    try:
+        parsed_rows = int(rows_val)
+        parsed_cols = int(cols_val)
+    except (ValueError, TypeError) as e_dims:
+        print(
+            f"--- UPLOAD WARNING (ID: {dicom_id}): Could not parse Rows/Columns '{rows_val}', '{cols_val}': {e_dims}. Defaulting to 0."
+        )
+        parsed_rows, parsed_cols = 0, 0
+        if parsed_rows <= 0 or parsed_cols <= 0:
+            raise DicomParsingError(
+                f"Invalid Rows/Columns dimensions in DICOM: R={rows_val}, C={cols_val}"
             )
-            processed_pixel_spacing = [1.0, 1.0]
 
-        if not processed_pixel_spacing or len(processed_pixel_spacing) == 0:
-            processed_pixel_spacing = [1.0, 1.0]
-        elif len(processed_pixel_spacing) == 1:
-            processed_pixel_spacing.append(processed_pixel_spacing[0])
-        processed_pixel_spacing = processed_pixel_spacing[:2]
+    meta = DicomMeta(
+        patient_id=str(ds.get("PatientID", "N/A")),
+        study_date=str(ds.get("StudyDate", "")),
+        modality=str(ds.get("Modality", "N/A")),
+        pixel_spacing=processed_pixel_spacing,
+        window_center=wc_parsed,
+        window_width=ww_parsed,
+        rows=parsed_rows,
+        columns=parsed_cols,
+        number_of_frames=frame_count(ds),
+        slice_thickness=_optional_float(ds.get("SliceThickness")),
+        spacing_between_slices=_optional_float(ds.get("SpacingBetweenSlices")),
+    )
 
-        rows_val = ds.get("Rows", 0)
-        cols_val = ds.get("Columns", 0)
-        try:
-            parsed_rows = int(rows_val)
-            parsed_cols = int(cols_val)
-        except (ValueError, TypeError) as e_dims:
+    return meta
+
+
+def _first_frame_index(ds: pydicom.Dataset) -> Optional[int]:
+    # Multi-frame files only get their first frame decoded up front; the rest
+    # are decoded one at a time when requested through get_frame_png.
+    return 0 if frame_count(ds) > 1 else None
+
+
+def _parse_dicom_file(spool_path: Path, dicom_id: str) -> _ParsedUpload:
+    """
+    CPU-bound part of the upload: decode pixels (the first frame for multi-frame
+    files), render the PNG and preview, and build DicomMeta.
+
+    Runs in the worker pool (see services.worker_pool), so it must stay a
+    module-level function taking only picklable arguments.
+    """
+    header = _read_header(spool_path, dicom_id)
+    ds = header.dataset
+    arr = _decode_pixels(spool_path, dicom_id, _first_frame_index(ds))
+    display = _display_image(arr, ds, dicom_id)
+    return _ParsedUpload(
+        png=_encode_display(display),
+        preview=_encode_preview(
+            display, settings.PREVIEW_MAX_EDGE, settings.PREVIEW_JPEG_QUALITY
+        ),
+        model_input=_encode_model_input(display),
+        meta=_extract_meta(ds, dicom_id),
+        pixels=(arr, ds),
+        display=display,
+        header=header,
+    )
+
+
+def _parse_dicom_header(spool_path: Path, dicom_id: str) -> _ParsedHeader:
+    """Lazy-render variant of _parse_dicom_file: reads the header only."""
+    header = _read_header(spool_path, dicom_id)
+    return _ParsedHeader(_extract_meta(header.dataset, dicom_id), header)
+
+
+def _decode_dicom_file(source: DicomSource, dicom_id: str) -> _DecodedPixels:
+    """
+    Full-depth pixel array plus header, for the pixel cache. Used for uploads
+    ingested with LAZY_RENDER and after the cache dropped an entry. Runs in the worker pool.
+    """
+    ds = _read_dataset(source, dicom_id, stop_before_pixels=True)
+    return _decode_pixels(source, dicom_id, _first_frame_index(ds)), ds
+
+
+def _render_frame_file(source: DicomSource, dicom_id: str, index: int) -> bytes:
+    """Decodes and renders a single frame with default windowing. Runs in the worker pool."""
+    ds = _read_dataset(source, dicom_id, stop_before_pixels=True)
+    arr = _decode_pixels(source, dicom_id, index)
+    return _encode_display(_display_image(arr, ds, dicom_id))
+
+
+async def _ingest_spooled(spool_path: Path, dicom_id: str) -> None:
+    try:
+        if settings.LAZY_RENDER:
+            parsed = await run_in_worker(_parse_dicom_header, spool_path, dicom_id)
+            meta = parsed.meta
+        else:
+            parsed = await run_in_worker(_parse_dicom_file, spool_path, dicom_id)
+            meta = parsed.meta
+            _image_store.put(_png_key(dicom_id), parsed.png)
+            _image_store.put(_preview_key(dicom_id), parsed.preview)
+            _image_store.put(_model_input_key(dicom_id), parsed.model_input)
+            _pixel_cache.put(dicom_id, parsed.pixels)
+            _level_cache.put((dicom_id, 0), parsed.display)
+        _header_cache.put(dicom_id, parsed.header)
+        _raw_dicom_store.put_file(dicom_id, spool_path)
+        _image_store.put(_meta_key(dicom_id), meta.model_dump_json().encode("utf-8"))
+    finally:
+        # No-op once the raw store took the file over.
+        _discard_spool(spool_path)
+
+
+async def save_and_parse(file: UploadFile) -> str:
+    print(f"--- UPLOAD START: Processing file '{file.filename}'")
+
+    spool_path: Optional[Path] = None
+    spool_handed_over = False
+    dicom_id = "unknown"
+
+    def start_ingest():
+        # Only called for the first of several concurrent identical uploads; the
+        # ingest task owns (and cleans up) that upload's spool file from here on.
+        nonlocal spool_handed_over
+        spool_handed_over = True
+        return _ingest_spooled(spool_path, dicom_id)
+
+    try:
+        spool_path, sha256_hex = await _spool_upload(file)
+        dicom_id = _content_id(sha256_hex)
+
+        if _is_stored(dicom_id):
             print(
-                f"--- UPLOAD WARNING (ID: {dicom_id}): Could not parse Rows/Columns '{rows_val}', '{cols_val}': {e_dims}. Defaulting to 0."
+                f"--- UPLOAD DEDUPLICATED (ID: {dicom_id}): Identical file already stored, skipping parse."
             )
-            parsed_rows, parsed_cols = 0, 0
-            if parsed_rows <= 0 or parsed_cols <= 0:
-                raise DicomParsingError(
-                    f"Invalid Rows/Columns dimensions in DICOM: R={rows_val}, C={cols_val}"
-                )
+            return dicom_id
 
-        meta = DicomMeta(
-            patient_id=str(ds.get("PatientID", "N/A")),
-            study_date=str(ds.get("StudyDate", "")),
-            modality=str(ds.get("Modality", "N/A")),
-            pixel_spacing=processed_pixel_spacing,
-            window_center=wc_parsed,
-            window_width=ww_parsed,
-            rows=parsed_rows,
-            columns=parsed_cols,
-        )
-
-        payload = ImagePayload(png_data=png_b64, meta=meta)
-        _memory_store[dicom_id] = payload
+        await _ingest_flights.do(dicom_id, start_ingest)
         print(f"--- UPLOAD SUCCESS (ID: {dicom_id}): File parsed and stored.")
         return dicom_id
 
+    except WorkerPoolBusyError:
+        print(f"--- UPLOAD REJECTED (ID: {dicom_id}): Worker pool is saturated.")
+        raise
     except DicomParsingError:
-        if dicom_id in _raw_dicom_store:
-            del _raw_dicom_store[dicom_id]
         print(
             f"--- UPLOAD HANDLED ERROR (ID: {dicom_id}): DicomParsingError propagated."
         )
@@ -200,54 +628,423 @@ async def save_and_parse(file: UploadFile) -> str:
             f"--- UPLOAD CRITICAL ERROR (ID: {dicom_id}): An unexpected error occurred during DICOM processing: {e_generic}"
         )
         traceback.print_exc()
-        if dicom_id in _raw_dicom_store:
-            del _raw_dicom_store[dicom_id]
         raise DicomParsingError(
             f"An unexpected server error occurred while processing the DICOM file: {e_generic}"
         ) from e_generic
+    finally:
+        if not spool_handed_over:
+            _discard_spool(spool_path)
 
 
-async def get_image_payload(dicom_id: str) -> Optional[ImagePayload]:
-    return _memory_store.get(dicom_id)
+async def _render_and_store(dicom_id: str) -> None:
+    print(f"--- RENDER (ID: {dicom_id}): Rendering PNG on first access.")
+    display = await _get_level_image(dicom_id, 0)
+    if display is None:
+        return
+    png_bytes = await run_in_worker(_encode_display, display)
+    _image_store.put(_png_key(dicom_id), png_bytes)
 
 
-async def get_raw_dicom_bytes(dicom_id: str) -> Optional[bytes]:
-    return _raw_dicom_store.get(dicom_id)
+async def _get_png(dicom_id: str) -> Optional[memoryview]:
+    png_view = _image_store.get(_png_key(dicom_id))
+    if png_view is not None:
+        return png_view
+    await _render_flights.do(dicom_id, lambda: _render_and_store(dicom_id))
+    return _image_store.get(_png_key(dicom_id))
 
 
-async def create_modified_dicom_with_meta(
-    original_dicom_id: str, metadata_updates: Dict[str, Any]
+async def _get_pixels(dicom_id: str) -> Optional[_DecodedPixels]:
+    if not _is_stored(dicom_id):
+        return None  # expired or deleted, even if its pixels are still cached
+    pixels = _pixel_cache.get(dicom_id)
+    if pixels is not None:
+        return pixels
+    source = _raw_source(dicom_id)
+    if source is None:
+        return None
+
+    async def decode() -> _DecodedPixels:
+        decoded = await run_in_worker(_decode_dicom_file, source, dicom_id)
+        _pixel_cache.put(dicom_id, decoded)
+        return decoded
+
+    # Returned directly rather than re-read from the cache, which may be too
+    # small to hold a very large array.
+    return await _decode_flights.do(dicom_id, decode)
+
+
+async def _get_header(dicom_id: str) -> Optional[_DicomHeader]:
+    """
+    Header-only Dataset of a stored DICOM, from the header cache or read (and
+    cached) on a miss. The Dataset is a deep copy the caller may modify freely.
+    Returns None if the DICOM is unknown.
+    """
+    if not _is_stored(dicom_id):
+        return None
+    header = _header_cache.get(dicom_id)
+    if header is None:
+        source = _raw_source(dicom_id)
+        if source is None:
+            return None
+
+        async def read() -> _DicomHeader:
+            parsed = await run_in_worker(_read_header, source, dicom_id)
+            _header_cache.put(dicom_id, parsed)
+            return parsed
+
+        header = await _header_flights.do(dicom_id, read)
+    return _DicomHeader(copy.deepcopy(header.dataset), header.pixel_offset)
+
+
+async def get_dicom_header(dicom_id: str) -> Optional[pydicom.Dataset]:
+    """Header-only Dataset (no Pixel Data) of a stored DICOM, safe to modify."""
+    header = await _get_header(dicom_id)
+    return header.dataset if header is not None else None
+
+
+async def render_windowed_image(
+    dicom_id: str,
+    window_center: Optional[float] = None,
+    window_width: Optional[float] = None,
+    invert: bool = False,
+    scale: float = 1.0,
+    image_format: str = "png",
 ) -> Optional[bytes]:
-    original_bytes = await get_raw_dicom_bytes(original_dicom_id)
-    if not original_bytes:
-        print(
-            f"--- DICOM EXPORT ERROR: Original DICOM bytes not found for ID: {original_dicom_id}"
+    """
+    Renders the image with explicit windowing from the full-depth pixel array,
+    encoded as `image_format` (see image_utils.IMAGE_MEDIA_TYPES).
+
+    Results are cached per (dicom_id, parameters, format) and identical
+    concurrent renders share one job. Returns None if the image is unknown.
+    """
+    # Checked before the render cache, whose entries outlive expired images.
+    if not _is_stored(dicom_id):
+        return None
+    render_key = (dicom_id, window_center, window_width, invert, scale, image_format)
+    cached = _window_render_cache.get(render_key)
+    if cached is not None:
+        return cached
+
+    async def render() -> Optional[bytes]:
+        pixels = await _get_pixels(dicom_id)
+        if pixels is None:
+            return None
+        arr, header = pixels
+        image_bytes = await run_in_worker(
+            _render_pixels,
+            arr,
+            header,
+            dicom_id,
+            window_center,
+            window_width,
+            invert,
+            scale,
+            image_format,
         )
+        _window_render_cache.put(render_key, image_bytes)
+        return image_bytes
+
+    return await _window_render_flights.do(render_key, render)
+
+
+async def _get_level_image(dicom_id: str, level: int) -> Optional[np.ndarray]:
+    if not _is_stored(dicom_id):
         return None
+    level_key = (dicom_id, level)
+    cached = _level_cache.get(level_key)
+    if cached is not None:
+        return cached
 
-    try:
-        ds = pydicom.dcmread(io.BytesIO(original_bytes), force=True)
-    except Exception as e:
-        print(
-            f"--- DICOM EXPORT ERROR: Failed to read original DICOM for ID {original_dicom_id}: {e}"
+    async def build() -> Optional[np.ndarray]:
+        if level == 0:
+            pixels = await _get_pixels(dicom_id)
+            if pixels is None:
+                return None
+            arr, header = pixels
+            image = await run_in_worker(_display_image, arr, header, dicom_id)
+        else:
+            base = await _get_level_image(dicom_id, 0)
+            if base is None:
+                return None
+            image = await run_in_worker(pyramid.build_level, base, level)
+        _level_cache.put(level_key, image)
+        return image
+
+    return await _level_flights.do(level_key, build)
+
+
+async def get_pyramid_info(dicom_id: str) -> Optional[PyramidInfo]:
+    meta = await get_image_meta(dicom_id)
+    if meta is None:
+        return None
+    tile_size = settings.TILE_SIZE
+    levels = []
+    for level in range(pyramid.level_count(meta.columns, meta.rows, tile_size)):
+        width, height = pyramid.level_size(meta.columns, meta.rows, level)
+        columns, rows = pyramid.tile_grid(meta.columns, meta.rows, level, tile_size)
+        levels.append(
+            PyramidLevel(
+                level=level, width=width, height=height, columns=columns, rows=rows
+            )
         )
-        traceback.print_exc()
+    return PyramidInfo(
+        width=meta.columns, height=meta.rows, tile_size=tile_size, levels=levels
+    )
+
+
+async def get_tile_png(dicom_id: str, level: int, x: int, y: int) -> Optional[bytes]:
+    """
+    PNG for one pyramid tile, rendered on first request and then cached.
+
+    Returns None if the image is unknown or the tile is outside the pyramid.
+    """
+    info = await get_pyramid_info(dicom_id)
+    if info is None or level >= len(info.levels):
+        return None
+    if x >= info.levels[level].columns or y >= info.levels[level].rows:
+        return None
+
+    tile_key = _tile_key(dicom_id, level, x, y)
+    cached = _image_store.get(tile_key)
+    if cached is not None:
+        return bytes(cached)
+
+    async def render() -> Optional[bytes]:
+        level_image = await _get_level_image(dicom_id, level)
+        if level_image is None:
+            return None
+        tile = pyramid.cut_tile(level_image, x, y, info.tile_size)
+        tile_png = await run_in_worker(_encode_display, tile)
+        _image_store.put(tile_key, tile_png)
+        return tile_png
+
+    return await _derived_image_flights.do(tile_key, render)
+
+
+async def get_preview_jpeg(dicom_id: str) -> Optional[bytes]:
+    """
+    Small JPEG preview (PREVIEW_MAX_EDGE on the long side) for a fast first paint.
+
+    Made at ingest; uploads ingested with LAZY_RENDER get it on first request.
+    """
+    if _meta_key(dicom_id) not in _image_store:
+        return None
+    preview_key = _preview_key(dicom_id)
+    cached = _image_store.get(preview_key)
+    if cached is not None:
+        return bytes(cached)
+
+    async def render() -> Optional[bytes]:
+        display = await _get_level_image(dicom_id, 0)
+        if display is None:
+            return None
+        preview = await run_in_worker(
+            _encode_preview,
+            display,
+            settings.PREVIEW_MAX_EDGE,
+            settings.PREVIEW_JPEG_QUALITY,
+        )
+        _image_store.put(preview_key, preview)
+        return preview
+
+    return await _derived_image_flights.do(preview_key, render)
+
+
+async def get_display_image(dicom_id: str) -> Optional[np.ndarray]:
+    """Default-windowed uint8 image at full resolution (pyramid level 0)."""
+    if _meta_key(dicom_id) not in _image_store:
+        return None
+    return await _get_level_image(dicom_id, 0)
+
+
+async def get_model_input(dicom_id: str) -> Optional[ModelInput]:
+    """
+    Model-ready input for AI detection. Made at ingest; uploads ingested with
+    LAZY_RENDER (or whose copy was evicted) get it on first request.
+    """
+    meta = await get_image_meta(dicom_id)
+    if meta is None:
+        return None
+    input_key = _model_input_key(dicom_id)
+    encoded = _image_store.get(input_key)
+    if encoded is None:
+
+        async def render() -> Optional[bytes]:
+            display = await _get_level_image(dicom_id, 0)
+            if display is None:
+                return None
+            model_input = await run_in_worker(_encode_model_input, display)
+            _image_store.put(input_key, model_input)
+            return model_input
+
+        encoded = await _derived_image_flights.do(input_key, render)
+        if encoded is None:
+            return None
+    return ModelInput(bytes(encoded).decode("ascii"), meta.columns, meta.rows)
+
+
+async def get_frame_png(dicom_id: str, index: int) -> Optional[bytes]:
+    """
+    PNG of one frame of a (multi-frame) DICOM, decoded and rendered on demand.
+
+    Only the requested frame is decoded, from a memory-mapped copy of the
+    stored file; rendered frames are cached in the image store. Returns None
+    if the image is unknown or has no such frame.
+    """
+    meta = await get_image_meta(dicom_id)
+    if meta is None or index >= meta.number_of_frames:
+        return None
+    frame_key = _frame_key(dicom_id, index)
+    cached = _image_store.get(frame_key)
+    if cached is not None:
+        return bytes(cached)
+
+    async def render() -> Optional[bytes]:
+        source = _raw_source(dicom_id)
+        if source is None:
+            return None
+        frame_png = await run_in_worker(_render_frame_file, source, dicom_id, index)
+        _image_store.put(frame_key, frame_png)
+        return frame_png
+
+    return await _derived_image_flights.do(frame_key, render)
+
+
+async def get_image_meta(dicom_id: str) -> Optional[DicomMeta]:
+    meta_json = _image_store.get(_meta_key(dicom_id))
+    if meta_json is None:
+        return None
+    return DicomMeta.model_validate_json(bytes(meta_json))
+
+
+async def get_image_png(dicom_id: str) -> Optional[bytes]:
+    """Rendered PNG as raw bytes (rendering it first if needed)."""
+    if _meta_key(dicom_id) not in _image_store:
+        return None
+    png_view = await _get_png(dicom_id)
+    return bytes(png_view) if png_view is not None else None
+
+
+async def get_image_bytes(dicom_id: str, image_format: str = "png") -> Optional[bytes]:
+    """
+    Default-windowed full-resolution image encoded as `image_format`.
+
+    PNG is the stored rendering; other formats are encoded from the level-0
+    display image on first request and cached in the image store.
+    """
+    if image_format == "png":
+        return await get_image_png(dicom_id)
+    if _meta_key(dicom_id) not in _image_store:
+        return None
+    image_key = _image_key(dicom_id, image_format)
+    cached = _image_store.get(image_key)
+    if cached is not None:
+        return bytes(cached)
+
+    async def render() -> Optional[bytes]:
+        display = await _get_level_image(dicom_id, 0)
+        if display is None:
+            return None
+        image_bytes = await run_in_worker(_encode_display, display, image_format)
+        _image_store.put(image_key, image_bytes)
+        return image_bytes
+
+    return await _derived_image_flights.do(image_key, render)
+
+
+async def get_image_payload(
+    dicom_id: str, include_pixels: bool = True
+) -> Optional[ImagePayload]:
+    meta = await get_image_meta(dicom_id)
+    if meta is None:
+        return None
+    if not include_pixels:
+        return ImagePayload(meta=meta)
+    png_view = await _get_png(dicom_id)
+    if png_view is None:
         return None
+    return ImagePayload(
+        png_data=base64.b64encode(png_view).decode("ascii"), meta=meta
+    )
 
-    tag_map = {
-        "patient_id": "PatientID",
-        "study_date": "StudyDate",
-        "modality": "Modality",
-        "window_center": "WindowCenter",
-        "window_width": "WindowWidth",
+
+def store_stats() -> dict[str, dict[str, float]]:
+    return {
+        "image_store": _image_store.stats(),
+        "raw_store": _raw_dicom_store.stats(),
+        "ingest": _ingest_flights.stats(),
+        "render": _render_flights.stats(),
+        "pixel_cache": _pixel_cache.stats(),
+        "header_cache": _header_cache.stats(),
+        "window_render_cache": _window_render_cache.stats(),
+        "window_render": _window_render_flights.stats(),
+        "tile_level_cache": _level_cache.stats(),
+        "derived_images": _derived_image_flights.stats(),
+        # Per worker process when WORKER_POOL_KIND is "process".
+        "pixel_decoders": decoder_stats(),
     }
 
+
+def close_stores() -> None:
+    _image_store.clear()
+    _raw_dicom_store.clear()
+    _pixel_cache.clear()
+    _header_cache.clear()
+    _window_render_cache.clear()
+    _level_cache.clear()
+
+
+# Editable metadata fields (DicomMetadataUpdatePayload keys) and their DICOM keywords.
+_EXPORT_TAG_MAP = {
+    "patient_id": "PatientID",
+    "study_date": "StudyDate",
+    "modality": "Modality",
+    "window_center": "WindowCenter",
+    "window_width": "WindowWidth",
+}
+
+
+class DicomExport(NamedTuple):
+    """
+    A modified copy of a stored DICOM: the rewritten header followed by the
+    original file's bytes from `pixel_offset` on (Pixel Data and anything
+    after it), which are streamed unchanged.
+
+    A file in the disk store is held open from when the export is built (see
+    _open_source), so eviction or expiry after that can't cut the stream short;
+    iter_bytes closes it, and so does close() for an export that isn't sent.
+    """
+
+    header: bytes
+    source: Union[bytes, Path, BinaryIO]
+    pixel_offset: int
+    size: int
+
+    def iter_bytes(self, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        yield self.header
+        if isinstance(self.source, bytes):
+            for start in range(self.pixel_offset, len(self.source), chunk_size):
+                yield self.source[start : start + chunk_size]
+            return
+        with self.source as f:
+            f.seek(self.pixel_offset)
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def close(self) -> None:
+        if not isinstance(self.source, bytes):
+            self.source.close()
+
+
+def _apply_metadata_updates(
+    ds: pydicom.Dataset, metadata_updates: Dict[str, Any], original_dicom_id: str
+) -> None:
     print(
         f"--- DICOM EXPORT INFO (ID: {original_dicom_id}): Metadata updates received: {metadata_updates}"
     )
 
     for key, value in metadata_updates.items():
-        tag_name = tag_map.get(key)
+        tag_name = _EXPORT_TAG_MAP.get(key)
         if not tag_name:
             print(
                 f"--- DICOM EXPORT INFO (ID: {original_dicom_id}): Key '{key}' not in tag_map, skipping."
@@ -325,18 +1122,10 @@ async def create_modified_dicom_with_meta(
             )
             traceback.print_exc()
 
-    try:
-        ds.SOPInstanceUID = pydicom.uid.generate_uid()
-        print(
-            f"--- DICOM EXPORT INFO (ID: {original_dicom_id}): New SOPInstanceUID generated: {ds.SOPInstanceUID}"
-        )
-    except Exception as e_uid:
-        print(
-            f"--- DICOM EXPORT ERROR (ID: {original_dicom_id}): Failed to generate/set SOPInstanceUID: {e_uid}"
-        )
-        traceback.print_exc()
-        return None
 
+def _write_dataset(
+    ds: pydicom.Dataset, metadata_updates: Dict[str, Any], original_dicom_id: str
+) -> Optional[bytes]:
     buffer = io.BytesIO()
     try:
         print(
@@ -354,7 +1143,7 @@ async def create_modified_dicom_with_meta(
         )
         problem_tags_details = {}
         for key_update in metadata_updates:
-            tag_name_update = tag_map.get(key_update)
+            tag_name_update = _EXPORT_TAG_MAP.get(key_update)
             if tag_name_update and tag_name_update in ds:
                 try:
                     element = ds[tag_name_update]
@@ -372,3 +1161,108 @@ async def create_modified_dicom_with_meta(
         )
         traceback.print_exc()
         return None
+
+
+def _build_modified_dicom(
+    source: DicomSource,
+    original_dicom_id: str,
+    metadata_updates: Dict[str, Any],
+    header: Optional[_DicomHeader] = None,
+) -> Optional[DicomExport]:
+    """
+    Applies metadata updates and a new SOPInstanceUID to a stored DICOM.
+
+    Only the header is parsed and re-encoded; the Pixel Data element is left
+    where it is and spliced back in by DicomExport.iter_bytes, so the work
+    depends on the header size rather than the image size. Deflated files
+    (whose pixel data can't be located without inflating everything) are
+    rewritten as a whole. `header` is a parsed header the caller owns (see
+    _get_header); it is read from `source` when not given. Runs in the worker pool.
+    """
+    source_size = len(source) if isinstance(source, bytes) else source.stat().st_size
+    try:
+        if header is None:
+            header = _read_header(source, original_dicom_id)
+        ds, pixel_offset = header
+        transfer_syntax = ds.file_meta.get("TransferSyntaxUID")
+        splice = transfer_syntax not in (None, pydicom.uid.DeflatedExplicitVRLittleEndian)
+        if not splice:
+            ds = _read_dataset(source, original_dicom_id)
+            pixel_offset = source_size
+    except Exception as e:
+        print(
+            f"--- DICOM EXPORT ERROR: Failed to read original DICOM for ID {original_dicom_id}: {e}"
+        )
+        traceback.print_exc()
+        return None
+
+    _apply_metadata_updates(ds, metadata_updates, original_dicom_id)
+
+    try:
+        ds.SOPInstanceUID = pydicom.uid.generate_uid()
+        print(
+            f"--- DICOM EXPORT INFO (ID: {original_dicom_id}): New SOPInstanceUID generated: {ds.SOPInstanceUID}"
+        )
+    except Exception as e_uid:
+        print(
+            f"--- DICOM EXPORT ERROR (ID: {original_dicom_id}): Failed to generate/set SOPInstanceUID: {e_uid}"
+        )
+        traceback.print_exc()
+        return None
+
+    header = _write_dataset(ds, metadata_updates, original_dicom_id)
+    if header is None:
+        return None
+    return DicomExport(
+        header=header,
+        source=source,
+        pixel_offset=pixel_offset,
+        size=len(header) + source_size - pixel_offset,
+    )
+
+
+async def export_modified_dicom(
+    original_dicom_id: str, metadata_updates: Dict[str, Any]
+) -> Optional[DicomExport]:
+    """Modified copy of a stored DICOM, to be streamed with DicomExport.iter_bytes."""
+    source = _raw_source(original_dicom_id)
+    opened = _open_source(source) if source is not None else None
+    if opened is None:
+        print(
+            f"--- DICOM EXPORT ERROR: Original DICOM bytes not found for ID: {original_dicom_id}"
+        )
+        return None
+    export = None
+    try:
+        header = await _get_header(original_dicom_id)
+        # The worker gets the path (a process pool can't be handed an open
+        # file); the file opened above is what gets streamed.
+        export = await run_in_worker(
+            _build_modified_dicom, source, original_dicom_id, metadata_updates, header
+        )
+    except DicomParsingError as e:
+        print(
+            f"--- DICOM EXPORT ERROR: Failed to read original DICOM for ID {original_dicom_id}: {e}"
+        )
+    finally:
+        if export is None and not isinstance(opened, bytes):
+            opened.close()
+    return export._replace(source=opened) if export is not None else None
+
+
+async def get_original_export(dicom_id: str) -> Optional[DicomExport]:
+    """The stored original file as a DicomExport, for streaming it unchanged."""
+    source = _raw_source(dicom_id)
+    opened = _open_source(source) if source is not None else None
+    if opened is None:
+        return None
+    size = len(opened) if isinstance(opened, bytes) else os.fstat(opened.fileno()).st_size
+    return DicomExport(header=b"", source=opened, pixel_offset=0, size=size)
+
+
+async def create_modified_dicom_with_meta(
+    original_dicom_id: str, metadata_updates: Dict[str, Any]
+) -> Optional[bytes]:
+    """Like export_modified_dicom, but returns the whole file as bytes."""
+    export = await export_modified_dicom(original_dicom_id, metadata_updates)
+    return b"".join(export.iter_bytes()) if export is not None else None
@@ -0,0 +1,313 @@
+# backend/app/services/image_store.py
+import hashlib
+import mmap
+import os
+import re
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from app.util.cache import LRUCache
+
+# Expired entries are swept at most this often (on writes); reads check expiry themselves.
+_PURGE_INTERVAL_SECONDS = 60.0
+
+
+@dataclass
+class _HotEntry:
+    data: bytes
+    expires_at: Optional[float]
+
+
+@dataclass
+class _DiskEntry:
+    path: Path
+    size: int
+    expires_at: Optional[float]
+
+
+def _is_expired(expires_at: Optional[float], now: float) -> bool:
+    return expires_at is not None and expires_at <= now
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, but belongs to another user
+    return True
+
+
+def remove_stale_spill_dirs(spill_dir: Path, name: str) -> int:
+    """
+    Removes the spill directories ("<name>-<pid>") of processes that are gone,
+    e.g. workers that crashed or were killed before clear() ran. Returns how
+    many were removed.
+    """
+    pattern = re.compile(rf"^{re.escape(name)}-(\d+)$")
+    removed = 0
+    try:
+        candidates = list(Path(spill_dir).iterdir())
+    except OSError:
+        return 0
+    for directory in candidates:
+        match = pattern.match(directory.name)
+        if not match or not directory.is_dir():
+            continue
+        pid = int(match.group(1))
+        if pid == os.getpid() or _pid_alive(pid):
+            continue
+        shutil.rmtree(directory, ignore_errors=True)
+        removed += 1
+    if removed:
+        print(f"--- IMAGE STORE ({name}): Removed {removed} spill dir(s) of dead processes.")
+    return removed
+
+
+class TieredImageStore:
+    """
+    Byte store with a hot in-memory LRU tier and a local on-disk tier.
+
+    Entries that don't fit the memory budget (or are pushed out of it) are
+    written to `spill_dir` and read back through mmap. Every entry has a TTL
+    after which it is dropped from both tiers. When the disk tier grows past
+    its budget, the least recently used disk entries are deleted. Spill
+    directories left behind by dead processes are removed on construction.
+
+    Args:
+        name (str): Used for the on-disk directory and log messages.
+        memory_budget_bytes (int): Byte budget of the hot tier.
+        spill_dir (Path): Parent directory for the disk tier. Each process gets
+                          its own sub-directory, so gunicorn workers sharing
+                          the same path don't step on each other.
+        ttl_seconds (float | None): Default lifetime of an entry; None = no expiry.
+        max_hot_entry_bytes (int | None): Disk entries up to this size are
+                                          promoted back into memory on read.
+                                          Defaults to a quarter of the budget.
+        disk_budget_bytes (int | None): Byte budget of the disk tier; None = unbounded.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        memory_budget_bytes: int,
+        spill_dir: Path,
+        ttl_seconds: Optional[float] = None,
+        max_hot_entry_bytes: Optional[int] = None,
+        disk_budget_bytes: Optional[int] = None,
+    ):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_hot_entry_bytes = (
+            max_hot_entry_bytes
+            if max_hot_entry_bytes is not None
+            else memory_budget_bytes // 4
+        )
+        self.disk_budget_bytes = disk_budget_bytes
+        remove_stale_spill_dirs(spill_dir, name)
+        self._dir = Path(spill_dir) / f"{name}-{os.getpid()}"
+        self._hot: LRUCache[str, _HotEntry] = LRUCache(
+            memory_budget_bytes,
+            sizeof=lambda entry: len(entry.data),
+            on_evict=self._spill,
+        )
+        # In least recently used order, for evictions under disk_budget_bytes.
+        self._disk: Dict[str, _DiskEntry] = {}
+        self._disk_bytes = 0
+        self._lock = threading.RLock()
+        self._last_purge = time.monotonic()
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self.spills = 0
+        self.expirations = 0
+        self.disk_evictions = 0
+
+    # --- Writes ---
+    def put(self, key: str, data: bytes, ttl: Optional[float] = None) -> None:
+        expires_at = self._expires_at(ttl)
+        with self._lock:
+            self._drop_disk(key)
+        # Values larger than the budget come straight back through on_evict -> disk.
+        self._hot.put(key, _HotEntry(bytes(data), expires_at))
+        self._maybe_purge()
+
+    def put_file(self, key: str, path: Union[str, Path], ttl: Optional[float] = None) -> None:
+        """Moves an existing file (e.g. an upload spool file) into the disk tier."""
+        target = self._path_for(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(path), target)
+        with self._lock:
+            self._hot.pop(key)
+            self._drop_disk(key, unlink=False)  # the move replaced its file
+            self._add_disk(key, _DiskEntry(target, target.stat().st_size, self._expires_at(ttl)))
+        self._maybe_purge()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._hot.pop(key)
+            self._drop_disk(key)
+
+    # --- Reads ---
+    def get(self, key: str) -> Optional[memoryview]:
+        """
+        Returns a read-only view of the stored bytes, or None.
+
+        Hot entries are returned without copying; disk entries are mmapped.
+        Callers that need `bytes` should call bytes() on the result.
+        """
+        now = time.monotonic()
+        hot = self._hot.get(key)
+        if hot is not None:
+            if not _is_expired(hot.expires_at, now):
+                return memoryview(hot.data)
+            self._expire(key)
+            return None
+
+        with self._lock:
+            disk = self._disk.get(key)
+            if disk is None:
+                self.disk_misses += 1
+                return None
+            if _is_expired(disk.expires_at, now):
+                self._expire(key)
+                return None
+            self._disk[key] = self._disk.pop(key)  # most recently used
+            self.disk_hits += 1
+
+        try:
+            view = self._mmap(disk.path, disk.size)
+        except FileNotFoundError:
+            print(f"--- IMAGE STORE WARNING ({self.name}): Spill file for '{key}' is gone.")
+            with self._lock:
+                self._drop_disk(key, unlink=False)
+            return None
+
+        if disk.size <= self.max_hot_entry_bytes:
+            self._hot.put(key, _HotEntry(bytes(view), disk.expires_at))
+        return view
+
+    def path(self, key: str) -> Optional[Path]:
+        """Local file backing `key`, if the entry currently has one."""
+        with self._lock:
+            disk = self._disk.get(key)
+            if disk is None or _is_expired(disk.expires_at, time.monotonic()):
+                return None
+            return disk.path
+
+    def __contains__(self, key: str) -> bool:
+        now = time.monotonic()
+        hot = self._hot.peek(key)
+        if hot is not None:
+            return not _is_expired(hot.expires_at, now)
+        with self._lock:
+            disk = self._disk.get(key)
+            return disk is not None and not _is_expired(disk.expires_at, now)
+
+    # --- Maintenance ---
+    def purge_expired(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            self._last_purge = now
+            expired = [
+                key
+                for key, entry in self._hot.items()
+                if _is_expired(entry.expires_at, now)
+            ]
+            expired += [
+                key
+                for key, entry in self._disk.items()
+                if _is_expired(entry.expires_at, now)
+            ]
+            for key in expired:
+                self._expire(key)
+        return len(expired)
+
+    def clear(self) -> None:
+        """Drops every entry and removes this process' spill directory."""
+        with self._lock:
+            self._hot.clear()
+            self._disk.clear()
+            self._disk_bytes = 0
+            shutil.rmtree(self._dir, ignore_errors=True)
+
+    def stats(self) -> Dict[str, int]:
+        hot = self._hot.stats()
+        return {
+            "memory_entries": hot["entries"],
+            "memory_bytes": hot["bytes"],
+            "memory_budget_bytes": hot["max_bytes"],
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+            "disk_budget_bytes": self.disk_budget_bytes or 0,
+            "memory_hits": hot["hits"],
+            "disk_hits": self.disk_hits,
+            "misses": self.disk_misses,
+            "evictions": hot["evictions"],
+            "spills": self.spills,
+            "disk_evictions": self.disk_evictions,
+            "expirations": self.expirations,
+        }
+
+    # --- Internals ---
+    def _expires_at(self, ttl: Optional[float]) -> Optional[float]:
+        ttl = self.ttl_seconds if ttl is None else ttl
+        return time.monotonic() + ttl if ttl is not None else None
+
+    def _path_for(self, key: str) -> Path:
+        return self._dir / hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def _spill(self, key: str, entry: _HotEntry) -> None:
+        if _is_expired(entry.expires_at, time.monotonic()):
+            return
+        with self._lock:
+            if key in self._disk:
+                # Already on disk, e.g. promoted from the disk tier earlier.
+                return
+            target = self._path_for(key)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_suffix(".tmp")
+            tmp.write_bytes(entry.data)
+            os.replace(tmp, target)
+            self._add_disk(key, _DiskEntry(target, len(entry.data), entry.expires_at))
+            self.spills += 1
+
+    def _add_disk(self, key: str, entry: _DiskEntry) -> None:
+        self._disk[key] = entry
+        self._disk_bytes += entry.size
+        if self.disk_budget_bytes is None:
+            return
+        # Oldest first; the entry just added is kept even if it alone is over budget.
+        for old_key in list(self._disk):
+            if self._disk_bytes <= self.disk_budget_bytes or old_key == key:
+                break
+            self._drop_disk(old_key)
+            self.disk_evictions += 1
+
+    def _drop_disk(self, key: str, unlink: bool = True) -> None:
+        disk = self._disk.pop(key, None)
+        if disk is not None:
+            self._disk_bytes -= disk.size
+            if unlink:
+                disk.path.unlink(missing_ok=True)
+
+    def _expire(self, key: str) -> None:
+        with self._lock:
+            self._hot.pop(key)
+            self._drop_disk(key)
+            self.expirations += 1
+
+    def _maybe_purge(self) -> None:
+        if time.monotonic() - self._last_purge >= _PURGE_INTERVAL_SECONDS:
+            self.purge_expired()
+
+    @staticmethod
+    def _mmap(path: Path, size: int) -> memoryview:
+        if size == 0:
+            return memoryview(b"")
+        with open(path, "rb") as f:
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
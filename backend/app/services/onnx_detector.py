@@ -0,0 +1,217 @@
+# backend/app/services/onnx_detector.py
+import ast
+import asyncio
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from app.models.ai_results import BoundingBox, DetectionResult
+from app.services.detectors import Detector
+from app.services.dicom_service import ModelInput, get_display_image
+from PIL import Image
+
+_DEFAULT_INPUT_SIZE = 640
+_LETTERBOX_FILL = 114  # the grey YOLO models are trained with
+
+
+def letterbox(
+    image: np.ndarray, size: Tuple[int, int]
+) -> Tuple[np.ndarray, float, Tuple[float, float]]:
+    """
+    Scales a uint8 image (grayscale or RGB) to fit `size` (height, width)
+    without distortion, pads the rest with grey, and returns the float32
+    1x3xHxW input tensor plus the scale and (x, y) padding used, for mapping
+    boxes back to the image.
+    """
+    height, width = size
+    rows, columns = image.shape[:2]
+    scale = min(height / rows, width / columns)
+    resized_rows = max(1, round(rows * scale))
+    resized_columns = max(1, round(columns * scale))
+    resized = np.asarray(
+        Image.fromarray(image).resize(
+            (resized_columns, resized_rows), Image.Resampling.BILINEAR
+        )
+    )
+    if resized.ndim == 2:
+        resized = np.repeat(resized[:, :, None], 3, axis=2)
+
+    pad_x = (width - resized_columns) / 2
+    pad_y = (height - resized_rows) / 2
+    top, left = int(round(pad_y - 0.1)), int(round(pad_x - 0.1))
+    canvas = np.full((height, width, 3), _LETTERBOX_FILL, dtype=np.uint8)
+    canvas[top : top + resized_rows, left : left + resized_columns] = resized[:, :, :3]
+    tensor = canvas.transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+    return tensor, scale, (float(left), float(top))
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Greedy non-maximum suppression over xyxy boxes; indices kept, best first."""
+    order = np.argsort(-scores, kind="stable")
+    areas = (boxes[:, 2] - boxes[:, 0]).clip(0) * (boxes[:, 3] - boxes[:, 1]).clip(0)
+    keep = []
+    while order.size:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        x1 = np.maximum(boxes[best, 0], boxes[rest, 0])
+        y1 = np.maximum(boxes[best, 1], boxes[rest, 1])
+        x2 = np.minimum(boxes[best, 2], boxes[rest, 2])
+        y2 = np.minimum(boxes[best, 3], boxes[rest, 3])
+        overlap = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+        iou = overlap / np.maximum(areas[best] + areas[rest] - overlap, 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def decode_predictions(
+    output: np.ndarray,
+    scale: float,
+    padding: Tuple[float, float],
+    image_size: Tuple[int, int],
+    confidence_threshold: float,
+    iou_threshold: float,
+    names: Dict[int, str],
+) -> DetectionResult:
+    """
+    Boxes from a YOLOv8-style output, (1, 4 + classes, candidates) with
+    cx, cy, w, h in input pixels and one score per class, in image pixels.
+    NMS is done per class.
+    """
+    predictions = output[0].T  # -> (candidates, 4 + classes)
+    class_scores = predictions[:, 4:]
+    class_ids = class_scores.argmax(axis=1)
+    confidences = class_scores[np.arange(len(class_ids)), class_ids]
+    selected = confidences >= confidence_threshold
+    centers, class_ids, confidences = (
+        predictions[selected, :4],
+        class_ids[selected],
+        confidences[selected],
+    )
+
+    boxes = np.empty_like(centers)
+    boxes[:, :2] = centers[:, :2] - centers[:, 2:4] / 2
+    boxes[:, 2:] = centers[:, :2] + centers[:, 2:4] / 2
+    # Shift each class apart so one NMS pass never suppresses across classes.
+    offsets = class_ids[:, None] * (boxes.max(initial=0) + 1)
+    kept = nms(boxes + offsets, confidences, iou_threshold)
+
+    image_width, image_height = image_size
+    pad_x, pad_y = padding
+    results = []
+    for index in kept:
+        x1, y1, x2, y2 = boxes[index]
+        x1 = float(np.clip((x1 - pad_x) / scale, 0, image_width))
+        x2 = float(np.clip((x2 - pad_x) / scale, 0, image_width))
+        y1 = float(np.clip((y1 - pad_y) / scale, 0, image_height))
+        y2 = float(np.clip((y2 - pad_y) / scale, 0, image_height))
+        if x2 <= x1 or y2 <= y1:
+            continue
+        class_id = int(class_ids[index])
+        results.append(
+            BoundingBox(
+                x1=x1,
+                y1=y1,
+                x2=x2,
+                y2=y2,
+                label=names.get(class_id, str(class_id)),
+                confidence=float(confidences[index]),
+            )
+        )
+    return DetectionResult(boxes=results)
+
+
+class OnnxDetector(Detector):
+    """
+    In-process object detector: a YOLOv8-style ONNX model (e.g. an ultralytics
+    export of models/detection.pt) run with ONNX Runtime on the CPU.
+
+    The detector works on the default-windowed display image, which it
+    letterboxes to the model's input size. Runs go to a thread, since ONNX
+    Runtime releases the GIL. At most `max_concurrent_runs` run at once,
+    because each run already uses the intra-op thread pool.
+    """
+
+    def __init__(
+        self,
+        model_path: Path,
+        confidence_threshold: float,
+        iou_threshold: float,
+        max_concurrent_runs: int = 1,
+        intra_op_threads: Optional[int] = None,
+        model_type: str = "detection",
+    ):
+        self.model_path = Path(model_path)
+        self.model_type = model_type
+        self.confidence_threshold = confidence_threshold
+        self.iou_threshold = iou_threshold
+        self.intra_op_threads = intra_op_threads
+        self._runs = asyncio.Semaphore(max_concurrent_runs)
+        self._session = None
+        self._input_name = ""
+        self.input_size = (_DEFAULT_INPUT_SIZE, _DEFAULT_INPUT_SIZE)
+        self.names: Dict[int, str] = {}
+        self._digest = ""
+
+    @property
+    def model_id(self) -> str:
+        # The weights' hash stands in for a version: new weights, new cache keys.
+        return f"onnx/{self.model_path.stem}/{self._digest[:12]}"
+
+    def params(self) -> Dict[str, Any]:
+        return {
+            "confidence": self.confidence_threshold,
+            "iou": self.iou_threshold,
+            "input_size": list(self.input_size),
+        }
+
+    def load(self) -> None:
+        import onnxruntime  # optional dependency, only needed for this backend
+
+        if not self.model_path.is_file():
+            raise FileNotFoundError(f"ONNX detection model not found: {self.model_path}")
+        options = onnxruntime.SessionOptions()
+        if self.intra_op_threads:
+            options.intra_op_num_threads = self.intra_op_threads
+        self._session = onnxruntime.InferenceSession(
+            str(self.model_path), options, providers=["CPUExecutionProvider"]
+        )
+        self._digest = hashlib.sha256(self.model_path.read_bytes()).hexdigest()
+
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        height, width = model_input.shape[2:4]
+        metadata = self._session.get_modelmeta().custom_metadata_map
+        if not (isinstance(height, int) and isinstance(width, int)):
+            # Dynamic axes: ultralytics records the export size as "imgsz".
+            height, width = ast.literal_eval(metadata.get("imgsz", "[640, 640]"))
+        self.input_size = (height, width)
+        if "names" in metadata:
+            self.names = {int(k): str(v) for k, v in ast.literal_eval(metadata["names"]).items()}
+        print(
+            f"--- ONNX DETECTOR: Loaded {self.model_path.name} "
+            f"(input {width}x{height}, {len(self.names)} classes)."
+        )
+
+    def detect_array(self, image: np.ndarray) -> DetectionResult:
+        """Runs the model on a uint8 image; boxes are in the image's pixels."""
+        if self._session is None:
+            self.load()
+        tensor, scale, padding = letterbox(image, self.input_size)
+        output = self._session.run(None, {self._input_name: tensor})[0]
+        return decode_predictions(
+            output,
+            scale,
+            padding,
+            (image.shape[1], image.shape[0]),
+            self.confidence_threshold,
+            self.iou_threshold,
+            self.names,
+        )
+
+    async def detect(self, dicom_id: str, model_input: ModelInput) -> DetectionResult:
+        image = await get_display_image(dicom_id)
+        if image is None:
+            raise ValueError("Original DICOM image payload not found for AI processing.")
+        async with self._runs:
+            return await asyncio.to_thread(self.detect_array, image)
@@ -0,0 +1,145 @@
+# backend/app/services/roboflow_client.py
+import asyncio
+from typing import Any, Dict, Optional
+
+import httpx
+from app.core.config import settings
+from app.util.rate_limit import TokenBucket, retry_after_seconds
+
+_client: Optional["RoboflowClient"] = None
+
+
+class RoboflowClient:
+    """
+    Async client for Roboflow's hosted inference API (the "v0" endpoint used
+    by detect.roboflow.com: POST /<project>/<version>?api_key=..., with the
+    base64 image as the body).
+
+    One instance is shared by all requests, so connections (and their TLS
+    sessions) are kept alive and reused. At most `max_concurrency` inferences
+    are in flight; further callers wait for a slot. Requests are also paced
+    by a token bucket (`requests_per_second`, `burst`), and a 429 answer pauses
+    the bucket for Retry-After (else an exponential backoff) before the
+    request is retried, up to `max_retries` times.
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        api_key: Optional[str],
+        timeout: httpx.Timeout,
+        max_connections: int,
+        max_concurrency: int,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        requests_per_second: Optional[float] = None,
+        burst: int = 1,
+        max_retries: int = 0,
+        backoff_seconds: float = 1.0,
+    ):
+        self.api_key = api_key
+        self._http = httpx.AsyncClient(
+            base_url=api_url,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            transport=transport,
+        )
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._rate_limit = TokenBucket(requests_per_second, burst)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.calls = 0
+        self.errors = 0
+        self.throttled = 0
+
+    async def infer(self, image_base64: str, model_id: str) -> Dict[str, Any]:
+        """
+        Runs the hosted model on a base64-encoded image and returns the JSON
+        response ({"predictions": [...], ...}). Raises httpx.HTTPStatusError for
+        error responses and httpx.TimeoutException when the API is too slow.
+        """
+        self.calls += 1
+        try:
+            for attempt in range(self.max_retries + 1):
+                await self._rate_limit.acquire()
+                async with self._slots:
+                    response = await self._http.post(
+                        f"/{model_id}",
+                        params={"api_key": self.api_key},
+                        content=image_base64,
+                        headers={"Content-Type": "application/x-www-form-urlencoded"},
+                    )
+                if response.status_code != 429 or attempt == self.max_retries:
+                    break
+                delay = retry_after_seconds(response.headers.get("Retry-After"))
+                if delay is None:
+                    delay = self.backoff_seconds * 2**attempt
+                print(f"--- ROBOFLOW CLIENT: Rate limited (429), retrying in {delay:.1f}s.")
+                self.throttled += 1
+                self._rate_limit.pause(delay)
+            response.raise_for_status()
+            return response.json()
+        except Exception:
+            self.errors += 1
+            raise
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "throttled": self.throttled,
+            "rate_limit_waits": self._rate_limit.waits,
+        }
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+def start_roboflow_client() -> RoboflowClient:
+    """
+    Creates the shared Roboflow client. Called from main.create_app on startup,
+    and lazily by get_roboflow_client if the app was started without lifespan
+    events (e.g. a TestClient outside `with`).
+    """
+    global _client
+    if _client is not None:
+        return _client
+    _client = RoboflowClient(
+        api_url=settings.ROBOFLOW_API_URL,
+        api_key=settings.ROBOFLOW_API_KEY,
+        timeout=httpx.Timeout(
+            settings.ROBOFLOW_READ_TIMEOUT, connect=settings.ROBOFLOW_CONNECT_TIMEOUT
+        ),
+        max_connections=settings.ROBOFLOW_MAX_CONNECTIONS,
+        max_concurrency=settings.ROBOFLOW_MAX_CONCURRENCY,
+        requests_per_second=settings.ROBOFLOW_REQUESTS_PER_SECOND,
+        burst=settings.ROBOFLOW_BURST,
+        max_retries=settings.ROBOFLOW_MAX_RETRIES,
+        backoff_seconds=settings.ROBOFLOW_BACKOFF_SECONDS,
+    )
+    print(
+        f"--- ROBOFLOW CLIENT: Started for {settings.ROBOFLOW_API_URL} "
+        f"({settings.ROBOFLOW_MAX_CONCURRENCY} concurrent inferences)."
+    )
+    return _client
+
+
+def get_roboflow_client() -> RoboflowClient:
+    return start_roboflow_client()
+
+
+def roboflow_stats() -> Dict[str, int]:
+    if _client is None:
+        return {"calls": 0, "errors": 0, "throttled": 0, "rate_limit_waits": 0}
+    return _client.stats()
+
+
+async def close_roboflow_client() -> None:
+    global _client
+    if _client is None:
+        return
+    client, _client = _client, None
+    await client.aclose()
+    print("--- ROBOFLOW CLIENT: Closed.")
@@ -0,0 +1,92 @@
+# backend/app/services/worker_pool.py
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+_executor: Optional[Executor] = None
+_slots: Optional[asyncio.Semaphore] = None
+
+
+# Retry-After (seconds) sent with the 503 for a WorkerPoolBusyError (see main.py).
+BUSY_RETRY_AFTER_SECONDS = 5
+
+
+class WorkerPoolBusyError(RuntimeError):
+    """Raised when no worker slot frees up within WORKER_POOL_QUEUE_TIMEOUT."""
+
+    pass
+
+
+def start_worker_pool() -> Executor:
+    """
+    Creates the executor used for CPU-bound DICOM work (decode, render, encode).
+
+    Called from main.create_app on startup, and lazily by run_in_worker if the
+    app was started without lifespan events (e.g. a TestClient outside `with`).
+    """
+    global _executor, _slots
+    if _executor is not None:
+        return _executor
+
+    kind = settings.WORKER_POOL_KIND.lower()
+    max_workers = settings.WORKER_POOL_MAX_WORKERS or os.cpu_count() or 1
+    if kind == "process":
+        _executor = ProcessPoolExecutor(max_workers=max_workers)
+    elif kind == "thread":
+        _executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="dicom-worker"
+        )
+    else:
+        raise ValueError(
+            f"Invalid WORKER_POOL_KIND '{settings.WORKER_POOL_KIND}'. Use 'thread' or 'process'."
+        )
+
+    # Running jobs plus queued jobs; anything beyond that waits in run_in_worker
+    # (and eventually gets WorkerPoolBusyError) instead of piling up in the executor.
+    _slots = asyncio.Semaphore(max_workers + settings.WORKER_POOL_MAX_QUEUE)
+    print(
+        f"--- WORKER POOL: Started {kind} pool with {max_workers} workers "
+        f"(queue limit {settings.WORKER_POOL_MAX_QUEUE})."
+    )
+    return _executor
+
+
+def shutdown_worker_pool() -> None:
+    global _executor, _slots
+    if _executor is None:
+        return
+    _executor.shutdown(wait=True, cancel_futures=True)
+    _executor = None
+    _slots = None
+    print("--- WORKER POOL: Shut down.")
+
+
+async def run_in_worker(func: Callable[..., T], *args: Any) -> T:
+    """
+    Runs func(*args) in the worker pool without blocking the event loop.
+
+    With WORKER_POOL_KIND="process", func and its arguments must be picklable,
+    so pass module-level functions and plain data (paths, bytes, arrays).
+    """
+    executor = start_worker_pool()
+    slots = _slots
+    try:
+        await asyncio.wait_for(
+            slots.acquire(), timeout=settings.WORKER_POOL_QUEUE_TIMEOUT
+        )
+    except asyncio.TimeoutError as e:
+        raise WorkerPoolBusyError(
+            "All DICOM workers are busy and the queue is full. Please retry shortly."
+        ) from e
+
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, partial(func, *args))
+    finally:
+        slots.release()
@@ -0,0 +1,139 @@
+import os
+from pathlib import Path
+from typing import BinaryIO, Mapping, NamedTuple, Optional, Union
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+# ASGI extension for sending part of an open file with sendfile(2); offered by
+# some servers (e.g. Hypercorn with it enabled), not by uvicorn.
+_ZEROCOPY_SEND = "http.response.zerocopysend"
+
+
+class ByteRange(NamedTuple):
+    start: int
+    end: int  # inclusive, as in Content-Range
+
+    @property
+    def length(self) -> int:
+        return self.end - self.start + 1
+
+
+class RangeNotSatisfiableError(ValueError):
+    """The Range header asks only for bytes past the end of the representation."""
+
+    pass
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[ByteRange]:
+    """
+    The byte range a Range header asks for, within a representation of `size` bytes.
+
+    Returns None when the whole representation should be sent: no header, a
+    unit other than bytes, a malformed header, or several ranges (a plain 200
+    is a valid answer to those). Raises RangeNotSatisfiableError when the range
+    starts past the end.
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = (part.strip() for part in spec.partition("-"))
+    if not dash or not (first or last):
+        return None
+    if not all(part.isascii() and part.isdigit() for part in (first, last) if part):
+        return None
+
+    if not first:  # suffix range: the last N bytes
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise RangeNotSatisfiableError(f"bytes=-{suffix} of {size} bytes")
+        return ByteRange(max(0, size - suffix), size - 1)
+    start = int(first)
+    if start >= size:
+        raise RangeNotSatisfiableError(f"bytes={start}- of {size} bytes")
+    end = int(last) if last else size - 1
+    if end < start:
+        return None
+    return ByteRange(start, min(end, size - 1))
+
+
+def if_range_matches(if_range: Optional[str], etag: str) -> bool:
+    """
+    Whether a Range may be honoured under the If-Range precondition. Only a
+    strong ETag match counts; a date or a stale tag means the full file is sent.
+    """
+    return not if_range or if_range.strip() == etag
+
+
+class FileRangeResponse(Response):
+    """
+    Sends `count` bytes of a file starting at `offset`. `file` is a path or a
+    file already open for reading; either way it is closed once sent.
+
+    With the ASGI zero-copy send extension the server sends straight from the
+    file; otherwise the file is read in `chunk_size` pieces in a thread, so
+    memory use stays at one chunk whatever the file size. Headers, including
+    Content-Length, are the caller's.
+    """
+
+    def __init__(
+        self,
+        file: Union[Path, BinaryIO],
+        offset: int,
+        count: int,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None,
+        chunk_size: int = 64 * 1024,
+    ) -> None:
+        self.file = file
+        self.offset = offset
+        self.count = count
+        self.chunk_size = chunk_size
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Opened (if it isn't already) before the headers go out, so a file
+        # that vanished fails the request instead of truncating a response
+        # that looks successful.
+        file = open(self.file, "rb") if isinstance(self.file, Path) else self.file
+        with file:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": self.status_code,
+                    "headers": self.raw_headers,
+                }
+            )
+            if _ZEROCOPY_SEND in scope.get("extensions", {}):
+                await send(
+                    {
+                        "type": _ZEROCOPY_SEND,
+                        "file": file,
+                        "offset": self.offset,
+                        "count": self.count,
+                        "more_body": False,
+                    }
+                )
+                return
+
+            file.seek(self.offset, os.SEEK_SET)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(
+                    file.read, min(self.chunk_size, remaining)
+                )
+                if not chunk:
+                    break  # file shrank underneath us; end the body
+                remaining -= len(chunk)
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": remaining > 0}
+                )
+            if remaining > 0 or self.count == 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -1,126 +1,272 @@
 import io
+from typing import Optional
 
 import numpy as np
 import pydicom
 from PIL import Image
+from pydicom.pixels import apply_modality_lut, apply_voi_lut
 
 
-def _to_png(arr: np.ndarray, ds: pydicom.Dataset) -> bytes:
+def _to_png(
+    arr: np.ndarray,
+    ds: pydicom.Dataset,
+    window_center: Optional[float] = None,
+    window_width: Optional[float] = None,
+    invert: bool = False,
+    scale: float = 1.0,
+) -> bytes:
     """
     Converts a DICOM pixel array to PNG bytes.
 
     Args:
-        arr (np.ndarray): Pixel array from pydicom.Dataset.pixel_array.
-                          It's assumed that RescaleSlope and RescaleIntercept
-                          have already been applied by pydicom.
-        ds (pydicom.Dataset): The DICOM dataset object.
+        arr (np.ndarray): Stored pixel values, as returned by pixel_array.
+                          The Modality LUT or RescaleSlope/RescaleIntercept
+                          is applied here; window values are in modality units.
+        ds (pydicom.Dataset): The DICOM dataset object (a header-only copy is enough).
+        window_center (float, optional): Overrides the dataset's WindowCenter.
+        window_width (float, optional): Overrides the dataset's WindowWidth.
+        invert (bool): Invert the output on top of any MONOCHROME1 inversion.
+        scale (float): Output size relative to the full image, in (0, 1].
 
     Returns:
         bytes: PNG image data as bytes.
     """
+    img_array_processed = _to_uint8(arr, ds, window_center, window_width, invert)
+    return _encode_png(img_array_processed, scale)
 
-    # 1. Convert pixel array to float32 for calculations
-    # This prevents overflow/underflow issues with integer arithmetic and ensures
-    # that intermediate results (like subtractions leading to negatives) are handled correctly.
-    pixel_data_float = arr.astype(np.float32)
 
-    # 2. Determine and apply windowing or auto-contrast
-    wc_val = getattr(ds, "WindowCenter", None)
-    ww_val = getattr(ds, "WindowWidth", None)
+def _to_uint8(
+    arr: np.ndarray,
+    ds: pydicom.Dataset,
+    window_center: Optional[float] = None,
+    window_width: Optional[float] = None,
+    invert: bool = False,
+) -> np.ndarray:
+    """
+    Applies the Modality LUT/rescale, windowing (or VOI LUT, or auto-contrast)
+    and photometric inversion.
+
+    Takes the same arguments as _to_png and returns the 2D uint8 display image
+    before encoding, e.g. for building tiles or previews from it.
+
+    Integer pixel data of up to 16 bits never goes through float: the whole
+    pipeline is evaluated once for every possible stored value into a uint8
+    lookup table, and the image is rendered by a single gather through it.
+    Only floating-point (and 32-bit) pixel data is transformed per pixel.
+    """
+    arr = _as_2d(arr)
+    photometric_interpretation = getattr(
+        ds, "PhotometricInterpretation", "MONOCHROME2"
+    )  # Default to MONOCHROME2 if not present
+    inverted = (photometric_interpretation == "MONOCHROME1") != invert
+
+    if arr.dtype.kind in "ui" and arr.dtype.itemsize <= 2 and arr.dtype.isnative:
+        # Index the table by the raw bit pattern, so signed data needs no offset.
+        index_dtype = np.dtype(f"u{arr.dtype.itemsize}")
+        stored = np.arange(2 ** (8 * arr.dtype.itemsize), dtype=index_dtype).view(
+            arr.dtype
+        )
+        present = (stored >= arr.min()) & (stored <= arr.max())
+        lut = _display_values(
+            _modality_values(stored, ds, np.float64),
+            present,
+            ds,
+            window_center,
+            window_width,
+            inverted,
+        )
+        return lut[arr.view(index_dtype)]
+
+    return _display_values(
+        _modality_values(arr, ds, np.float32),
+        None,
+        ds,
+        window_center,
+        window_width,
+        inverted,
+    )
+
+
+def _as_2d(arr: np.ndarray) -> np.ndarray:
+    # Ensure the array is 2D (grayscale).
+    # If it came from a multi-frame DICOM and pixel_array returned one frame, it might be 3D with a single slice.
+    if arr.ndim == 3 and arr.shape[2] == 1:
+        arr = arr.squeeze(axis=2)
+
+    if arr.ndim != 2:
+        # This case should ideally not be hit for standard grayscale DICOMs.
+        # If it's color, this function would need significant changes.
+        raise ValueError(
+            f"Processed pixel array is not 2D (shape: {arr.shape}). "
+            "This function expects grayscale images."
+        )
+    return arr
+
+
+def _modality_values(
+    values: np.ndarray, ds: pydicom.Dataset, dtype: type
+) -> np.ndarray:
+    """Stored values -> modality values (Modality LUT Sequence or rescale slope/intercept)."""
+    return np.asarray(apply_modality_lut(values, ds), dtype=dtype)
+
+
+def _window_params(
+    ds: pydicom.Dataset,
+    window_center: Optional[float],
+    window_width: Optional[float],
+) -> Optional[tuple[float, float]]:
+    """(center, width) from the overrides or the dataset, or None if there is no valid window."""
+    wc_val = getattr(ds, "WindowCenter", None) if window_center is None else window_center
+    ww_val = getattr(ds, "WindowWidth", None) if window_width is None else window_width
+    if wc_val is None or ww_val is None:
+        return None
 
     window_center = None
     window_width = None
-    apply_windowing = False
-
-    if wc_val is not None and ww_val is not None:
-        # Handle MultiValue for WindowCenter
-        if isinstance(wc_val, pydicom.multival.MultiValue):
-            if len(wc_val) > 0:
-                window_center = float(wc_val[0])
-        elif isinstance(wc_val, (int, float, str)):  # str in case it's read as string
-            try:
-                window_center = float(wc_val)
-            except ValueError:
-                window_center = None
-
-        # Handle MultiValue for WindowWidth
-        if isinstance(ww_val, pydicom.multival.MultiValue):
-            if len(ww_val) > 0:
-                window_width = float(ww_val[0])
-        elif isinstance(ww_val, (int, float, str)):
-            try:
-                window_width = float(ww_val)
-            except ValueError:
-                window_width = None
-
-        # Check if extracted WC/WW are valid for windowing
-        if window_center is not None and window_width is not None and window_width > 0:
-            apply_windowing = True
-
-    if apply_windowing:
+
+    # Handle MultiValue for WindowCenter
+    if isinstance(wc_val, pydicom.multival.MultiValue):
+        if len(wc_val) > 0:
+            window_center = float(wc_val[0])
+    elif isinstance(wc_val, (int, float, str)):  # str in case it's read as string
+        try:
+            window_center = float(wc_val)
+        except ValueError:
+            window_center = None
+
+    # Handle MultiValue for WindowWidth
+    if isinstance(ww_val, pydicom.multival.MultiValue):
+        if len(ww_val) > 0:
+            window_width = float(ww_val[0])
+    elif isinstance(ww_val, (int, float, str)):
+        try:
+            window_width = float(ww_val)
+        except ValueError:
+            window_width = None
+
+    # Check if extracted WC/WW are valid for windowing
+    if window_center is not None and window_width is not None and window_width > 0:
+        return window_center, window_width
+    return None
+
+
+def _display_values(
+    values: np.ndarray,
+    present: Optional[np.ndarray],
+    ds: pydicom.Dataset,
+    window_center: Optional[float],
+    window_width: Optional[float],
+    inverted: bool,
+) -> np.ndarray:
+    """
+    Maps modality values to 0-255 display values.
+
+    `values` is either the image itself or the table of all possible stored
+    values; in the latter case `present` masks the entries within the image's
+    [min, max] stored-value range, which is what auto-contrast has to look at
+    (values in that range need not all occur in the image).
+    """
+    explicit_window = window_center is not None or window_width is not None
+    window = _window_params(ds, window_center, window_width)
+
+    if not explicit_window and "VOILUTSequence" in ds:
+        # VOI LUT Sequence: a table lookup on the (integer) modality values,
+        # scaled from the LUT's output bit depth to 0-255.
+        lut_bits = int(ds.VOILUTSequence[0].LUTDescriptor[2])
+        voi = apply_voi_lut(np.rint(values).astype(np.int64), ds, prefer_lut=True)
+        scaled = voi * (255.0 / (2**lut_bits - 1))
+    elif window is not None:
         # Apply windowing transformation
         # Formula: Output = ((Input - (WC - WW/2)) / WW) * 255
+        window_center, window_width = window
         lower_bound = window_center - (window_width / 2.0)
-        # upper_bound = window_center + (window_width / 2.0) # For context
-
-        # Scale pixel data to 0-255 range based on window
-        img_array_scaled = (pixel_data_float - lower_bound) / window_width * 255.0
-
-        # Clip values to the 0-255 range and convert to uint8
-        img_array_processed = np.clip(img_array_scaled, 0, 255).astype(np.uint8)
+        scaled = (values - lower_bound) / window_width * 255.0
     else:
         # Fallback to auto-contrast (min-max normalization)
-        min_val = pixel_data_float.min()
-        max_val = pixel_data_float.max()
+        visible = values if present is None else values[present]
+        min_val = visible.min()
+        max_val = visible.max()
 
         if max_val > min_val:
             # Normalize to 0-1 range, then scale to 0-255
-            img_array_normalized = (pixel_data_float - min_val) / (max_val - min_val)
-            img_array_processed = (img_array_normalized * 255.0).astype(np.uint8)
+            scaled = (values - min_val) / (max_val - min_val) * 255.0
         else:
             # Flat image (all pixels have the same value)
             # Display as mid-gray (128) if positive, or black (0) if zero/negative.
-            # ds.pixel_array usually returns non-negative values for image intensity.
-            gray_value = 128 if min_val > 0 else 0
-            img_array_processed = np.full(arr.shape, gray_value, dtype=np.uint8)
+            scaled = np.full(values.shape, 128 if min_val > 0 else 0, dtype=np.float32)
 
-    # 3. Handle Photometric Interpretation
-    photometric_interpretation = getattr(
-        ds, "PhotometricInterpretation", "MONOCHROME2"
-    )  # Default to MONOCHROME2 if not present
-    if photometric_interpretation == "MONOCHROME1":
+    # Clip values to the 0-255 range and convert to uint8
+    display = np.clip(scaled, 0, 255).astype(np.uint8)
+    if inverted:
         # Invert pixels: 0 becomes 255, 255 becomes 0.
-        img_array_processed = 255 - img_array_processed
+        np.subtract(255, display, out=display)
+    return display
 
-    # 4. Create PIL Image and convert to PNG bytes
-    try:
-        # Ensure the array is 2D (grayscale).
-        # If it came from a multi-frame DICOM and pixel_array returned one frame, it might be 3D with a single slice.
-        if img_array_processed.ndim == 3 and img_array_processed.shape[2] == 1:
-            img_array_processed = img_array_processed.squeeze(axis=2)
-
-        if img_array_processed.ndim != 2:
-            # This case should ideally not be hit for standard grayscale DICOMs.
-            # If it's color, this function would need significant changes.
-            raise ValueError(
-                f"Processed pixel array is not 2D (shape: {img_array_processed.shape}). "
-                "This function expects grayscale images."
-            )
 
+# Output formats for rendered images, by name, with their media types.
+IMAGE_MEDIA_TYPES = {"png": "image/png", "webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+def _encode_png(
+    img_array_processed: np.ndarray, scale: float = 1.0, compress_level: int = 6
+) -> bytes:
+    """Encodes a 2D uint8 image as PNG, optionally downscaled by `scale`."""
+    return _encode_image(img_array_processed, "png", scale, png_compress_level=compress_level)
+
+
+def _encode_image(
+    img_array_processed: np.ndarray,
+    image_format: str = "png",
+    scale: float = 1.0,
+    png_compress_level: int = 6,
+    webp_method: int = 4,
+    jpeg_quality: int = 90,
+) -> bytes:
+    """
+    Encodes a 2D uint8 image as PNG, lossless WebP or JPEG (see IMAGE_MEDIA_TYPES),
+    optionally downscaled by `scale`.
+
+    png_compress_level is the zlib level (0-9, lower is faster and larger) and
+    webp_method the WebP encoder effort (0-6, same trade-off).
+    """
+    # Create PIL Image and convert to the requested format
+    try:
         pil_image = Image.fromarray(
             img_array_processed, mode="L"
         )  # 'L' for 8-bit grayscale
+        if scale < 1.0:
+            width, height = pil_image.size
+            pil_image = pil_image.resize(
+                (max(1, round(width * scale)), max(1, round(height * scale))),
+                Image.Resampling.BILINEAR,
+                reducing_gap=2.0,
+            )
 
         buffer = io.BytesIO()
-        pil_image.save(buffer, format="PNG")
-        png_bytes = buffer.getvalue()
-        return png_bytes
+        if image_format == "png":
+            pil_image.save(buffer, format="PNG", compress_level=png_compress_level)
+        elif image_format == "webp":
+            pil_image.save(buffer, format="WEBP", lossless=True, method=webp_method)
+        elif image_format == "jpeg":
+            pil_image.save(buffer, format="JPEG", quality=jpeg_quality)
+        else:
+            raise ValueError(f"Unsupported image format: {image_format!r}")
+        return buffer.getvalue()
 
     except Exception as e:
-        print(f"Error creating PNG from pixel array: {e}")
+        print(f"Error creating {image_format} from pixel array: {e}")
         print(
             f"Details: shape={img_array_processed.shape}, dtype={img_array_processed.dtype}, min={img_array_processed.min()}, max={img_array_processed.max()}"
         )
         # Depending on desired behavior, you could return a placeholder error image
         # or re-raise the exception. Re-raising makes the problem visible upstream.
         raise
+
+
+def _encode_preview(img_array: np.ndarray, max_edge: int = 512, quality: int = 80) -> bytes:
+    """Encodes a 2D uint8 image as a JPEG scaled down to `max_edge` on its long side."""
+    pil_image = Image.fromarray(img_array, mode="L")
+    pil_image.thumbnail((max_edge, max_edge), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    buffer = io.BytesIO()
+    pil_image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
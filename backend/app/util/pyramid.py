@@ -0,0 +1,43 @@
+import math
+
+import numpy as np
+from PIL import Image
+
+# Level 0 is the full-resolution image; every further level halves both sides,
+# down to the first level that fits into a single tile.
+
+
+def level_count(width: int, height: int, tile_size: int) -> int:
+    longest = max(width, height, 1)
+    if longest <= tile_size:
+        return 1
+    return math.ceil(math.log2(longest / tile_size)) + 1
+
+
+def level_size(width: int, height: int, level: int) -> tuple[int, int]:
+    factor = 2**level
+    return max(1, math.ceil(width / factor)), max(1, math.ceil(height / factor))
+
+
+def tile_grid(width: int, height: int, level: int, tile_size: int) -> tuple[int, int]:
+    """Number of tile (columns, rows) at a level."""
+    level_width, level_height = level_size(width, height, level)
+    return math.ceil(level_width / tile_size), math.ceil(level_height / tile_size)
+
+
+def build_level(base: np.ndarray, level: int) -> np.ndarray:
+    """
+    Downsamples the full-resolution 2D uint8 image to the given pyramid level.
+
+    Uses a box filter (PIL's Image.reduce), which averages each 2^level block
+    and keeps partial blocks at the right/bottom edge.
+    """
+    if level == 0:
+        return base
+    return np.asarray(Image.fromarray(base).reduce(2**level))
+
+
+def cut_tile(level_image: np.ndarray, x: int, y: int, tile_size: int) -> np.ndarray:
+    """Tile (x, y) of a level image. Edge tiles are smaller than tile_size."""
+    top, left = y * tile_size, x * tile_size
+    return level_image[top : top + tile_size, left : left + tile_size]
@@ -0,0 +1,80 @@
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` tokens per second, at most `burst` saved up.
+
+    acquire() waits for a token; waiters are served in arrival order. pause()
+    stops handing out tokens for a while, e.g. after the remote side answered
+    429 Too Many Requests, so every caller backs off together instead of each
+    one finding out on its own.
+
+    Args:
+        rate (float | None): Tokens per second; None = unlimited (pause() still works).
+        burst (int): Bucket size, i.e. how many calls may go out back to back.
+        clock (Callable): Monotonic clock in seconds (replaceable in tests).
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float],
+        burst: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._clock = clock
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self.waits = 0
+        self.pauses = 0
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                delay = self._take()
+                if delay <= 0:
+                    return
+                self.waits += 1
+                await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        """No tokens for `seconds`; the bucket starts empty afterwards."""
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+        self._tokens = 0.0
+        self.pauses += 1
+
+    def _take(self) -> float:
+        """Takes a token and returns 0, or returns how long to wait for one."""
+        now = self._clock()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.rate is None:
+            return 0.0
+        start = max(self._updated, self._paused_until)
+        self._tokens = min(self.burst, self._tokens + (now - start) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait per a Retry-After header (delay-seconds or HTTP date), if parseable."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
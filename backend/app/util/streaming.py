@@ -0,0 +1,45 @@
+import asyncio
+import json
+from typing import AsyncIterator, Awaitable, Iterable, TypeVar
+
+T = TypeVar("T")
+
+
+def ndjson_line(record: dict) -> bytes:
+    """One line of an NDJSON (application/x-ndjson) response body."""
+    return (json.dumps(record) + "\n").encode()
+
+
+async def bounded_as_completed(
+    jobs: Iterable[Awaitable[T]], limit: int
+) -> AsyncIterator[T]:
+    """
+    Runs `jobs` with at most `limit` in flight and yields their results in
+    completion order. Jobs are taken from the iterable only when a slot is
+    free, so a generator of coroutines is consumed lazily.
+
+    If the consumer stops early (e.g. the client of a streamed response went
+    away) or a job raises, the jobs still running are cancelled.
+    """
+    pending = iter(jobs)
+    in_flight: set[asyncio.Future] = set()
+
+    def fill() -> None:
+        while len(in_flight) < limit:
+            job = next(pending, None)
+            if job is None:
+                return
+            in_flight.add(asyncio.ensure_future(job))
+
+    try:
+        fill()
+        while in_flight:
+            done, in_flight = await asyncio.wait(
+                in_flight, return_when=asyncio.FIRST_COMPLETED
+            )
+            fill()
+            for task in done:
+                yield task.result()
+    finally:
+        for task in in_flight:
+            task.cancel()
@@ -0,0 +1,67 @@
+from io import BytesIO
+
+import pytest
+
+from app.core.config import settings
+from app.services import dicom_service
+from bench_export import UPDATES
+
+pytest.importorskip("pytest_benchmark")
+
+
+def _get_ok(client, url, **kwargs):
+    resp = client.get(url, **kwargs)
+    assert resp.status_code == 200
+    return resp
+
+
+def test_upload_endpoint(benchmark, client, dicom_bytes):
+    def setup():
+        dicom_service.close_stores()
+        files = {"file": ("bench.dcm", BytesIO(dicom_bytes), "application/dicom")}
+        return (files,), {}
+
+    def post(files):
+        resp = client.post(f"{settings.API_STR}/upload", files=files)
+        assert resp.status_code == 200
+
+    benchmark.pedantic(post, setup=setup, rounds=5)
+
+
+@pytest.mark.parametrize(
+    "path, params",
+    [
+        ("", {}),
+        ("", {"include_pixels": False}),
+        ("/image", {}),
+        ("/preview", {}),
+        ("/tiles/0/0/0", {}),
+    ],
+    ids=["payload", "meta", "image", "preview", "tile"],
+)
+def test_cached_reads(benchmark, client, dicom_bytes, ingest, path, params):
+    url = f"{settings.API_STR}/dicom/{ingest(dicom_bytes)}{path}"
+    _get_ok(client, url, params=params)  # warm the caches
+    benchmark(_get_ok, client, url, params=params)
+
+
+@pytest.mark.parametrize("image_format", ["png", "webp", "jpeg"])
+def test_render_endpoint(benchmark, client, dicom_bytes, ingest, image_format):
+    url = f"{settings.API_STR}/dicom/{ingest(dicom_bytes)}/render"
+    params = {"wc": 300, "ww": 1200, "scale": 0.5, "format": image_format}
+
+    def setup():
+        dicom_service._window_render_cache.clear()  # measure the render, not the cache
+        return (), {}
+
+    benchmark.pedantic(lambda: _get_ok(client, url, params=params), setup=setup, rounds=5)
+
+
+def test_export_endpoint(benchmark, client, dicom_bytes, ingest):
+    url = f"{settings.API_STR}/dicom/{ingest(dicom_bytes)}/export_modified"
+
+    def post():
+        resp = client.post(url, json={"updates": UPDATES})
+        assert resp.status_code == 200
+
+    benchmark(post)
@@ -0,0 +1,25 @@
+import asyncio
+
+import pytest
+
+from app.services import dicom_service
+
+pytest.importorskip("pytest_benchmark")
+
+UPDATES = {
+    "patient_id": "EXPORTED01",
+    "study_date": "20240202",
+    "window_center": 400,
+    "window_width": 1600,
+}
+
+
+def test_create_modified_dicom_with_meta(benchmark, dicom_bytes, ingest):
+    dicom_id = ingest(dicom_bytes)
+
+    def export():
+        return asyncio.run(
+            dicom_service.create_modified_dicom_with_meta(dicom_id, UPDATES)
+        )
+
+    assert benchmark(export)
@@ -0,0 +1,27 @@
+import asyncio
+from io import BytesIO
+
+import pytest
+from fastapi import UploadFile
+
+from app.core.config import settings
+from app.services import dicom_service
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.mark.parametrize("lazy", [False, True], ids=["eager", "lazy"])
+def test_save_and_parse(benchmark, dicom_bytes, lazy, monkeypatch):
+    monkeypatch.setattr(settings, "LAZY_RENDER", lazy)
+
+    def setup():
+        # IDs are content hashes: drop the previous round's entry so every
+        # round ingests instead of hitting the dedup shortcut.
+        dicom_service.close_stores()
+        upload = UploadFile(file=BytesIO(dicom_bytes), filename="bench.dcm")
+        return (upload,), {}
+
+    def save_and_parse(upload):
+        return asyncio.run(dicom_service.save_and_parse(upload))
+
+    benchmark.pedantic(save_and_parse, setup=setup, rounds=5)
@@ -0,0 +1,38 @@
+from io import BytesIO
+
+import pydicom
+import pytest
+
+from app.util.image_utils import IMAGE_MEDIA_TYPES, _encode_image, _to_png, _to_uint8
+from app.util.pixel_decode import frame_count
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.fixture(scope="module")
+def decoded(dicom_bytes):
+    ds = pydicom.dcmread(BytesIO(dicom_bytes))
+    arr = pydicom.pixels.pixel_array(ds, index=0 if frame_count(ds) > 1 else None)
+    return arr, ds
+
+
+def test_to_png_default_window(benchmark, decoded):
+    arr, ds = decoded
+    benchmark(_to_png, arr, ds)
+
+
+def test_to_png_explicit_window_scaled(benchmark, decoded):
+    arr, ds = decoded
+    benchmark(_to_png, arr, ds, 300.0, 1200.0, False, 0.25)
+
+
+def test_to_uint8(benchmark, decoded):
+    arr, ds = decoded
+    benchmark(_to_uint8, arr, ds)
+
+
+@pytest.mark.parametrize("image_format", list(IMAGE_MEDIA_TYPES))
+def test_encode_image(benchmark, decoded, image_format):
+    arr, ds = decoded
+    display = _to_uint8(arr, ds)
+    benchmark(_encode_image, display, image_format, 1.0, 6, 1, 90)
@@ -0,0 +1,86 @@
+"""
+Performance benchmarks (pytest-benchmark) for the ingest, render and export paths.
+
+They are not part of the regular test run. From backend/:
+
+    pip install -r ../requirements.txt  # includes pytest-benchmark
+    python -m pytest benchmarks --benchmark-autosave
+    python -m pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:25%
+
+Results are saved as JSON under benchmarks/baselines/<machine>/ (override with
+--benchmark-storage); --benchmark-compare checks a run against the latest one.
+The committed baseline was recorded on Linux-CPython-3.11-64bit; on another
+machine, record one with --benchmark-autosave first.
+"""
+
+import asyncio
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from dicom_factory import SPECS, make_dicom
+from fastapi import UploadFile
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import create_app
+from app.services import dicom_service
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+DEFAULT_STORAGE = "file://./.benchmarks"
+
+
+def _requested_explicitly(config: pytest.Config) -> bool:
+    # Only collect bench_*.py when the benchmarks were asked for by path, so a
+    # plain `pytest` from backend/ keeps running just the tests.
+    for arg in config.args:
+        path = Path(arg.split("::")[0]).resolve()
+        if path == BENCHMARK_DIR or BENCHMARK_DIR in path.parents:
+            return True
+    return False
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config: pytest.Config) -> None:
+    if config.getoption("benchmark_storage", None) == DEFAULT_STORAGE:
+        config.option.benchmark_storage = f"file://{BENCHMARK_DIR / 'baselines'}"
+
+
+def pytest_collect_file(file_path: Path, parent: pytest.Collector):
+    if (
+        file_path.suffix == ".py"
+        and file_path.name.startswith("bench_")
+        and _requested_explicitly(parent.config)
+        and not parent.session.isinitpath(file_path)  # pytest collects those itself
+    ):
+        return pytest.Module.from_parent(parent, path=file_path)
+    return None
+
+
+@pytest.fixture(autouse=True)
+def isolated_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_DIR", tmp_path / "spool")
+    yield
+    dicom_service.close_stores()
+
+
+@pytest.fixture(scope="session")
+def client():
+    return TestClient(create_app())
+
+
+@pytest.fixture(scope="session", params=SPECS, ids=lambda spec: spec.id)
+def dicom_bytes(request) -> bytes:
+    return make_dicom(request.param)
+
+
+@pytest.fixture
+def ingest():
+    """Uploads DICOM bytes through the service and returns the dicom_id."""
+
+    def ingest(data: bytes) -> str:
+        upload = UploadFile(file=BytesIO(data), filename="bench.dcm")
+        return asyncio.run(dicom_service.save_and_parse(upload))
+
+    return ingest
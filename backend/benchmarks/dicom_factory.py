@@ -0,0 +1,112 @@
+"""Synthetic DICOM files for the benchmarks."""
+
+from dataclasses import dataclass
+from io import BytesIO
+
+import numpy as np
+import pydicom
+from pydicom.dataset import FileMetaDataset
+from pydicom.uid import (
+    UID,
+    DeflatedExplicitVRLittleEndian,
+    ExplicitVRLittleEndian,
+    ImplicitVRLittleEndian,
+    RLELossless,
+    SecondaryCaptureImageStorage,
+    generate_uid,
+)
+
+_TRANSFER_SYNTAX_NAMES = {
+    ExplicitVRLittleEndian: "explicit",
+    ImplicitVRLittleEndian: "implicit",
+    DeflatedExplicitVRLittleEndian: "deflated",
+    RLELossless: "rle",
+}
+
+
+@dataclass(frozen=True)
+class DicomSpec:
+    rows: int
+    columns: int
+    bits_allocated: int = 16
+    bits_stored: int = 12
+    signed: bool = False
+    photometric: str = "MONOCHROME2"
+    transfer_syntax: UID = ExplicitVRLittleEndian
+    frames: int = 1
+    with_window: bool = True
+
+    @property
+    def id(self) -> str:
+        """Short name used as the pytest parameter id."""
+        depth = f"{self.bits_stored}{'s' if self.signed else 'u'}"
+        frames = f"-{self.frames}f" if self.frames > 1 else ""
+        syntax = _TRANSFER_SYNTAX_NAMES[self.transfer_syntax]
+        return f"{self.columns}x{self.rows}{frames}-{depth}-{self.photometric}-{syntax}"
+
+
+# Sizes, bit depths, photometric interpretations and transfer syntaxes the
+# benchmarks run over: a CT slice, radiographs, an 8-bit secondary capture and
+# a small cine loop.
+SPECS = [
+    DicomSpec(512, 512, bits_stored=16, signed=True, transfer_syntax=ImplicitVRLittleEndian),
+    DicomSpec(2048, 2048, transfer_syntax=DeflatedExplicitVRLittleEndian, with_window=False),
+    DicomSpec(2500, 2048, photometric="MONOCHROME1"),
+    DicomSpec(1024, 1024, bits_allocated=8, bits_stored=8, transfer_syntax=RLELossless),
+    DicomSpec(256, 256, frames=10),
+]
+
+
+def make_pixels(spec: DicomSpec, seed: int = 0) -> np.ndarray:
+    """A smooth gradient with noise, so compression behaves like on real images."""
+    rng = np.random.default_rng(seed)
+    shape = (spec.frames, spec.rows, spec.columns) if spec.frames > 1 else (spec.rows, spec.columns)
+    max_value = 2**spec.bits_stored - 1
+    gradient = np.linspace(0.1, 0.9, spec.columns) * np.linspace(0.5, 1.0, spec.rows)[:, None]
+    noise = rng.normal(0.0, 0.03, size=shape)
+    values = np.clip(gradient + noise, 0.0, 1.0) * max_value
+    if spec.signed:
+        values -= 2 ** (spec.bits_stored - 1)
+    dtype = f"{'i' if spec.signed else 'u'}{spec.bits_allocated // 8}"
+    return values.astype(dtype)
+
+
+def make_dicom(spec: DicomSpec, seed: int = 0) -> bytes:
+    """Encodes a synthetic image described by `spec` as a DICOM file."""
+    file_meta = FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = SecondaryCaptureImageStorage
+    file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    file_meta.TransferSyntaxUID = spec.transfer_syntax
+
+    ds = pydicom.Dataset()
+    ds.file_meta = file_meta
+    ds.SOPClassUID = SecondaryCaptureImageStorage
+    ds.SOPInstanceUID = file_meta.MediaStorageSOPInstanceUID
+    ds.PatientName = "Bench^Mark"
+    ds.PatientID = f"BENCH{seed:04d}"
+    ds.StudyDate = "20240101"
+    ds.Modality = "CT" if spec.signed else "OT"
+    ds.Rows, ds.Columns = spec.rows, spec.columns
+    if spec.frames > 1:
+        ds.NumberOfFrames = spec.frames
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = spec.photometric
+    ds.BitsAllocated = spec.bits_allocated
+    ds.BitsStored = spec.bits_stored
+    ds.HighBit = spec.bits_stored - 1
+    ds.PixelRepresentation = int(spec.signed)
+    if spec.signed:
+        ds.RescaleSlope, ds.RescaleIntercept = "1", "-1024"
+    if spec.with_window:
+        ds.WindowCenter = str(2 ** (spec.bits_stored - 2))
+        ds.WindowWidth = str(2 ** (spec.bits_stored - 1))
+
+    pixels = make_pixels(spec, seed)
+    if spec.transfer_syntax.is_compressed:
+        ds.compress(spec.transfer_syntax, pixels)
+    else:
+        ds.PixelData = pixels.tobytes()
+
+    buffer = BytesIO()
+    ds.save_as(buffer, enforce_file_format=True)
+    return buffer.getvalue()
@@ -0,0 +1,56 @@
+"""
+Writes tests/tiny_detector.onnx, a stand-in for a YOLOv8 detection export:
+input "images" (1, 3, 64, 64), output (1, 4 + 2 classes, 4 candidates) with
+cx, cy, w, h in input pixels. The output is constant (the input only flows
+through a zero-weighted sum), so tests know exactly what to expect:
+
+    A  caries 0.9  centre (20, 30), 10x10   kept
+    B  caries 0.8  overlaps A               suppressed by NMS
+    C  caries 0.1                           below the confidence threshold
+    D  crown  0.7  overlaps A               kept (NMS is per class)
+
+Run from backend/: python tests/make_tiny_detector.py (needs the onnx package).
+"""
+
+from pathlib import Path
+
+import numpy as np
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+
+CANDIDATES = np.array(
+    [
+        # cx, cy, w, h, caries, crown
+        [20, 30, 10, 10, 0.9, 0.0],
+        [21, 30, 10, 10, 0.8, 0.0],
+        [40, 30, 8, 8, 0.1, 0.05],
+        [22, 31, 10, 10, 0.0, 0.7],
+    ],
+    dtype=np.float32,
+)
+
+
+def build() -> onnx.ModelProto:
+    predictions = numpy_helper.from_array(CANDIDATES.T[None], "predictions")
+    zero = numpy_helper.from_array(np.array(0, dtype=np.float32), "zero")
+    nodes = [
+        helper.make_node("ReduceSum", ["images"], ["total"], keepdims=0),
+        helper.make_node("Mul", ["total", "zero"], ["nothing"]),
+        helper.make_node("Add", ["predictions", "nothing"], ["output0"]),
+    ]
+    graph = helper.make_graph(
+        nodes,
+        "tiny_detector",
+        [helper.make_tensor_value_info("images", TensorProto.FLOAT, [1, 3, 64, 64])],
+        [helper.make_tensor_value_info("output0", TensorProto.FLOAT, [1, 6, 4])],
+        initializer=[predictions, zero],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    helper.set_model_props(model, {"names": "{0: 'caries', 1: 'crown'}", "imgsz": "[64, 64]"})
+    onnx.checker.check_model(model)
+    return model
+
+
+if __name__ == "__main__":
+    onnx.save(build(), Path(__file__).with_name("tiny_detector.onnx"))
@@ -0,0 +1,316 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import create_app
+from app.services import ai_service, detectors, roboflow_client
+
+PREDICTIONS = {
+    "predictions": [
+        {"x": 100, "y": 80, "width": 40, "height": 20, "confidence": 0.9, "class": "caries"},
+        {"x": 300, "y": 200, "width": 10, "height": 10, "confidence": 0.1, "class": "noise"},
+    ]
+}
+
+
+class _StandInRoboflow(BaseHTTPRequestHandler):
+    """Answers like Roboflow's hosted detect API; records every request."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.seen.append((self.path, self.client_address, body))
+        time.sleep(self.server.delay)
+        payload = json.dumps(PREDICTIONS).encode()
+        status = self.server.statuses.pop(0) if self.server.statuses else self.server.status
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def roboflow_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInRoboflow)
+    server.seen, server.delay, server.status, server.statuses = [], 0.0, 200, []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(settings, "ROBOFLOW_API_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(settings, "ROBOFLOW_API_KEY", "test-key")
+    monkeypatch.setattr(ai_service, "ROBOFLOW_API_KEY", "test-key")
+    asyncio.run(roboflow_client.close_roboflow_client())
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(roboflow_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_DIR", tmp_path / "spool")
+    monkeypatch.setattr(ai_service, "_result_cache", None)
+    monkeypatch.setattr(detectors, "_registry", {})  # loaded again at startup
+    # Entered with `with` so startup builds the shared Roboflow client.
+    with TestClient(create_app()) as client:
+        yield client
+
+
+def upload_sample(client):
+    path = os.path.join(os.path.dirname(__file__), "sample.dcm")
+    with open(path, "rb") as f:
+        files = {"file": ("sample.dcm", BytesIO(f.read()), "application/dicom")}
+    resp = client.post(f"{settings.API_STR}/upload", files=files)
+    assert resp.status_code == 200
+    return resp.json()
+
+
+def test_detection_uses_one_pooled_connection(client, roboflow_server):
+    dicom_id = upload_sample(client)
+
+    for _ in range(2):
+        ai_service.invalidate_ai_results()  # reach the server both times
+        resp = client.post(f"{settings.API_STR}/dicom/{dicom_id}/ai/detection")
+        assert resp.status_code == 200
+        boxes = resp.json()["detection"]["boxes"]
+        assert [box["label"] for box in boxes] == ["caries"]  # below threshold dropped
+        assert boxes[0]["x1"] == 80 and boxes[0]["y2"] == 90
+
+    paths = {path for path, _, _ in roboflow_server.seen}
+    assert paths == {f"/{ai_service.ROBOFLOW_MODEL_ID}?api_key=test-key"}
+    # Both inferences went over the same keep-alive connection.
+    assert len({address for _, address, _ in roboflow_server.seen}) == 1
+
+
+def test_detection_posts_the_jpeg_made_at_ingest(client, roboflow_server, monkeypatch):
+    import base64
+
+    from PIL import Image
+
+    from app.services import dicom_service
+
+    dicom_id = upload_sample(client)
+
+    def no_encode(*args):
+        raise AssertionError("model input should have been made at ingest")
+
+    monkeypatch.setattr(dicom_service, "_encode_model_input", no_encode)
+    resp = client.post(f"{settings.API_STR}/dicom/{dicom_id}/ai/detection")
+    assert resp.status_code == 200
+
+    _, _, body = roboflow_server.seen[-1]
+    image = Image.open(BytesIO(base64.b64decode(body)))
+    assert image.format == "JPEG"
+    assert image.size == (1562, 1168)
+
+
+def test_detection_results_are_cached(client, roboflow_server):
+    dicom_id = upload_sample(client)
+    url = f"{settings.API_STR}/dicom/{dicom_id}/ai/detection"
+
+    first = client.post(url).json()
+    assert client.post(url).json() == first
+    assert len(roboflow_server.seen) == 1
+    stats = client.get(f"{settings.API_STR}/metrics").json()["ai_result_cache"]
+    assert stats["memory_hits"] == 1 and stats["misses"] == 1
+
+
+def test_disk_results_survive_restarts_until_the_model_changes(
+    client, roboflow_server, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(settings, "AI_RESULT_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(ai_service, "_result_cache", None)  # rebuilt with the disk tier
+    dicom_id = upload_sample(client)
+    url = f"{settings.API_STR}/dicom/{dicom_id}/ai/detection"
+
+    first = client.post(url).json()
+    monkeypatch.setattr(ai_service, "_result_cache", None)  # as after a restart
+    assert client.post(url).json() == first
+    assert len(roboflow_server.seen) == 1
+    assert ai_service.start_ai_result_cache().stats()["disk_hits"] == 1
+
+    monkeypatch.setattr(ai_service, "ROBOFLOW_MODEL_ID", "adr/7")
+    monkeypatch.setattr(ai_service, "_result_cache", None)
+    assert ai_service.start_ai_result_cache().stats()["invalidations"] == 1
+    assert not (tmp_path / "ai-results" / "detection-adr-6").exists()
+    assert (tmp_path / "spool").is_dir()  # the rest of the directory is left alone
+    client.post(url)
+    assert len(roboflow_server.seen) == 2
+    assert roboflow_server.seen[-1][0].startswith("/adr/7?")
+
+
+def test_disk_tier_only_deletes_its_own_results(tmp_path):
+    from app.models.ai_results import AiAnalysisResult
+    from app.services.ai_result_cache import AiResultCache, result_key
+
+    cache = AiResultCache(1024, tmp_path)
+    key = result_key("0" * 64, "detection", "adr/6", {})
+    cache.put(key, AiAnalysisResult(model_type="detection"))
+    (tmp_path / "reports").mkdir()
+    (tmp_path / "reports" / "keep.json").write_text("{}")
+    stray = tmp_path / "ai-results" / key.namespace / "notes.txt"
+    stray.write_text("not a result")
+
+    assert cache.retain_namespaces(()) == 1
+    assert (tmp_path / "reports" / "keep.json").exists()
+    assert stray.exists() and not list(stray.parent.glob("*.json"))
+
+
+def _analyze_concurrently(copies):
+    """Uploads the sample and runs `copies` identical analyses at once, in one loop."""
+    from fastapi import UploadFile
+
+    from app.services import dicom_service
+
+    async def main():
+        path = os.path.join(os.path.dirname(__file__), "sample.dcm")
+        with open(path, "rb") as f:
+            upload = UploadFile(file=BytesIO(f.read()), filename="sample.dcm")
+        dicom_id = await dicom_service.save_and_parse(upload)
+        try:
+            return await asyncio.gather(
+                *(ai_service.process_image_with_ai(dicom_id, "detection") for _ in range(copies)),
+                return_exceptions=True,
+            )
+        finally:
+            await roboflow_client.close_roboflow_client()
+
+    return asyncio.run(main())
+
+
+def test_concurrent_identical_requests_share_one_inference(roboflow_server, monkeypatch):
+    monkeypatch.setattr(ai_service, "_result_cache", None)
+    roboflow_server.delay = 0.2
+    coalesced_before = ai_service.ai_stats()["ai_requests"]["coalesced"]
+
+    results = _analyze_concurrently(4)
+    assert len(roboflow_server.seen) == 1
+    assert all(result is results[0] for result in results)
+    assert results[0].detection.boxes[0].label == "caries"
+    assert ai_service.ai_stats()["ai_requests"]["coalesced"] == coalesced_before + 3
+
+
+def test_coalesced_requests_all_get_the_error(roboflow_server, monkeypatch):
+    monkeypatch.setattr(ai_service, "_result_cache", None)
+    roboflow_server.delay, roboflow_server.status = 0.2, 503
+
+    results = _analyze_concurrently(3)
+    assert len(roboflow_server.seen) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert "503" in str(results[0])
+    assert ai_service.ai_stats()["ai_requests"]["in_flight"] == 0
+
+
+def test_detection_timeout_is_an_error(client, roboflow_server, monkeypatch):
+    dicom_id = upload_sample(client)
+    roboflow_server.delay = 0.5
+    monkeypatch.setattr(
+        roboflow_client.get_roboflow_client()._http, "timeout", httpx.Timeout(0.1)
+    )
+
+    resp = client.post(f"{settings.API_STR}/dicom/{dicom_id}/ai/detection")
+    assert resp.status_code == 500
+    assert "Roboflow" in resp.json()["detail"]
+
+
+def test_inferences_are_limited_to_max_concurrency():
+    in_flight, peak = 0, 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, json={"predictions": []})
+
+    async def main():
+        client = roboflow_client.RoboflowClient(
+            "http://roboflow.test",
+            "key",
+            httpx.Timeout(1.0),
+            max_connections=4,
+            max_concurrency=2,
+            transport=httpx.MockTransport(handler),
+        )
+        results = await asyncio.gather(*(client.infer("aGk=", "adr/6") for _ in range(6)))
+        await client.aclose()
+        return results, client.stats()
+
+    results, stats = asyncio.run(main())
+    assert results == [{"predictions": []}] * 6
+    assert peak == 2
+    assert (stats["calls"], stats["errors"], stats["throttled"]) == (6, 0, 0)
+
+
+def test_rate_limited_requests_back_off_and_retry(client, roboflow_server):
+    dicom_id = upload_sample(client)
+    roboflow_server.statuses = [429, 429]
+
+    resp = client.post(f"{settings.API_STR}/dicom/{dicom_id}/ai/detection")
+    assert resp.status_code == 200
+    assert len(roboflow_server.seen) == 3
+    assert client.get(f"{settings.API_STR}/metrics").json()["roboflow"]["throttled"] == 2
+
+
+def test_batch_analysis_streams_ndjson(client, roboflow_server):
+    dicom_id = upload_sample(client)
+
+    resp = client.post(
+        f"{settings.API_STR}/dicom/ai/detection/batch",
+        json={"dicom_ids": [dicom_id, "missing", dicom_id]},
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert lines[-1] == {"done": True, "succeeded": 2, "failed": 1}
+
+    by_status = sorted(lines[:-1], key=lambda line: line["status"])
+    assert [line["status"] for line in by_status] == [200, 200, 400]
+    assert by_status[0]["result"]["detection"]["boxes"][0]["label"] == "caries"
+    assert by_status[2]["dicom_id"] == "missing"
+    # The repeated image was analyzed once (coalesced or served from the cache).
+    assert len(roboflow_server.seen) == 1
+
+
+def test_batch_analysis_rejects_bad_requests(client):
+    url = f"{settings.API_STR}/dicom/ai/detection/batch"
+    assert client.post(url, json={"dicom_ids": []}).status_code == 422
+    bad_type = client.post(
+        f"{settings.API_STR}/dicom/ai/segmentation/batch", json={"dicom_ids": ["x"]}
+    )
+    assert bad_type.status_code == 400
+    assert bad_type.json()["detail"] == "Invalid model_type. Valid types are: detection"
+
+
+def test_registered_detectors_define_the_valid_model_types(client):
+    from app.models.ai_results import DetectionResult
+
+    class FixedDetector(detectors.Detector):
+        model_type = "caries"
+        model_id = "fixed/1"
+
+        async def detect(self, dicom_id, model_input):
+            return DetectionResult(boxes=[])
+
+    detectors.register_detector(FixedDetector())
+    dicom_id = upload_sample(client)
+
+    resp = client.post(f"{settings.API_STR}/dicom/{dicom_id}/ai/caries")
+    assert resp.status_code == 200
+    assert resp.json()["model_type"] == "caries"
+    bad = client.post(f"{settings.API_STR}/dicom/{dicom_id}/ai/segmentation")
+    assert bad.json()["detail"] == "Invalid model_type. Valid types are: caries, detection"
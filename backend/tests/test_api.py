@@ -60,3 +60,13 @@ def test_fetch_not_found(client):
     resp = client.get(f"{settings.API_STR}/dicom/nonexistent-id")
     assert resp.status_code == 404
     assert "DICOM not found" in resp.text
+
+
+def test_metrics_reports_store_stats(client):
+    resp = client.get(f"{settings.API_STR}/metrics")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert {"memory_hits", "disk_hits", "misses", "evictions"} <= set(
+        data["image_store"]
+    )
+    assert "raw_store" in data
@@ -0,0 +1,525 @@
+import base64
+import os
+from io import BytesIO
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import create_app
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = create_app()
+    return TestClient(app)
+
+
+@pytest.fixture(scope="module")
+def dicom_id(client):
+    path = os.path.join(os.path.dirname(__file__), "sample.dcm")
+    with open(path, "rb") as f:
+        files = {"file": ("sample.dcm", BytesIO(f.read()), "application/dicom")}
+    resp = client.post(f"{settings.API_STR}/upload", files=files)
+    assert resp.status_code == 200
+    return resp.json()
+
+
+def test_fetch_metadata_only(client, dicom_id):
+    resp = client.get(
+        f"{settings.API_STR}/dicom/{dicom_id}", params={"include_pixels": False}
+    )
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["png_data"] is None
+    assert data["meta"]["rows"] == 1168
+
+
+def test_binary_image_matches_json_payload(client, dicom_id):
+    resp = client.get(f"{settings.API_STR}/dicom/{dicom_id}/image")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "image/png"
+    assert "immutable" in resp.headers["cache-control"]
+    assert resp.content.startswith(b"\x89PNG")
+
+    payload = client.get(f"{settings.API_STR}/dicom/{dicom_id}").json()
+    assert base64.b64decode(payload["png_data"]) == resp.content
+
+
+def test_binary_image_if_none_match(client, dicom_id):
+    etag = client.get(f"{settings.API_STR}/dicom/{dicom_id}/image").headers["etag"]
+
+    resp = client.get(
+        f"{settings.API_STR}/dicom/{dicom_id}/image",
+        headers={"If-None-Match": f'"other", {etag}'},
+    )
+    assert resp.status_code == 304
+    assert resp.content == b""
+    assert resp.headers["etag"] == etag
+
+
+def test_binary_image_not_found(client):
+    resp = client.get(f"{settings.API_STR}/dicom/nonexistent-id/image")
+    assert resp.status_code == 404
+
+
+def _open_image(content):
+    from PIL import Image
+
+    return Image.open(BytesIO(content))
+
+
+def test_render_with_window_and_scale(client, dicom_id):
+    resp = client.get(
+        f"{settings.API_STR}/dicom/{dicom_id}/render",
+        params={"wc": 2048, "ww": 4096, "scale": 0.5},
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "image/png"
+    image = _open_image(resp.content)
+    assert image.size == (781, 584)
+
+
+def test_render_invert_flips_pixels(client, dicom_id):
+    import numpy as np
+
+    params = {"wc": 1000, "ww": 800, "scale": 0.25}
+    plain = client.get(f"{settings.API_STR}/dicom/{dicom_id}/render", params=params)
+    inverted = client.get(
+        f"{settings.API_STR}/dicom/{dicom_id}/render",
+        params={**params, "invert": True},
+    )
+    plain_arr = np.asarray(_open_image(plain.content), dtype=np.int16)
+    inverted_arr = np.asarray(_open_image(inverted.content), dtype=np.int16)
+    assert np.array_equal(plain_arr, 255 - inverted_arr)
+
+
+def test_render_is_cached_and_coalesced(client, dicom_id, monkeypatch):
+    import asyncio
+
+    from app.services import dicom_service
+
+    render_calls = []
+    real_render = dicom_service._render_pixels
+
+    def counting_render(*args):
+        render_calls.append(args)
+        return real_render(*args)
+
+    monkeypatch.setattr(dicom_service, "_render_pixels", counting_render)
+
+    async def render_concurrently():
+        return await asyncio.gather(
+            *(
+                dicom_service.render_windowed_image(dicom_id, 500.0, 300.0, False, 0.1)
+                for _ in range(4)
+            )
+        )
+
+    results = asyncio.run(render_concurrently())
+    assert len(set(results)) == 1
+    assert len(render_calls) == 1
+
+    asyncio.run(dicom_service.render_windowed_image(dicom_id, 500.0, 300.0, False, 0.1))
+    assert len(render_calls) == 1
+
+
+def test_cached_renders_end_with_the_stored_image(client, dicom_id):
+    from app.services import dicom_service
+
+    url = f"{settings.API_STR}/dicom/{dicom_id}/render"
+    params = {"wc": 600, "ww": 400, "scale": 0.1}
+    assert client.get(url, params=params).status_code == 200
+
+    meta_key = dicom_service._meta_key(dicom_id)
+    meta = bytes(dicom_service._image_store.get(meta_key))
+    dicom_service._image_store.delete(meta_key)  # as when its TTL runs out
+    try:
+        assert client.get(url, params=params).status_code == 404
+        assert client.get(f"{url.rsplit('/', 1)[0]}/tiles/0/0/0").status_code == 404
+    finally:
+        dicom_service._image_store.put(meta_key, meta)
+
+
+def test_render_rejects_bad_params(client, dicom_id):
+    url = f"{settings.API_STR}/dicom/{dicom_id}/render"
+    assert client.get(url, params={"ww": 0}).status_code == 422
+    assert client.get(url, params={"scale": 2}).status_code == 422
+    assert client.get(f"{settings.API_STR}/dicom/missing/render").status_code == 404
+
+
+def test_pyramid_info(client, dicom_id):
+    resp = client.get(f"{settings.API_STR}/dicom/{dicom_id}/tiles")
+    assert resp.status_code == 200
+    info = resp.json()
+    assert (info["width"], info["height"], info["tile_size"]) == (1562, 1168, 256)
+    assert [(l["width"], l["columns"], l["rows"]) for l in info["levels"]] == [
+        (1562, 7, 5),
+        (781, 4, 3),
+        (391, 2, 2),
+        (196, 1, 1),
+    ]
+
+
+def test_tiles_are_cut_from_the_level_image(client, dicom_id):
+    top = client.get(f"{settings.API_STR}/dicom/{dicom_id}/tiles/3/0/0")
+    assert top.status_code == 200
+    assert top.headers["content-type"] == "image/png"
+    assert _open_image(top.content).size == (196, 146)
+
+    full = client.get(f"{settings.API_STR}/dicom/{dicom_id}/tiles/0/0/0")
+    assert _open_image(full.content).size == (256, 256)
+    edge = client.get(f"{settings.API_STR}/dicom/{dicom_id}/tiles/0/6/4")
+    assert _open_image(edge.content).size == (1562 - 6 * 256, 1168 - 4 * 256)
+
+
+def test_tile_out_of_range(client, dicom_id):
+    assert client.get(f"{settings.API_STR}/dicom/{dicom_id}/tiles/4/0/0").status_code == 404
+    assert client.get(f"{settings.API_STR}/dicom/{dicom_id}/tiles/0/7/0").status_code == 404
+    assert client.get(f"{settings.API_STR}/dicom/missing/tiles/0/0/0").status_code == 404
+
+
+def test_preview_is_small_jpeg(client, dicom_id):
+    resp = client.get(f"{settings.API_STR}/dicom/{dicom_id}/preview")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "image/jpeg"
+    preview = _open_image(resp.content)
+    assert preview.format == "JPEG"
+    assert max(preview.size) == 512
+    assert preview.size == (512, 383)
+
+    assert client.get(f"{settings.API_STR}/dicom/missing/preview").status_code == 404
+
+
+def _multi_frame_dicom(frames=5, rows=48, columns=64):
+    import numpy as np
+    import pydicom
+    from pydicom.dataset import FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, SecondaryCaptureImageStorage, generate_uid
+
+    file_meta = FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = SecondaryCaptureImageStorage
+    file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds = pydicom.Dataset()
+    ds.file_meta = file_meta
+    ds.SOPClassUID = SecondaryCaptureImageStorage
+    ds.SOPInstanceUID = file_meta.MediaStorageSOPInstanceUID
+    ds.PatientName = "Multi^Frame"
+    ds.Modality = "OT"
+    ds.SliceThickness = "2.5"
+    ds.Rows, ds.Columns = rows, columns
+    ds.NumberOfFrames = frames
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated, ds.BitsStored, ds.HighBit = 16, 12, 11
+    ds.PixelRepresentation = 0
+    pixels = np.stack(
+        [np.full((rows, columns), i * 1000, dtype=np.uint16) for i in range(frames)]
+    )
+    for i in range(frames):
+        pixels[i, 0, i] = 4095  # a bright pixel that moves from frame to frame
+    ds.PixelData = pixels.tobytes()
+    buf = BytesIO()
+    ds.save_as(buf, enforce_file_format=True)
+    return buf.getvalue()
+
+
+def test_multi_frame_frames_are_served_individually(client):
+    files = {"file": ("cine.dcm", BytesIO(_multi_frame_dicom()), "application/dicom")}
+    multi_id = client.post(f"{settings.API_STR}/upload", files=files).json()
+
+    meta = client.get(
+        f"{settings.API_STR}/dicom/{multi_id}", params={"include_pixels": False}
+    ).json()["meta"]
+    assert meta["number_of_frames"] == 5
+    assert meta["slice_thickness"] == 2.5
+
+    first = client.get(f"{settings.API_STR}/dicom/{multi_id}/frames/0")
+    last = client.get(f"{settings.API_STR}/dicom/{multi_id}/frames/4")
+    assert first.status_code == last.status_code == 200
+    assert first.headers["etag"] == f'"{multi_id}.frame.0"'
+    assert _open_image(last.content).size == (64, 48)
+    assert first.content != last.content
+
+    assert client.get(f"{settings.API_STR}/dicom/{multi_id}/frames/5").status_code == 404
+    assert client.get(f"{settings.API_STR}/dicom/missing/frames/0").status_code == 404
+
+
+def test_single_frame_has_one_frame(client, dicom_id):
+    resp = client.get(f"{settings.API_STR}/dicom/{dicom_id}/frames/0")
+    assert resp.status_code == 200
+    assert _open_image(resp.content).size == (1562, 1168)
+    assert client.get(f"{settings.API_STR}/dicom/{dicom_id}/frames/1").status_code == 404
+
+
+def test_image_format_negotiation(client, dicom_id):
+    url = f"{settings.API_STR}/dicom/{dicom_id}/image"
+
+    webp = client.get(url, headers={"Accept": "image/avif,image/webp,image/*;q=0.8"})
+    assert webp.headers["content-type"] == "image/webp"
+    assert webp.headers["etag"] == f'"{dicom_id}.webp"'
+    assert webp.headers["vary"] == "Accept"
+    assert _open_image(webp.content).size == (1562, 1168)
+
+    # Anything without an explicit supported type gets the default (PNG).
+    assert client.get(url, headers={"Accept": "*/*"}).headers["content-type"] == "image/png"
+
+    # Browsers list WebP but accept image/* just as much: the default still wins.
+    chrome_img = "image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8"
+    browser = client.get(url, headers={"Accept": chrome_img})
+    assert browser.headers["content-type"] == "image/png"
+    assert browser.headers["vary"] == "Accept"
+
+    # The query parameter wins over Accept.
+    jpeg = client.get(url, params={"format": "jpeg"}, headers={"Accept": "image/webp"})
+    assert jpeg.headers["content-type"] == "image/jpeg"
+    assert "vary" not in jpeg.headers
+    assert _open_image(jpeg.content).format == "JPEG"
+
+    assert client.get(url, params={"format": "gif"}).status_code == 422
+
+
+def test_render_formats_are_cached_separately(client, dicom_id):
+    from app.services import dicom_service
+
+    url = f"{settings.API_STR}/dicom/{dicom_id}/render"
+    params = {"wc": 700, "ww": 900, "scale": 0.2}
+    png = client.get(url, params=params)
+    jpeg = client.get(url, params={**params, "format": "jpeg"})
+
+    assert png.headers["content-type"] == "image/png"
+    assert jpeg.headers["content-type"] == "image/jpeg"
+    assert png.headers["etag"] != jpeg.headers["etag"]
+    assert (dicom_id, 700.0, 900.0, False, 0.2, "jpeg") in dicom_service._window_render_cache
+
+
+def test_download_original_supports_ranges(client, dicom_id):
+    url = f"{settings.API_STR}/dicom/{dicom_id}/download_original"
+    full = client.get(url)
+    assert full.status_code == 200
+    assert full.headers["accept-ranges"] == "bytes"
+    assert int(full.headers["content-length"]) == len(full.content)
+    etag = full.headers["etag"]
+
+    resp = client.get(url, headers={"Range": "bytes=100-199"})
+    assert resp.status_code == 206
+    assert resp.content == full.content[100:200]
+    assert resp.headers["content-range"] == f"bytes 100-199/{len(full.content)}"
+
+    resume = client.get(url, headers={"Range": "bytes=1000-", "If-Range": etag})
+    assert resume.status_code == 206
+    assert resume.content == full.content[1000:]
+
+    stale = client.get(url, headers={"Range": "bytes=1000-", "If-Range": '"other"'})
+    assert stale.status_code == 200
+    assert stale.content == full.content
+
+    past_end = client.get(url, headers={"Range": f"bytes={len(full.content)}-"})
+    assert past_end.status_code == 416
+    assert past_end.headers["content-range"] == f"bytes */{len(full.content)}"
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_export_modified_rewrites_header_and_keeps_pixel_data(client, dicom_id):
+    import pydicom
+
+    original = client.get(f"{settings.API_STR}/dicom/{dicom_id}/download_original").content
+    resp = client.post(
+        f"{settings.API_STR}/dicom/{dicom_id}/export_modified",
+        json={"updates": {"patient_id": "EXPORTED01", "unknown_field": "x"}},
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/dicom"
+    assert int(resp.headers["content-length"]) == len(resp.content)
+
+    before = pydicom.dcmread(BytesIO(original))
+    after = pydicom.dcmread(BytesIO(resp.content))
+    assert after.PatientID == "EXPORTED01"
+    assert after.SOPInstanceUID != before.SOPInstanceUID
+    assert after.PixelData == before.PixelData
+    # The pixel data element is copied verbatim from the original file.
+    pixel_element = original.index(b"\xe0\x7f\x10\x00")
+    assert resp.content.endswith(original[pixel_element:])
+
+
+def test_export_modified_unknown_id(client):
+    resp = client.post(
+        f"{settings.API_STR}/dicom/missing/export_modified", json={"updates": {}}
+    )
+    assert resp.status_code == 404
+
+
+def test_exports_hold_the_stored_file_from_when_they_are_built(client, dicom_id):
+    import asyncio
+
+    from app.services import dicom_service
+
+    path = dicom_service._raw_dicom_store.path(dicom_id)
+    assert path is not None
+    original = path.read_bytes()
+
+    async def build():
+        return (
+            await dicom_service.get_original_export(dicom_id),
+            await dicom_service.export_modified_dicom(dicom_id, {"patient_id": "HELD"}),
+        )
+
+    exports = asyncio.run(build())
+    path.unlink()  # evicted or expired after the export was built
+    try:
+        for export in exports:
+            data = b"".join(export.iter_bytes(4096))
+            assert len(data) == export.size
+            assert data.endswith(original[exports[1].pixel_offset :])
+    finally:
+        path.write_bytes(original)
+
+
+def test_export_reuses_the_cached_header(client, dicom_id, monkeypatch):
+    import asyncio
+
+    import pydicom
+
+    from app.services import dicom_service
+
+    header = asyncio.run(dicom_service.get_dicom_header(dicom_id))
+    original_patient_id = header.PatientID
+    header.PatientID = "LEAKED"  # edits to a copy must not reach the cache
+
+    def no_reread(*args, **kwargs):
+        raise AssertionError("header should come from the cache")
+
+    monkeypatch.setattr(dicom_service, "_read_header", no_reread)
+    hits_before = client.get(f"{settings.API_STR}/metrics").json()["header_cache"]["hits"]
+    for patient_id in ("FIRST", "SECOND"):
+        resp = client.post(
+            f"{settings.API_STR}/dicom/{dicom_id}/export_modified",
+            json={"updates": {"patient_id": patient_id}},
+        )
+        assert resp.status_code == 200
+        assert pydicom.dcmread(BytesIO(resp.content)).PatientID == patient_id
+
+    stats = client.get(f"{settings.API_STR}/metrics").json()["header_cache"]
+    assert stats["hits"] == hits_before + 2
+    cached = asyncio.run(dicom_service.get_dicom_header(dicom_id))
+    assert cached.PatientID == original_patient_id
+    assert "PixelData" not in cached
+
+
+def test_cached_headers_do_not_pin_the_stored_file(client, dicom_id):
+    import asyncio
+    import warnings
+
+    from app.services import dicom_service
+
+    assert dicom_service._header_cache.peek(dicom_id).dataset.buffer is None
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")  # pydicom warns when deepcopy meets an mmap
+        header = asyncio.run(dicom_service.get_dicom_header(dicom_id))
+    assert header.buffer is None
+
+
+def test_header_cache_entries_are_sized_by_their_elements():
+    import pydicom
+
+    from app.services import dicom_service
+
+    ds = pydicom.Dataset()
+    ds.PatientID = "P1"
+    small = dicom_service._header_size(dicom_service._DicomHeader(ds, 0))
+    ds.ImageComments = "x" * 100_000
+    large = dicom_service._header_size(dicom_service._DicomHeader(ds, 0))
+    assert 100_000 <= large - small < 101_000
+
+
+def test_bulk_export_streams_a_zip(client, dicom_id):
+    import json
+    import zipfile
+
+    import pydicom
+
+    original = client.get(f"{settings.API_STR}/dicom/{dicom_id}/download_original").content
+    resp = client.post(
+        f"{settings.API_STR}/dicom/export_bulk",
+        json={
+            "items": [
+                {"dicom_id": dicom_id},
+                {"dicom_id": "missing"},
+                {"dicom_id": dicom_id, "updates": {"patient_id": "BULK01"}},
+            ]
+        },
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/zip"
+
+    archive = zipfile.ZipFile(BytesIO(resp.content))
+    assert archive.testzip() is None
+    manifest = json.loads(archive.read("manifest.json"))
+    assert [entry["file"] for entry in manifest] == [
+        f"{dicom_id}_original.dcm",
+        None,
+        f"{dicom_id}_modified.dcm",
+    ]
+    assert manifest[1]["error"]
+    assert archive.read(f"{dicom_id}_original.dcm") == original
+    modified = pydicom.dcmread(BytesIO(archive.read(f"{dicom_id}_modified.dcm")))
+    assert modified.PatientID == "BULK01"
+
+
+def test_bulk_export_records_a_file_gone_before_its_entry(client, dicom_id):
+    import json
+    import zipfile
+
+    from app.services import dicom_service
+
+    path = dicom_service._raw_dicom_store.path(dicom_id)
+    original = path.read_bytes()
+    path.unlink()
+    try:
+        resp = client.post(
+            f"{settings.API_STR}/dicom/export_bulk",
+            json={"items": [{"dicom_id": dicom_id}]},
+        )
+    finally:
+        path.write_bytes(original)
+
+    archive = zipfile.ZipFile(BytesIO(resp.content))
+    assert archive.testzip() is None
+    manifest = json.loads(archive.read("manifest.json"))
+    assert manifest[0]["file"] is None and manifest[0]["error"]
+
+
+def test_bulk_export_writes_entries_evicted_mid_stream(client, dicom_id):
+    import asyncio
+    import zipfile
+
+    from app.models.dicom_updates import BulkExportItem
+    from app.services import dicom_service
+    from app.services.bulk_export import stream_bulk_export
+
+    path = dicom_service._raw_dicom_store.path(dicom_id)
+    original = path.read_bytes()
+    items = [BulkExportItem(dicom_id=dicom_id), BulkExportItem(dicom_id=dicom_id)]
+
+    async def stream():
+        chunks = stream_bulk_export(items)
+        body = [await chunks.__anext__()]  # both entries are prepared by now
+        path.unlink()
+        body += [chunk async for chunk in chunks]
+        return b"".join(body)
+
+    try:
+        body = asyncio.run(stream())
+    finally:
+        path.write_bytes(original)
+
+    archive = zipfile.ZipFile(BytesIO(body))
+    assert archive.testzip() is None
+    assert archive.read(f"{dicom_id}_original_2.dcm") == original
+
+
+def test_bulk_export_rejects_empty_request(client):
+    resp = client.post(f"{settings.API_STR}/dicom/export_bulk", json={"items": []})
+    assert resp.status_code == 422
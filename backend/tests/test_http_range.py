@@ -0,0 +1,41 @@
+import pytest
+
+from app.util.http_range import (
+    ByteRange,
+    RangeNotSatisfiableError,
+    if_range_matches,
+    parse_range,
+)
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-99", ByteRange(0, 99)),
+        ("bytes=900-", ByteRange(900, 999)),
+        ("bytes=-100", ByteRange(900, 999)),
+        ("bytes=-5000", ByteRange(0, 999)),
+        ("bytes=500-5000", ByteRange(500, 999)),
+        (None, None),
+        ("items=0-1", None),
+        ("bytes=0-1,5-6", None),  # several ranges: the whole file is sent
+        ("bytes=9-1", None),
+        ("bytes=a-b", None),
+        ("bytes=-", None),
+    ],
+)
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=-0"])
+def test_parse_range_not_satisfiable(header):
+    with pytest.raises(RangeNotSatisfiableError):
+        parse_range(header, 1000)
+
+
+def test_if_range_needs_a_strong_etag_match():
+    assert if_range_matches(None, '"abc"')
+    assert if_range_matches('"abc"', '"abc"')
+    assert not if_range_matches('W/"abc"', '"abc"')
+    assert not if_range_matches("Wed, 21 Oct 2015 07:28:00 GMT", '"abc"')
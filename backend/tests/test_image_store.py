@@ -0,0 +1,106 @@
+import os
+import time
+
+import pytest
+
+from app.services.image_store import TieredImageStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TieredImageStore("test", memory_budget_bytes=100, spill_dir=tmp_path)
+    yield store
+    store.clear()
+
+
+def test_hot_hit(store):
+    store.put("a", b"x" * 10)
+    assert bytes(store.get("a")) == b"x" * 10
+    stats = store.stats()
+    assert stats["memory_hits"] == 1
+    assert stats["memory_bytes"] == 10
+    assert stats["disk_entries"] == 0
+
+
+def test_lru_overflow_spills_to_disk(store):
+    store.put("a", b"a" * 60)
+    store.put("b", b"b" * 60)  # pushes "a" out of the 100 byte budget
+
+    stats = store.stats()
+    assert stats["evictions"] == 1
+    assert stats["spills"] == 1
+    assert store.path("a") is not None
+
+    assert bytes(store.get("a")) == b"a" * 60
+    assert store.stats()["disk_hits"] == 1
+
+
+def test_oversized_entry_goes_straight_to_disk(store):
+    store.put("big", b"z" * 500)
+    assert store.stats()["memory_entries"] == 0
+    assert bytes(store.get("big")) == b"z" * 500
+
+
+def test_put_file_moves_file_into_disk_tier(store, tmp_path):
+    src = tmp_path / "upload.dcm"
+    src.write_bytes(b"DICM" * 100)
+
+    store.put_file("raw", src)
+    assert not src.exists()
+    assert store.path("raw").read_bytes() == b"DICM" * 100
+    assert bytes(store.get("raw")) == b"DICM" * 100
+
+
+def test_ttl_expiry(store):
+    store.put("short", b"x", ttl=0.01)
+    store.put("spilled", b"y" * 500, ttl=0.01)
+    time.sleep(0.02)
+
+    assert "short" not in store
+    assert store.get("short") is None
+    assert store.purge_expired() == 1  # "spilled" is swept from the disk tier
+    assert store.get("spilled") is None
+    assert store.stats()["expirations"] == 2
+
+
+def test_miss_is_counted(store):
+    assert store.get("missing") is None
+    assert store.stats()["misses"] == 1
+
+
+def test_disk_tier_evicts_least_recently_used_over_budget(tmp_path):
+    store = TieredImageStore("test", 0, tmp_path, disk_budget_bytes=250)
+    store.put("a", b"a" * 100)
+    store.put("b", b"b" * 100)
+    store.get("a")  # "b" is now the least recently used
+    store.put("c", b"c" * 100)
+
+    assert "b" not in store and "a" in store and "c" in store
+    stats = store.stats()
+    assert stats["disk_bytes"] == 200 and stats["disk_evictions"] == 1
+    assert len(list(store._dir.iterdir())) == 2
+    store.clear()
+
+
+def test_spill_dirs_of_dead_processes_are_removed(tmp_path):
+    import subprocess
+    import sys
+
+    dead = subprocess.run(
+        [sys.executable, "-c", "import os; print(os.getpid())"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    stale = tmp_path / f"test-{dead.stdout.strip()}"
+    stale.mkdir()
+    (stale / "leftover").write_bytes(b"patient data")
+    alive = tmp_path / f"test-{os.getppid()}"
+    alive.mkdir()
+    other = tmp_path / "unrelated-1"
+    other.mkdir()
+
+    store = TieredImageStore("test", 100, tmp_path)
+    assert not stale.exists()
+    assert alive.exists() and other.exists()
+    store.clear()
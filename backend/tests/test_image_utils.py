@@ -0,0 +1,82 @@
+import numpy as np
+import pydicom
+import pytest
+from pydicom.dataset import Dataset
+
+from app.util.image_utils import _to_uint8
+
+
+def _dataset(**elements):
+    ds = Dataset()
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    for keyword, value in elements.items():
+        setattr(ds, keyword, value)
+    return ds
+
+
+def _reference_window(values, center, width):
+    lower = center - width / 2.0
+    return np.clip((values - lower) / width * 255.0, 0, 255).astype(np.uint8)
+
+
+def test_window_is_applied_to_rescaled_values():
+    arr = np.array([[0, 1000], [1024, 1064]], dtype=np.uint16)
+    ds = _dataset(RescaleSlope=1, RescaleIntercept=-1024)
+
+    out = _to_uint8(arr, ds, window_center=40, window_width=400)
+    assert out.dtype == np.uint8
+    np.testing.assert_array_equal(out, _reference_window(arr - 1024.0, 40, 400))
+
+
+def test_signed_pixels_use_dataset_window():
+    rng = np.random.default_rng(0)
+    arr = rng.integers(-2000, 2000, size=(32, 48), dtype=np.int16)
+    ds = _dataset(WindowCenter="100", WindowWidth="1500")
+
+    np.testing.assert_array_equal(
+        _to_uint8(arr, ds), _reference_window(arr.astype(np.float64), 100, 1500)
+    )
+
+
+def test_auto_contrast_only_looks_at_present_values():
+    arr = np.array([[100, 200], [300, 400]], dtype=np.uint16)
+    out = _to_uint8(arr, _dataset())
+    np.testing.assert_array_equal(out, [[0, 85], [170, 255]])
+
+
+def test_monochrome1_and_invert_compose():
+    arr = np.array([[0, 4095]], dtype=np.uint16)
+    mono1 = _dataset(PhotometricInterpretation="MONOCHROME1")
+
+    np.testing.assert_array_equal(_to_uint8(arr, mono1), [[255, 0]])
+    np.testing.assert_array_equal(_to_uint8(arr, mono1, invert=True), [[0, 255]])
+    np.testing.assert_array_equal(_to_uint8(arr, _dataset(), invert=True), [[255, 0]])
+
+
+def test_voi_lut_sequence():
+    item = Dataset()
+    item.LUTDescriptor = [4, 0, 8]  # 4 entries, first mapped value 0, 8 bits
+    item.LUTData = [0, 50, 100, 255]
+    ds = _dataset(VOILUTSequence=pydicom.Sequence([item]))
+    arr = np.array([[0, 1], [2, 3]], dtype=np.uint8)
+
+    np.testing.assert_array_equal(_to_uint8(arr, ds), [[0, 50], [100, 255]])
+    # An explicit window overrides the dataset's VOI LUT.
+    np.testing.assert_array_equal(
+        _to_uint8(arr, ds, window_center=1.5, window_width=3), _reference_window(arr, 1.5, 3)
+    )
+
+
+def test_float_pixels_take_the_float_path():
+    arr = np.linspace(-1.0, 1.0, 12, dtype=np.float32).reshape(3, 4)
+    np.testing.assert_array_equal(
+        _to_uint8(arr, _dataset(), window_center=0, window_width=2),
+        _reference_window(arr, 0, 2),
+    )
+
+
+def test_flat_image_and_shape_checks():
+    assert (_to_uint8(np.full((2, 2), 7, dtype=np.uint16), _dataset()) == 128).all()
+    assert _to_uint8(np.zeros((4, 5, 1), dtype=np.uint16), _dataset()).shape == (4, 5)
+    with pytest.raises(ValueError):
+        _to_uint8(np.zeros((4, 5, 3), dtype=np.uint8), _dataset())
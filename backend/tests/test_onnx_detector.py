@@ -0,0 +1,89 @@
+import os
+from io import BytesIO
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import create_app
+from app.services import ai_service, detectors
+from app.services.onnx_detector import letterbox, nms
+
+TINY_MODEL = os.path.join(os.path.dirname(__file__), "tiny_detector.onnx")
+
+
+def test_letterbox_keeps_the_aspect_ratio_and_pads_with_grey():
+    image = np.full((100, 200), 255, dtype=np.uint8)
+    tensor, scale, (pad_x, pad_y) = letterbox(image, (64, 64))
+
+    assert tensor.shape == (1, 3, 64, 64) and tensor.dtype == np.float32
+    assert scale == pytest.approx(0.32)
+    assert (pad_x, pad_y) == (0.0, 16.0)
+    assert np.allclose(tensor[0, :, 16:48, :], 1.0)  # the image, on all channels
+    assert np.allclose(tensor[0, :, :16, :], 114 / 255)
+    assert np.allclose(tensor[0, :, 48:, :], 114 / 255)
+
+
+def test_nms_keeps_the_best_of_overlapping_boxes():
+    boxes = np.array(
+        [[0, 0, 10, 10], [1, 0, 11, 10], [20, 20, 30, 30], [0, 0, 10, 9]],
+        dtype=np.float32,
+    )
+    scores = np.array([0.6, 0.9, 0.5, 0.3], dtype=np.float32)
+
+    assert nms(boxes, scores, 0.5).tolist() == [1, 2]
+    assert nms(boxes, scores, 0.95).tolist() == [1, 0, 2, 3]
+
+
+def test_detection_runs_the_local_onnx_model(tmp_path, monkeypatch):
+    pytest.importorskip("onnxruntime")
+    monkeypatch.setattr(settings, "AI_DETECTION_BACKEND", "onnx")
+    monkeypatch.setattr(settings, "ONNX_DETECTION_MODEL_PATH", TINY_MODEL)
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_DIR", tmp_path / "spool")
+    monkeypatch.setattr(detectors, "_registry", {})
+    monkeypatch.setattr(ai_service, "_result_cache", None)
+
+    with TestClient(create_app()) as client:
+        # Loaded once, at startup.
+        detector = detectors.get_detector("detection")
+        assert detector.model_id.startswith("onnx/tiny_detector/")
+
+        path = os.path.join(os.path.dirname(__file__), "sample.dcm")
+        with open(path, "rb") as f:
+            files = {"file": ("sample.dcm", BytesIO(f.read()), "application/dicom")}
+        dicom_id = client.post(f"{settings.API_STR}/upload", files=files).json()
+
+        resp = client.post(f"{settings.API_STR}/dicom/{dicom_id}/ai/detection")
+        assert resp.status_code == 200
+        boxes = resp.json()["detection"]["boxes"]
+
+    # Overlapping "caries" boxes collapse to the best one, the low-confidence
+    # box is dropped, and the "crown" box survives (NMS is per class).
+    assert [(box["label"], round(box["confidence"], 2)) for box in boxes] == [
+        ("caries", 0.9),
+        ("crown", 0.7),
+    ]
+    # 1562x1168 letterboxed to 64x64: scale 64/1562, 8 rows of padding on top.
+    scale = 64 / 1562
+    caries = boxes[0]
+    assert caries["x1"] == pytest.approx(15 / scale, abs=1)
+    assert caries["y1"] == pytest.approx((25 - 8) / scale, abs=1)
+    assert caries["x2"] == pytest.approx(25 / scale, abs=1)
+    assert caries["y2"] == pytest.approx((35 - 8) / scale, abs=1)
+
+
+def test_a_missing_onnx_model_is_a_server_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "AI_DETECTION_BACKEND", "onnx")
+    monkeypatch.setattr(settings, "ONNX_DETECTION_MODEL_PATH", tmp_path / "missing.onnx")
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_DIR", tmp_path / "spool")
+    monkeypatch.setattr(detectors, "_registry", {})
+
+    client = TestClient(create_app())
+    path = os.path.join(os.path.dirname(__file__), "sample.dcm")
+    with open(path, "rb") as f:
+        files = {"file": ("sample.dcm", BytesIO(f.read()), "application/dicom")}
+    dicom_id = client.post(f"{settings.API_STR}/upload", files=files).json()
+
+    resp = client.post(f"{settings.API_STR}/dicom/{dicom_id}/ai/detection")
+    assert resp.status_code == 500
@@ -0,0 +1,111 @@
+import os
+from io import BytesIO
+
+import numpy as np
+import pydicom
+import pytest
+from pydicom.dataset import FileMetaDataset
+from fastapi.testclient import TestClient
+from pydicom.uid import (
+    DeflatedExplicitVRLittleEndian,
+    ExplicitVRLittleEndian,
+    ImplicitVRLittleEndian,
+    generate_uid,
+)
+
+from app.core.config import settings
+from app.main import create_app
+from app.util.pixel_decode import decoder_stats, read_frame
+
+
+def _native_dicom(pixels, transfer_syntax=ExplicitVRLittleEndian, bits_stored=None):
+    file_meta = FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.7"
+    file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    file_meta.TransferSyntaxUID = transfer_syntax
+    ds = pydicom.Dataset()
+    ds.file_meta = file_meta
+    ds.SOPClassUID = file_meta.MediaStorageSOPClassUID
+    ds.SOPInstanceUID = file_meta.MediaStorageSOPInstanceUID
+    ds.Rows, ds.Columns = pixels.shape[-2:]
+    if pixels.ndim == 3:
+        ds.NumberOfFrames = pixels.shape[0]
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated = pixels.dtype.itemsize * 8
+    ds.BitsStored = bits_stored or ds.BitsAllocated
+    ds.HighBit = ds.BitsStored - 1
+    ds.PixelRepresentation = int(pixels.dtype.kind == "i")
+    ds.PixelData = pixels.tobytes()
+    buf = BytesIO()
+    ds.save_as(buf, enforce_file_format=True)
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("transfer_syntax", [ExplicitVRLittleEndian, ImplicitVRLittleEndian])
+def test_native_pixels_are_a_zero_copy_view(transfer_syntax):
+    pixels = np.arange(5 * 6 * 4, dtype=np.uint16).reshape(5, 6, 4)
+    data = _native_dicom(pixels, transfer_syntax)
+
+    decoded = read_frame(data, 3)
+    assert decoded.decoder == "native"
+    np.testing.assert_array_equal(decoded.pixels, pixels[3])
+    assert not decoded.pixels.flags.owndata and not decoded.pixels.flags.writeable
+    np.testing.assert_array_equal(read_frame(data).pixels, pixels)
+
+
+def test_native_view_of_a_file_matches_pydicom(tmp_path):
+    pixels = np.random.default_rng(0).integers(-3000, 3000, (40, 30), dtype=np.int16)
+    path = tmp_path / "ct.dcm"
+    path.write_bytes(_native_dicom(pixels))
+
+    decoded = read_frame(path)
+    assert decoded.decoder == "native"
+    np.testing.assert_array_equal(decoded.pixels, pydicom.dcmread(path).pixel_array)
+
+
+def test_bits_above_bits_stored_are_masked_like_pydicom():
+    pixels = np.array([[0xF001, 2], [3, 0xFFFF]], dtype=np.uint16)
+    data = _native_dicom(pixels, bits_stored=12)
+
+    decoded = read_frame(data)
+    assert decoded.decoder == "native"
+    np.testing.assert_array_equal(decoded.pixels, [[1, 2], [3, 4095]])
+
+
+def test_signed_pixels_needing_sign_extension_use_pydicom():
+    pixels = np.array([[0x0FFF, 1]], dtype=np.int16)  # 12-bit -1 and 1
+    decoded = read_frame(_native_dicom(pixels, bits_stored=12))
+    assert decoded.decoder == "pydicom"
+    np.testing.assert_array_equal(decoded.pixels, [[-1, 1]])
+
+
+def test_compressed_pixels_use_the_preferred_plugin():
+    path = os.path.join(os.path.dirname(__file__), "sample.dcm")
+    calls_before = decoder_stats().get("pylibjpeg_calls", 0)
+
+    decoded = read_frame(open(path, "rb").read())
+    assert decoded.decoder == "pylibjpeg"
+    assert decoded.pixels.shape == (1168, 1562)
+    assert decoder_stats()["pylibjpeg_calls"] == calls_before + 1
+
+
+def test_deflated_pixels_are_inflated_and_uploadable(tmp_path, monkeypatch):
+    pixels = np.arange(3 * 8 * 6, dtype=np.uint16).reshape(3, 8, 6)
+    data = _native_dicom(pixels, DeflatedExplicitVRLittleEndian)
+    path = tmp_path / "deflated.dcm"
+    path.write_bytes(data)
+
+    for source in (data, path):
+        decoded = read_frame(source, 1)
+        assert decoded.decoder == "deflate"
+        np.testing.assert_array_equal(decoded.pixels, pixels[1])
+    np.testing.assert_array_equal(read_frame(path).pixels, pixels)
+
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_DIR", tmp_path / "spool")
+    client = TestClient(create_app())
+    files = {"file": ("deflated.dcm", BytesIO(data), "application/dicom")}
+    resp = client.post(f"{settings.API_STR}/upload", files=files)
+    assert resp.status_code == 200
+    image = client.get(f"{settings.API_STR}/dicom/{resp.json()}/image")
+    assert image.status_code == 200
@@ -0,0 +1,38 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+from app.util.rate_limit import TokenBucket, retry_after_seconds
+
+
+def _timed_acquires(bucket, count):
+    async def main():
+        started = time.monotonic()
+        for _ in range(count):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    return asyncio.run(main())
+
+
+def test_burst_goes_out_at_once_then_calls_are_paced():
+    bucket = TokenBucket(rate=50, burst=3)
+    assert _timed_acquires(bucket, 3) < 0.02
+    assert _timed_acquires(bucket, 3) >= 3 / 50 * 0.9
+    assert bucket.waits == 3
+
+
+def test_pause_holds_every_caller_back():
+    bucket = TokenBucket(rate=None)
+    assert _timed_acquires(bucket, 5) < 0.02
+    bucket.pause(0.1)
+    assert _timed_acquires(bucket, 1) >= 0.09
+    assert bucket.pauses == 1
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds("7") == 7.0
+    assert retry_after_seconds(None) is None
+    assert retry_after_seconds("soon") is None
+    in_a_minute = retry_after_seconds(formatdate(time.time() + 60, usegmt=True))
+    assert 55 <= in_a_minute <= 60
@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+from app.util.streaming import bounded_as_completed, ndjson_line
+
+
+def test_ndjson_line():
+    assert json.loads(ndjson_line({"a": 1})) == {"a": 1}
+    assert ndjson_line({}).endswith(b"\n")
+
+
+def test_results_come_in_completion_order_with_bounded_concurrency():
+    in_flight, peak = 0, 0
+
+    async def job(value, delay):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(delay)
+        in_flight -= 1
+        return value
+
+    async def main():
+        delays = [(1, 0.05), (2, 0.01), (3, 0.01), (4, 0.0)]
+        jobs = (job(value, delay) for value, delay in delays)
+        return [result async for result in bounded_as_completed(jobs, 2)]
+
+    assert asyncio.run(main()) == [2, 3, 4, 1]
+    assert peak == 2
+
+
+def test_stopping_early_cancels_running_jobs():
+    cancelled = []
+
+    async def job(delay):
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(delay)
+            raise
+        return delay
+
+    async def main():
+        results = bounded_as_completed((job(d) for d in (0.0, 1.0, 2.0)), 3)
+        first = await results.__anext__()
+        await results.aclose()
+        await asyncio.sleep(0)
+        return first
+
+    assert asyncio.run(main()) == 0.0
+    assert sorted(cancelled) == [1.0, 2.0]
@@ -0,0 +1,186 @@
+import os
+from io import BytesIO
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import create_app
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = create_app()
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def spool_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_DIR", tmp_path / "spool")
+    return tmp_path / "spool"
+
+
+def load_sample_dicom():
+    path = os.path.join(os.path.dirname(__file__), "sample.dcm")
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def upload(client, data, filename="sample.dcm"):
+    files = {"file": (filename, BytesIO(data), "application/dicom")}
+    return client.post(f"{settings.API_STR}/upload", files=files)
+
+
+def test_upload_is_spooled_in_chunks(client, spool_dir, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 64 * 1024)
+    dicom_bytes = load_sample_dicom()
+
+    resp = upload(client, dicom_bytes)
+    assert resp.status_code == 200
+    dicom_id = resp.json()
+
+    # The spool file is handed over to the raw store once parsing succeeded.
+    assert list(spool_dir.iterdir()) == []
+
+    original = client.get(f"{settings.API_STR}/dicom/{dicom_id}/download_original")
+    assert original.status_code == 200
+    assert original.content == dicom_bytes
+
+
+def test_upload_too_large_is_rejected(client, spool_dir, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_MAX_BYTES", 1024)
+
+    resp = upload(client, load_sample_dicom())
+    assert resp.status_code == 413
+    assert list(spool_dir.iterdir()) == []
+
+
+def test_upload_invalid_dicom_removes_spool_file(client, spool_dir):
+    resp = upload(client, b"definitely not a dicom file", filename="broken.dcm")
+    assert resp.status_code == 422
+    assert list(spool_dir.iterdir()) == []
+
+
+def test_duplicate_upload_reuses_entry_without_parsing(client, monkeypatch):
+    from app.services import dicom_service
+
+    parse_calls = []
+    real_parse = dicom_service._parse_dicom_file
+
+    def counting_parse(*args):
+        parse_calls.append(args)
+        return real_parse(*args)
+
+    monkeypatch.setattr(dicom_service, "_parse_dicom_file", counting_parse)
+    dicom_bytes = load_sample_dicom()
+
+    first = upload(client, dicom_bytes).json()
+    parses_after_first = len(parse_calls)
+    second = upload(client, dicom_bytes, filename="copy.dcm").json()
+
+    assert first == second
+    assert len(parse_calls) == parses_after_first
+    assert client.get(f"{settings.API_STR}/dicom/{second}").status_code == 200
+
+
+def test_different_content_gets_different_id(client):
+    dicom_bytes = load_sample_dicom()
+    first = upload(client, dicom_bytes).json()
+    # Trailing padding after the last element still parses, but is new content.
+    second = upload(client, dicom_bytes + b"\0\0").json()
+    assert first != second
+
+
+def test_lazy_render_defers_pixels_until_first_fetch(client, monkeypatch):
+    import asyncio
+
+    from app.services import dicom_service
+
+    monkeypatch.setattr(settings, "LAZY_RENDER", True)
+    render_calls = []
+    real_render = dicom_service._decode_dicom_file
+
+    def counting_render(*args):
+        render_calls.append(args)
+        return real_render(*args)
+
+    monkeypatch.setattr(dicom_service, "_decode_dicom_file", counting_render)
+
+    dicom_id = upload(client, load_sample_dicom() + b"\0" * 6).json()
+    assert not render_calls
+    assert f"{dicom_id}:png" not in dicom_service._image_store
+
+    async def fetch_concurrently():
+        return await asyncio.gather(
+            *(dicom_service.get_image_payload(dicom_id) for _ in range(3))
+        )
+
+    payloads = asyncio.run(fetch_concurrently())
+    assert len(render_calls) == 1
+    assert all(p.png_data == payloads[0].png_data for p in payloads)
+    assert payloads[0].meta.rows == 1168
+
+    resp = client.get(f"{settings.API_STR}/dicom/{dicom_id}")
+    assert resp.status_code == 200
+    assert len(render_calls) == 1
+
+
+def _zip(members):
+    import zipfile
+
+    buf = BytesIO()
+    with zipfile.ZipFile(buf, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buf.getvalue()
+
+
+def test_bulk_upload_streams_ndjson_progress(client, spool_dir):
+    import json
+
+    dicom_bytes = load_sample_dicom()
+    archive = _zip(
+        {
+            "day1/a.dcm": dicom_bytes + b"\0" * 8,
+            "day1/broken.dcm": b"not a dicom",
+            "DICOMDIR": b"index",
+            "__MACOSX/day1/._a.dcm": b"resource fork",
+        }
+    )
+    files = [
+        ("files", ("single.dcm", BytesIO(dicom_bytes), "application/dicom")),
+        ("files", ("day1.zip", BytesIO(archive), "application/octet-stream")),
+        ("files", ("photo.png", BytesIO(b"png"), "image/png")),
+    ]
+    resp = client.post(f"{settings.API_STR}/upload/bulk", files=files)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/x-ndjson"
+
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    summary = lines.pop()
+    assert summary == {"done": True, "ingested": 2, "failed": 2}
+    by_file = {line["file"]: line for line in lines}
+    assert set(by_file) == {"single.dcm", "day1.zip/day1/a.dcm", "day1.zip/day1/broken.dcm", "photo.png"}
+    assert by_file["single.dcm"]["dicom_id"] == upload(client, dicom_bytes).json()
+    assert by_file["day1.zip/day1/broken.dcm"]["status"] == 422
+    assert by_file["photo.png"]["status"] == 400
+
+    dicom_id = by_file["day1.zip/day1/a.dcm"]["dicom_id"]
+    assert client.get(f"{settings.API_STR}/dicom/{dicom_id}").status_code == 200
+    assert list(spool_dir.iterdir()) == []
+
+
+def test_bulk_upload_limits_files(client, monkeypatch):
+    import json
+
+    monkeypatch.setattr(settings, "BULK_UPLOAD_MAX_FILES", 1)
+    dicom_bytes = load_sample_dicom()
+    files = [
+        ("files", ("a.dcm", BytesIO(dicom_bytes), "application/dicom")),
+        ("files", ("b.dcm", BytesIO(dicom_bytes), "application/dicom")),
+    ]
+    resp = client.post(f"{settings.API_STR}/upload/bulk", files=files)
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert lines.pop() == {"done": True, "ingested": 1, "failed": 1}
+    statuses = {line["file"]: line["status"] for line in lines}
+    assert statuses == {"a.dcm": 200, "b.dcm": 413}
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services import worker_pool
+from app.services.worker_pool import (
+    WorkerPoolBusyError,
+    run_in_worker,
+    shutdown_worker_pool,
+    start_worker_pool,
+)
+
+
+@pytest.fixture
+def pool_settings(monkeypatch):
+    shutdown_worker_pool()
+    yield monkeypatch
+    shutdown_worker_pool()
+
+
+def _square(x):
+    return x * x
+
+
+def test_run_in_worker_runs_off_the_event_loop(pool_settings):
+    loop_thread = threading.get_ident()
+
+    async def main():
+        return await run_in_worker(threading.get_ident)
+
+    assert asyncio.run(main()) != loop_thread
+
+
+def test_process_pool(pool_settings):
+    pool_settings.setattr(settings, "WORKER_POOL_KIND", "process")
+    pool_settings.setattr(settings, "WORKER_POOL_MAX_WORKERS", 2)
+
+    async def main():
+        return await asyncio.gather(*(run_in_worker(_square, i) for i in range(4)))
+
+    assert asyncio.run(main()) == [0, 1, 4, 9]
+
+
+def test_full_queue_raises_busy(pool_settings):
+    pool_settings.setattr(settings, "WORKER_POOL_MAX_WORKERS", 1)
+    pool_settings.setattr(settings, "WORKER_POOL_MAX_QUEUE", 0)
+    pool_settings.setattr(settings, "WORKER_POOL_QUEUE_TIMEOUT", 0.05)
+
+    async def main():
+        slow = asyncio.ensure_future(run_in_worker(time.sleep, 0.3))
+        await asyncio.sleep(0)
+        with pytest.raises(WorkerPoolBusyError):
+            await run_in_worker(_square, 2)
+        await slow
+
+    asyncio.run(main())
+
+
+def test_invalid_pool_kind(pool_settings):
+    pool_settings.setattr(settings, "WORKER_POOL_KIND", "fibers")
+    with pytest.raises(ValueError):
+        start_worker_pool()
+    assert worker_pool._executor is None
+
+
+def test_busy_pool_is_a_503_on_every_route(tmp_path, monkeypatch):
+    import os
+    from io import BytesIO
+
+    from fastapi.testclient import TestClient
+
+    from app.main import create_app
+    from app.services import ai_service, dicom_service
+
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_DIR", tmp_path / "spool")
+    client = TestClient(create_app())
+    with open(os.path.join(os.path.dirname(__file__), "sample.dcm"), "rb") as f:
+        files = {"file": ("sample.dcm", BytesIO(f.read()), "application/dicom")}
+    dicom_id = client.post(f"{settings.API_STR}/upload", files=files).json()
+
+    async def busy(*args):
+        raise WorkerPoolBusyError("All workers are busy.")
+
+    monkeypatch.setattr(dicom_service, "run_in_worker", busy)
+    for url in (
+        f"/dicom/{dicom_id}/render?wc=100&ww=50",
+        f"/dicom/{dicom_id}/tiles/0/0/0",
+    ):
+        resp = client.get(settings.API_STR + url)
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == str(worker_pool.BUSY_RETRY_AFTER_SECONDS)
+        assert resp.json() == {"detail": "All workers are busy."}
+
+    files = {"file": ("other.dcm", BytesIO(b"DICM" * 10), "application/dicom")}
+    assert client.post(f"{settings.API_STR}/upload", files=files).status_code == 503
+
+    monkeypatch.setattr(ai_service, "get_model_input", busy)
+    monkeypatch.setattr(ai_service, "_result_cache", None)
+    resp = client.post(f"{settings.API_STR}/dicom/{dicom_id}/ai/detection")
+    assert resp.status_code == 503 and "Retry-After" in resp.headers
+
+
+def _upload_sample(client):
+    import os
+    from io import BytesIO
+
+    with open(os.path.join(os.path.dirname(__file__), "sample.dcm"), "rb") as f:
+        files = {"file": ("sample.dcm", BytesIO(f.read()), "application/dicom")}
+    return client.post(f"{settings.API_STR}/upload", files=files)
+
+
+@pytest.mark.parametrize("lazy_render", [False, True])
+def test_ingest_in_a_process_pool(pool_settings, tmp_path, lazy_render):
+    from fastapi.testclient import TestClient
+
+    from app.main import create_app
+    from app.services import dicom_service
+
+    pool_settings.setattr(settings, "WORKER_POOL_KIND", "process")
+    pool_settings.setattr(settings, "WORKER_POOL_MAX_WORKERS", 1)
+    pool_settings.setattr(settings, "LAZY_RENDER", lazy_render)
+    pool_settings.setattr(settings, "UPLOAD_SPOOL_DIR", tmp_path / "spool")
+    dicom_service.close_stores()
+    client = TestClient(create_app())
+
+    # Datasets parsed from the memory-mapped spool file come back pickled.
+    resp = _upload_sample(client)
+    assert resp.status_code == 200
+    image = client.get(f"{settings.API_STR}/dicom/{resp.json()}/image")
+    assert image.status_code == 200
+    dicom_service.close_stores()